@@ -1,24 +1,19 @@
-import tushare as ts
 import pandas as pd
-import matplotlib.pyplot as plt
-import numpy as np
-from datetime import datetime, timedelta
-from config import TUSHARE_TOKEN, RISE_RANGES, FALL_RANGES
+from fetcher import get_pro
+from trade_calendar import get_latest_trade_date, get_previous_trading_days
+from history_store import history_store
+from distribution import analyze_distribution
 
-# 设置中文字体
-plt.rcParams['font.sans-serif'] = ['SimHei', 'Microsoft YaHei']
-plt.rcParams['axes.unicode_minus'] = False
 
-
-def unified_market_analysis(days=5):
+def unified_market_analysis(days=5, plot=False):
     """
     统一的市场分析功能
     包含：涨跌分布分析、市场统计、趋势分析
     days: 计算最近几天的数据，默认5天
+    plot: 是否绘制综合图表，服务端调用保持默认False，只返回数据
     """
-    # 初始化 tushare
-    ts.set_token(TUSHARE_TOKEN)
-    pro = ts.pro_api()
+    # 获取限流的 tushare 客户端
+    pro = get_pro()
     
     # 获取最新可用交易日
     latest_trade_date = get_latest_trade_date(pro)
@@ -29,7 +24,7 @@ def unified_market_analysis(days=5):
     print(f"正在分析 {latest_trade_date} 的市场数据...")
     
     # 获取最新交易日数据
-    df = pro.daily(trade_date=latest_trade_date)
+    df = history_store.get_daily(pro, latest_trade_date)
     
     if df is None or df.empty:
         print(f"未获取到 {latest_trade_date} 的市场数据！")
@@ -39,8 +34,7 @@ def unified_market_analysis(days=5):
     today_stats = calculate_daily_stats(df)
     
     # 2. 涨跌分布分析
-    rise_distribution = analyze_rise_distribution(df)
-    fall_distribution = analyze_fall_distribution(df)
+    rise_distribution, fall_distribution = analyze_distribution(df)
     
     # 3. 获取最近几天的统计数据
     recent_stats = get_recent_trading_days_stats(pro, days)
@@ -52,9 +46,11 @@ def unified_market_analysis(days=5):
     display_unified_results(today_stats, rise_distribution, fall_distribution, 
                            recent_stats, avg_stats, latest_trade_date)
     
-    # 6. 绘制综合图表
-    plot_unified_charts(rise_distribution, fall_distribution, recent_stats, 
-                       today_stats, latest_trade_date)
+    # 6. 绘制综合图表（按需导入绘图层）
+    if plot:
+        from charts import plot_unified_charts
+        plot_unified_charts(rise_distribution, fall_distribution, recent_stats, 
+                           today_stats, latest_trade_date)
     
     return {
         'today_stats': today_stats,
@@ -65,36 +61,6 @@ def unified_market_analysis(days=5):
     }
 
 
-def get_latest_trade_date(pro):
-    """获取最新可用交易日"""
-    # 获取最近30天的交易日历
-    end_date = datetime.today()
-    start_date = end_date - timedelta(days=30)
-    
-    trade_cal = pro.trade_cal(start_date=start_date.strftime('%Y%m%d'),
-                             end_date=end_date.strftime('%Y%m%d'))
-    
-    # 筛选交易日并按日期排序
-    trading_days = trade_cal[trade_cal['is_open'] == 1]['cal_date'].tolist()
-    trading_days.sort(reverse=True)  # 最新日期在前
-    
-    if not trading_days:
-        return None
-    
-    # 尝试获取最新交易日的数据
-    for trade_date in trading_days[:5]:  # 尝试最近5个交易日
-        try:
-            df = pro.daily(trade_date=trade_date)
-            if df is not None and not df.empty:
-                print(f"找到最新可用交易日: {trade_date}")
-                return trade_date
-        except Exception as e:
-            print(f"尝试获取 {trade_date} 数据时出错: {e}")
-            continue
-    
-    return None
-
-
 def calculate_daily_stats(df):
     """计算单日上涨下跌统计"""
     total_stocks = len(df)
@@ -112,75 +78,19 @@ def calculate_daily_stats(df):
     }
 
 
-def analyze_rise_distribution(df):
-    """分析上涨股票分布"""
-    # 筛选上涨股票
-    rise_df = df[df['pct_chg'] > 0].copy()
-    
-    distribution = {}
-    
-    for min_pct, max_pct, label in RISE_RANGES:
-        if max_pct == float('inf'):
-            # 处理涨停情况
-            if label == "涨停":
-                count = len(rise_df[rise_df['pct_chg'] >= 9.8])  # 涨停通常为9.8%以上
-            else:
-                count = len(rise_df[rise_df['pct_chg'] >= min_pct])
-        else:
-            count = len(rise_df[(rise_df['pct_chg'] >= min_pct) & (rise_df['pct_chg'] < max_pct)])
-        
-        distribution[label] = {
-            'count': count,
-            'percentage': count / len(df) * 100 if len(df) > 0 else 0
-        }
-    
-    return distribution
-
-
-def analyze_fall_distribution(df):
-    """分析下跌股票分布"""
-    # 筛选下跌股票
-    fall_df = df[df['pct_chg'] < 0].copy()
-    
-    distribution = {}
-    
-    for min_pct, max_pct, label in FALL_RANGES:
-        if max_pct == float('inf'):
-            # 处理跌停情况
-            if label == "跌停":
-                count = len(fall_df[fall_df['pct_chg'] <= -9.8])  # 跌停通常为-9.8%以下
-            else:
-                count = len(fall_df[fall_df['pct_chg'] <= -min_pct])
-        else:
-            count = len(fall_df[(fall_df['pct_chg'] <= -min_pct) & (fall_df['pct_chg'] > -max_pct)])
-        
-        distribution[label] = {
-            'count': count,
-            'percentage': count / len(df) * 100 if len(df) > 0 else 0
-        }
-    
-    return distribution
-
-
 def get_recent_trading_days_stats(pro, days=5):
     """获取最近几个交易日的统计数据"""
     stats_list = []
     
-    # 获取交易日历
-    end_date = datetime.today()
-    start_date = end_date - timedelta(days=60)  # 获取更多日期确保有足够交易日
-    
-    trade_cal = pro.trade_cal(start_date=start_date.strftime('%Y%m%d'),
-                             end_date=end_date.strftime('%Y%m%d'))
-    
-    # 筛选交易日
-    trading_days = trade_cal[trade_cal['is_open'] == 1]['cal_date'].tolist()
-    trading_days.sort(reverse=True)  # 最新日期在前
+    # 从交易日历缓存取截至最新可用交易日的最近几个交易日（最新日期在前）
+    trading_days = get_previous_trading_days(pro, days, get_latest_trade_date(pro))
+    # 缺失的交易日并发拉取落盘，后面逐日读取都走本地
+    history_store.sync(pro, trading_days)
     
     # 获取最近几天的数据
-    for i, trade_date in enumerate(trading_days[:days]):
+    for i, trade_date in enumerate(trading_days):
         try:
-            df = pro.daily(trade_date=trade_date)
+            df = history_store.get_daily(pro, trade_date)
             if df is not None and not df.empty:
                 stats = calculate_daily_stats(df)
                 stats_list.append(stats)
@@ -268,131 +178,6 @@ def display_unified_results(today_stats, rise_distribution, fall_distribution,
             print(f"   {stat['date']}: 上涨{stat['rise']:,}只 ({stat['rise_ratio']:.1f}%) {trend_emoji}")
 
 
-def plot_unified_charts(rise_distribution, fall_distribution, recent_stats, 
-                       today_stats, trade_date):
-    """绘制统一的图表"""
-    fig = plt.figure(figsize=(16, 12))
-    
-    # 创建2x2的子图布局
-    gs = fig.add_gridspec(2, 2, hspace=0.3, wspace=0.3)
-    
-    # 1. 左上：涨跌分布柱状图
-    ax1 = fig.add_subplot(gs[0, 0])
-    plot_distribution_chart(ax1, rise_distribution, fall_distribution, trade_date)
-    
-    # 2. 右上：最近趋势图
-    ax2 = fig.add_subplot(gs[0, 1])
-    plot_trend_chart(ax2, recent_stats, trade_date)
-    
-    # 3. 左下：涨跌对比图
-    ax3 = fig.add_subplot(gs[1, 0])
-    plot_comparison_chart(ax3, recent_stats, today_stats, trade_date)
-    
-    # 4. 右下：市场情绪图
-    ax4 = fig.add_subplot(gs[1, 1])
-    plot_sentiment_chart(ax4, rise_distribution, fall_distribution, trade_date)
-    
-    plt.suptitle(f'{trade_date} 市场综合分析', fontsize=16, fontweight='bold')
-    plt.show()
-
-
-def plot_distribution_chart(ax, rise_distribution, fall_distribution, trade_date):
-    """绘制涨跌分布图"""
-    # 上涨分布
-    rise_labels = list(rise_distribution.keys())
-    rise_counts = [rise_distribution[label]['count'] for label in rise_labels]
-    rise_colors = ['#FF6B6B', '#FF8E8E', '#FFB1B1', '#FFD4D4', '#FF0000']
-    
-    # 只显示有数据的部分
-    non_zero_indices = [i for i, count in enumerate(rise_counts) if count > 0]
-    if non_zero_indices:
-        filtered_labels = [rise_labels[i] for i in non_zero_indices]
-        filtered_counts = [rise_counts[i] for i in non_zero_indices]
-        filtered_colors = [rise_colors[i] for i in non_zero_indices]
-        
-        bars1 = ax.bar(filtered_labels, filtered_counts, color=filtered_colors, alpha=0.8)
-        ax.set_title('涨跌分布', fontsize=12, fontweight='bold')
-        ax.set_ylabel('股票数量')
-        ax.grid(True, alpha=0.3)
-        
-        # 添加数值标签
-        for bar, count in zip(bars1, filtered_counts):
-            if count > 0:
-                ax.text(bar.get_x() + bar.get_width()/2, bar.get_height() + 1, 
-                       str(count), ha='center', va='bottom', fontsize=8)
-
-
-def plot_trend_chart(ax, recent_stats, trade_date):
-    """绘制趋势图"""
-    if not recent_stats:
-        return
-    
-    # 反转数据顺序，让日期从远到近显示
-    dates = [stat['date'] for stat in recent_stats][::-1]
-    rise_counts = [stat['rise'] for stat in recent_stats][::-1]
-    fall_counts = [stat['fall'] for stat in recent_stats][::-1]
-    
-    x = range(len(dates))
-    ax.bar([i-0.2 for i in x], rise_counts, width=0.4, label='上涨', color='red', alpha=0.7)
-    ax.bar([i+0.2 for i in x], fall_counts, width=0.4, label='下跌', color='green', alpha=0.7)
-    
-    ax.set_title('近5日涨跌趋势', fontsize=12, fontweight='bold')
-    ax.set_ylabel('股票数量')
-    ax.set_xticks(x)
-    ax.set_xticklabels(dates, rotation=45)
-    ax.legend()
-    ax.grid(True, alpha=0.3)
-
-
-def plot_comparison_chart(ax, recent_stats, today_stats, trade_date):
-    """绘制对比图"""
-    if not recent_stats:
-        return
-    
-    # 反转数据顺序，让日期从远到近显示
-    dates = [stat['date'] for stat in recent_stats][::-1]
-    rise_ratios = [stat['rise_ratio'] for stat in recent_stats][::-1]
-    
-    x = range(len(dates))
-    ax.plot(x, rise_ratios, marker='o', linewidth=2, color='blue', label='上涨比例')
-    ax.axhline(y=50, color='gray', linestyle='--', alpha=0.5, label='50%分界线')
-    
-    # 标注今日数据
-    if today_stats:
-        ax.axhline(y=today_stats['rise_ratio'], color='red', linestyle=':', alpha=0.7, label=f'今日: {today_stats["rise_ratio"]:.1f}%')
-    
-    ax.set_title('上涨比例变化', fontsize=12, fontweight='bold')
-    ax.set_ylabel('上涨比例 (%)')
-    ax.set_xticks(x)
-    ax.set_xticklabels(dates, rotation=45)
-    ax.legend()
-    ax.grid(True, alpha=0.3)
-
-
-def plot_sentiment_chart(ax, rise_distribution, fall_distribution, trade_date):
-    """绘制市场情绪图"""
-    # 计算市场情绪指标
-    strong_rise = rise_distribution.get('7%+', {}).get('count', 0)
-    strong_fall = fall_distribution.get('7%+', {}).get('count', 0)
-    limit_up = rise_distribution.get('涨停', {}).get('count', 0)
-    limit_down = fall_distribution.get('跌停', {}).get('count', 0)
-    
-    categories = ['强势上涨', '强势下跌', '涨停', '跌停']
-    values = [strong_rise, strong_fall, limit_up, limit_down]
-    colors = ['#FF6B6B', '#4ECDC4', '#FF0000', '#00FF00']
-    
-    bars = ax.bar(categories, values, color=colors, alpha=0.8)
-    ax.set_title('市场情绪指标', fontsize=12, fontweight='bold')
-    ax.set_ylabel('股票数量')
-    ax.grid(True, alpha=0.3)
-    
-    # 添加数值标签
-    for bar, value in zip(bars, values):
-        if value > 0:
-            ax.text(bar.get_x() + bar.get_width()/2, bar.get_height() + 0.5, 
-                   str(value), ha='center', va='bottom', fontsize=8)
-
-
 if __name__ == "__main__":
     print("🚀 开始统一市场分析...")
-    unified_market_analysis(days=5) 
\ No newline at end of file
+    unified_market_analysis(days=5, plot=True) 
\ No newline at end of file
@@ -0,0 +1,68 @@
+"""
+持久化写入基准：对比逐行 ORM 写入与批量 upsert 写入一个全市场交易日数据的速度
+用法: python bench_persistence.py [股票数量]
+写入在临时 SQLite 文件上进行，不会写入 market.db 中的数据。
+"""
+import datetime
+import os
+import random
+import sys
+import tempfile
+import time
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from models import Base, HighRiseStock
+from persistence import replace_date
+
+
+def make_rows(date, n):
+    rng = random.Random(0)
+    return [dict(
+        date=date,
+        ts_code=f'{600000 + i:06d}.SH',
+        name=f'股票{i}',
+        current_price=rng.uniform(2, 200),
+        pct_chg=rng.uniform(-10, 10),
+        is_3y_high=rng.random() < 0.1,
+        is_all_time_high=rng.random() < 0.05,
+        max_3y=rng.uniform(2, 200),
+        max_all=rng.uniform(2, 200),
+        created_at=datetime.datetime.utcnow()
+    ) for i in range(n)]
+
+
+def orm_write(Session, date, rows):
+    """原写法：先删除当天数据，再逐行 session.add"""
+    session = Session()
+    session.query(HighRiseStock).filter_by(date=date).delete()
+    for row in rows:
+        session.add(HighRiseStock(**row))
+    session.commit()
+    session.close()
+
+
+def bulk_write(Session, date, rows):
+    with Session() as session, session.begin():
+        replace_date(session, HighRiseStock, date, rows)
+
+
+def bench(name, func, Session, date, rows, repeat=3):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(Session, date, rows)
+        best = min(best, time.perf_counter() - start)
+    print(f"{name:<16} {len(rows)}行  {best * 1000:8.1f} ms  {len(rows) / best:10,.0f} 行/秒")
+
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 5500
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+        Base.metadata.create_all(engine)
+        Session = sessionmaker(bind=engine)
+        rows = make_rows('20250101', n)
+        print(f"写入一个交易日 {n} 只股票（首次写入后重复写入同一天，取最快一次）")
+        bench('ORM逐行写入', orm_write, Session, '20250101', rows)
+        bench('批量upsert', bulk_write, Session, '20250102', [dict(row, date='20250102') for row in rows])
+        engine.dispose()
@@ -0,0 +1,114 @@
+"""
+响应序列化基准：对比 iterrows 逐行转换 + 标准库 json 与按列转换 + orjson 的速度
+用法: python bench_serialization.py [股票数量] [历史天数]
+分别测量全市场股票列表和单只股票3年历史走势（约730个交易日）两种响应。
+"""
+import json
+import os
+import sys
+import tempfile
+import time
+import numpy as np
+import pandas as pd
+# 导入 main 会创建数据库引擎，基准测试使用临时数据库，不改动 market.db
+os.environ.setdefault('DATABASE_PATH', os.path.join(tempfile.mkdtemp(), 'bench.db'))
+from serialization import FastJSONResponse, frame_to_records
+from main import STOCK_FIELDS
+from is_highest_today import HISTORY_FIELDS
+
+
+def make_market(n):
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame({
+        'ts_code': [f'{600000 + i:06d}.SH' for i in range(n)],
+        'name': [f'股票{i}' for i in range(n)],
+        'close': rng.uniform(2, 200, n),
+        'pct_chg': rng.uniform(-10, 10, n),
+        'vol': rng.uniform(1e3, 1e6, n),
+        'amount': rng.uniform(1e4, 1e7, n),
+        'area': pd.Categorical(rng.choice(['深圳', '上海', '北京', None], n)),
+        'industry': pd.Categorical(rng.choice(['银行', '软件服务', '半导体', None], n)),
+        'market': pd.Categorical(rng.choice(['主板', '创业板', '科创板'], n)),
+        'trade_date': '20250101'
+    })
+    df.loc[df.sample(frac=0.01, random_state=0).index, 'close'] = np.nan
+    return df
+
+
+def make_history(days):
+    rng = np.random.default_rng(0)
+    close = 10 + rng.standard_normal(days).cumsum()
+    return pd.DataFrame({
+        'trade_date': pd.date_range('2022-01-01', periods=days, freq='B').strftime('%Y%m%d'),
+        'close': close,
+        'high': close + 0.5,
+        'low': close - 0.5,
+        'pct_chg': rng.uniform(-10, 10, days),
+        'vol': rng.uniform(1e3, 1e6, days)
+    })
+
+
+def iterrows_stocks(df):
+    """原写法：iterrows 逐行逐格转换，再用标准库 json 编码"""
+    stocks = []
+    for _, row in df.iterrows():
+        stocks.append({
+            "ts_code": str(row['ts_code']),
+            "name": str(row['name']) if pd.notna(row['name']) else "未知",
+            "close": float(row['close']) if pd.notna(row['close']) else 0.0,
+            "pct_chg": float(row['pct_chg']) if pd.notna(row['pct_chg']) else 0.0,
+            "vol": float(row['vol']) if pd.notna(row['vol']) else 0.0,
+            "amount": float(row['amount']) if pd.notna(row['amount']) else 0.0,
+            "area": str(row['area']) if pd.notna(row['area']) else "未知",
+            "industry": str(row['industry']) if pd.notna(row['industry']) else "未知",
+            "market": str(row['market']) if pd.notna(row['market']) else "未知",
+            "trade_date": str(row['trade_date'])
+        })
+    return json.dumps({"data": stocks}, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+def iterrows_history(df):
+    history = []
+    for _, row in df.iterrows():
+        history.append({
+            "date": str(row['trade_date']),
+            "close": float(row['close']),
+            "high": float(row['high']),
+            "low": float(row['low']),
+            "pct_chg": float(row['pct_chg']) if 'pct_chg' in row else 0.0,
+            "vol": float(row['vol']) if 'vol' in row else 0.0
+        })
+    return json.dumps({"history": history}, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+def fast_stocks(df):
+    return FastJSONResponse({"data": frame_to_records(df, STOCK_FIELDS)}).body
+
+
+def fast_history(df):
+    return FastJSONResponse({"history": frame_to_records(df, HISTORY_FIELDS)}).body
+
+
+def bench(name, func, df, repeat=5):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        body = func(df)
+        best = min(best, time.perf_counter() - start)
+    print(f"{name:<24} {len(df)}行  {best * 1000:8.2f} ms  {len(body) / 1024:8.1f} KB")
+    return body
+
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 5500
+    days = int(sys.argv[2]) if len(sys.argv) > 2 else 730
+    market = make_market(n)
+    history = make_history(days)
+    print(f"全市场股票列表（{n}只，含1%缺失收盘价）")
+    slow = bench('iterrows + json', iterrows_stocks, market)
+    fast = bench('按列转换 + orjson', fast_stocks, market)
+    assert json.loads(slow) == json.loads(fast)
+    print(f"单只股票历史走势（{days}个交易日）")
+    slow = bench('iterrows + json', iterrows_history, history)
+    fast = bench('按列转换 + orjson', fast_history, history)
+    assert json.loads(slow) == json.loads(fast)
@@ -0,0 +1,320 @@
+# 绘图层：分析模块只返回数据，命令行运行需要出图时才按需导入本模块（及 matplotlib）
+import matplotlib.pyplot as plt
+import matplotlib.dates as mdates
+import pandas as pd
+from config import MAX_YEARS
+
+# 设置中文字体
+plt.rcParams['font.sans-serif'] = ['SimHei', 'Microsoft YaHei']
+plt.rcParams['axes.unicode_minus'] = False
+
+
+def plot_market_trend(recent_stats, today_stats):
+    """绘制市场趋势图"""
+    if not recent_stats:
+        return
+    
+    # 准备数据
+    dates = [stat['date'] for stat in recent_stats]
+    rise_counts = [stat['rise'] for stat in recent_stats]
+    fall_counts = [stat['fall'] for stat in recent_stats]
+    
+    # 创建图表
+    fig, (ax1, ax2) = plt.subplots(2, 1, figsize=(12, 10))
+    
+    # 上图：上涨下跌股票数量
+    x = range(len(dates))
+    ax1.bar([i-0.2 for i in x], rise_counts, width=0.4, label='上涨股票', color='red', alpha=0.7)
+    ax1.bar([i+0.2 for i in x], fall_counts, width=0.4, label='下跌股票', color='green', alpha=0.7)
+    
+    ax1.set_title('近5日上涨下跌股票数量对比', fontsize=14, fontweight='bold')
+    ax1.set_ylabel('股票数量')
+    ax1.set_xticks(x)
+    ax1.set_xticklabels(dates, rotation=45)
+    ax1.legend()
+    ax1.grid(True, alpha=0.3)
+    
+    # 下图：上涨比例
+    rise_ratios = [stat['rise_ratio'] for stat in recent_stats]
+    ax2.plot(x, rise_ratios, marker='o', linewidth=2, color='blue', label='上涨比例')
+    ax2.axhline(y=50, color='gray', linestyle='--', alpha=0.5, label='50%分界线')
+    
+    ax2.set_title('近5日上涨股票比例变化', fontsize=14, fontweight='bold')
+    ax2.set_ylabel('上涨比例 (%)')
+    ax2.set_xlabel('日期')
+    ax2.set_xticks(x)
+    ax2.set_xticklabels(dates, rotation=45)
+    ax2.legend()
+    ax2.grid(True, alpha=0.3)
+    
+    plt.tight_layout()
+    plt.show()
+
+
+def plot_bar_chart(rise_distribution, fall_distribution, trade_date):
+    """绘制柱状图对比"""
+    fig, (ax1, ax2) = plt.subplots(2, 1, figsize=(14, 10))
+    
+    # 上涨分布柱状图
+    rise_labels = list(rise_distribution.keys())
+    rise_counts = [rise_distribution[label]['count'] for label in rise_labels]
+    
+    bars1 = ax1.bar(rise_labels, rise_counts, color='red', alpha=0.7)
+    ax1.set_title(f'{trade_date} 上涨股票数量分布', fontsize=14, fontweight='bold')
+    ax1.set_ylabel('股票数量')
+    ax1.grid(True, alpha=0.3)
+    
+    # 在柱子上添加数值标签
+    for bar, count in zip(bars1, rise_counts):
+        if count > 0:
+            ax1.text(bar.get_x() + bar.get_width()/2, bar.get_height() + 5, 
+                    str(count), ha='center', va='bottom', fontweight='bold')
+    
+    # 下跌分布柱状图
+    fall_labels = list(fall_distribution.keys())
+    fall_counts = [fall_distribution[label]['count'] for label in fall_labels]
+    
+    bars2 = ax2.bar(fall_labels, fall_counts, color='green', alpha=0.7)
+    ax2.set_title(f'{trade_date} 下跌股票数量分布', fontsize=14, fontweight='bold')
+    ax2.set_ylabel('股票数量')
+    ax2.grid(True, alpha=0.3)
+    
+    # 在柱子上添加数值标签
+    for bar, count in zip(bars2, fall_counts):
+        if count > 0:
+            ax2.text(bar.get_x() + bar.get_width()/2, bar.get_height() + 5, 
+                    str(count), ha='center', va='bottom', fontweight='bold')
+    
+    plt.tight_layout()
+    plt.show()
+
+
+def plot_high_rise_chart(high_rise_stocks, trade_date):
+    """绘制高涨幅创新高股票图表"""
+    if not high_rise_stocks:
+        return
+    
+    # 准备数据
+    three_year_highs = [stock for stock in high_rise_stocks if stock['is_3y_high']]
+    all_time_highs = [stock for stock in high_rise_stocks if stock['is_all_time_high']]
+    other_high_rise = [stock for stock in high_rise_stocks if not stock['is_3y_high']]
+    
+    # 创建图表
+    fig, (ax1, ax2) = plt.subplots(2, 1, figsize=(14, 12))
+    
+    # 上图：涨幅分布
+    categories = ['3年新高', '历史新高', '其他高涨幅']
+    counts = [len(three_year_highs), len(all_time_highs), len(other_high_rise)]
+    colors = ['#FF6B6B', '#4ECDC4', '#FFE66D']
+    
+    bars1 = ax1.bar(categories, counts, color=colors, alpha=0.8)
+    ax1.set_title(f'{trade_date} 高涨幅股票分类统计', fontsize=14, fontweight='bold')
+    ax1.set_ylabel('股票数量')
+    ax1.grid(True, alpha=0.3)
+    
+    # 在柱子上添加数值标签
+    for bar, count in zip(bars1, counts):
+        if count > 0:
+            ax1.text(bar.get_x() + bar.get_width()/2, bar.get_height() + 0.5, 
+                    str(count), ha='center', va='bottom', fontweight='bold')
+    
+    # 下图：涨幅分布散点图
+    if high_rise_stocks:
+        prices = [stock['current_price'] for stock in high_rise_stocks]
+        pct_chgs = [stock['pct_chg'] for stock in high_rise_stocks]
+        colors_scatter = ['red' if stock['is_3y_high'] else 'blue' for stock in high_rise_stocks]
+        sizes = [100 if stock['is_all_time_high'] else 50 for stock in high_rise_stocks]
+        
+        scatter = ax2.scatter(prices, pct_chgs, c=colors_scatter, s=sizes, alpha=0.7)
+        ax2.set_title(f'{trade_date} 高涨幅股票价格-涨幅分布', fontsize=14, fontweight='bold')
+        ax2.set_xlabel('股价（元）')
+        ax2.set_ylabel('涨幅（%）')
+        ax2.grid(True, alpha=0.3)
+        
+        # 添加图例
+        from matplotlib.patches import Patch
+        legend_elements = [
+            Patch(facecolor='red', alpha=0.7, label='3年新高'),
+            Patch(facecolor='blue', alpha=0.7, label='其他高涨幅'),
+            Patch(facecolor='white', edgecolor='black', label='大圆点=历史新高')
+        ]
+        ax2.legend(handles=legend_elements, loc='upper right')
+    
+    plt.tight_layout()
+    plt.show()
+
+
+def plot_unified_charts(rise_distribution, fall_distribution, recent_stats, 
+                       today_stats, trade_date):
+    """绘制统一的图表"""
+    fig = plt.figure(figsize=(16, 12))
+    
+    # 创建2x2的子图布局
+    gs = fig.add_gridspec(2, 2, hspace=0.3, wspace=0.3)
+    
+    # 1. 左上：涨跌分布柱状图
+    ax1 = fig.add_subplot(gs[0, 0])
+    plot_distribution_chart(ax1, rise_distribution, fall_distribution, trade_date)
+    
+    # 2. 右上：最近趋势图
+    ax2 = fig.add_subplot(gs[0, 1])
+    plot_trend_chart(ax2, recent_stats, trade_date)
+    
+    # 3. 左下：涨跌对比图
+    ax3 = fig.add_subplot(gs[1, 0])
+    plot_comparison_chart(ax3, recent_stats, today_stats, trade_date)
+    
+    # 4. 右下：市场情绪图
+    ax4 = fig.add_subplot(gs[1, 1])
+    plot_sentiment_chart(ax4, rise_distribution, fall_distribution, trade_date)
+    
+    plt.suptitle(f'{trade_date} 市场综合分析', fontsize=16, fontweight='bold')
+    plt.show()
+
+
+def plot_distribution_chart(ax, rise_distribution, fall_distribution, trade_date):
+    """绘制涨跌分布图"""
+    # 上涨分布
+    rise_labels = list(rise_distribution.keys())
+    rise_counts = [rise_distribution[label]['count'] for label in rise_labels]
+    rise_colors = ['#FF6B6B', '#FF8E8E', '#FFB1B1', '#FFD4D4', '#FF0000']
+    
+    # 只显示有数据的部分
+    non_zero_indices = [i for i, count in enumerate(rise_counts) if count > 0]
+    if non_zero_indices:
+        filtered_labels = [rise_labels[i] for i in non_zero_indices]
+        filtered_counts = [rise_counts[i] for i in non_zero_indices]
+        filtered_colors = [rise_colors[i] for i in non_zero_indices]
+        
+        bars1 = ax.bar(filtered_labels, filtered_counts, color=filtered_colors, alpha=0.8)
+        ax.set_title('涨跌分布', fontsize=12, fontweight='bold')
+        ax.set_ylabel('股票数量')
+        ax.grid(True, alpha=0.3)
+        
+        # 添加数值标签
+        for bar, count in zip(bars1, filtered_counts):
+            if count > 0:
+                ax.text(bar.get_x() + bar.get_width()/2, bar.get_height() + 1, 
+                       str(count), ha='center', va='bottom', fontsize=8)
+
+
+def plot_trend_chart(ax, recent_stats, trade_date):
+    """绘制趋势图"""
+    if not recent_stats:
+        return
+    
+    # 反转数据顺序，让日期从远到近显示
+    dates = [stat['date'] for stat in recent_stats][::-1]
+    rise_counts = [stat['rise'] for stat in recent_stats][::-1]
+    fall_counts = [stat['fall'] for stat in recent_stats][::-1]
+    
+    x = range(len(dates))
+    ax.bar([i-0.2 for i in x], rise_counts, width=0.4, label='上涨', color='red', alpha=0.7)
+    ax.bar([i+0.2 for i in x], fall_counts, width=0.4, label='下跌', color='green', alpha=0.7)
+    
+    ax.set_title('近5日涨跌趋势', fontsize=12, fontweight='bold')
+    ax.set_ylabel('股票数量')
+    ax.set_xticks(x)
+    ax.set_xticklabels(dates, rotation=45)
+    ax.legend()
+    ax.grid(True, alpha=0.3)
+
+
+def plot_comparison_chart(ax, recent_stats, today_stats, trade_date):
+    """绘制对比图"""
+    if not recent_stats:
+        return
+    
+    # 反转数据顺序，让日期从远到近显示
+    dates = [stat['date'] for stat in recent_stats][::-1]
+    rise_ratios = [stat['rise_ratio'] for stat in recent_stats][::-1]
+    
+    x = range(len(dates))
+    ax.plot(x, rise_ratios, marker='o', linewidth=2, color='blue', label='上涨比例')
+    ax.axhline(y=50, color='gray', linestyle='--', alpha=0.5, label='50%分界线')
+    
+    # 标注今日数据
+    if today_stats:
+        ax.axhline(y=today_stats['rise_ratio'], color='red', linestyle=':', alpha=0.7, label=f'今日: {today_stats["rise_ratio"]:.1f}%')
+    
+    ax.set_title('上涨比例变化', fontsize=12, fontweight='bold')
+    ax.set_ylabel('上涨比例 (%)')
+    ax.set_xticks(x)
+    ax.set_xticklabels(dates, rotation=45)
+    ax.legend()
+    ax.grid(True, alpha=0.3)
+
+
+def plot_sentiment_chart(ax, rise_distribution, fall_distribution, trade_date):
+    """绘制市场情绪图"""
+    # 计算市场情绪指标
+    strong_rise = rise_distribution.get('7%+', {}).get('count', 0)
+    strong_fall = fall_distribution.get('7%+', {}).get('count', 0)
+    limit_up = rise_distribution.get('涨停', {}).get('count', 0)
+    limit_down = fall_distribution.get('跌停', {}).get('count', 0)
+    
+    categories = ['强势上涨', '强势下跌', '涨停', '跌停']
+    values = [strong_rise, strong_fall, limit_up, limit_down]
+    colors = ['#FF6B6B', '#4ECDC4', '#FF0000', '#00FF00']
+    
+    bars = ax.bar(categories, values, color=colors, alpha=0.8)
+    ax.set_title('市场情绪指标', fontsize=12, fontweight='bold')
+    ax.set_ylabel('股票数量')
+    ax.grid(True, alpha=0.3)
+    
+    # 添加数值标签
+    for bar, value in zip(bars, values):
+        if value > 0:
+            ax.text(bar.get_x() + bar.get_width()/2, bar.get_height() + 0.5, 
+                   str(value), ha='center', va='bottom', fontsize=8)
+
+
+def plot_price_curve(df, stock_code, market, today_close, max_close, today_date):
+    """绘制股价曲线"""
+    # 转换日期格式
+    df['trade_date'] = pd.to_datetime(df['trade_date'], format='%Y%m%d')
+    
+    # 按日期正序排列
+    df_sorted = df.sort_values('trade_date')
+    
+    # 创建图表
+    plt.figure(figsize=(12, 8))
+    
+    # 绘制收盘价曲线
+    plt.plot(df_sorted['trade_date'], df_sorted['close'], linewidth=2, color='blue', label='收盘价')
+    
+    # 标注最高价点
+    max_price_date = df_sorted.loc[df_sorted['close'].idxmax(), 'trade_date']
+    plt.scatter(max_price_date, max_close, color='red', s=100, zorder=5, label=f'最高价: {max_close:.2f}')
+    plt.annotate(f'最高价\n{max_close:.2f}', 
+                xy=(max_price_date, max_close), 
+                xytext=(10, 10), textcoords='offset points',
+                bbox=dict(boxstyle='round,pad=0.3', facecolor='red', alpha=0.7),
+                fontsize=10, color='white')
+    
+    # 标注今日价格
+    today_date_dt = pd.to_datetime(today_date, format='%Y%m%d')
+    plt.scatter(today_date_dt, today_close, color='green', s=100, zorder=5, label=f'今日价格: {today_close:.2f}')
+    plt.annotate(f'今日价格\n{today_close:.2f}', 
+                xy=(today_date_dt, today_close), 
+                xytext=(10, -20), textcoords='offset points',
+                bbox=dict(boxstyle='round,pad=0.3', facecolor='green', alpha=0.7),
+                fontsize=10, color='white')
+    
+    # 设置图表属性
+    plt.title(f'{stock_code}（{market}）近{MAX_YEARS}年股价走势图', fontsize=16, fontweight='bold')
+    plt.xlabel('日期', fontsize=12)
+    plt.ylabel('股价（元）', fontsize=12)
+    plt.grid(True, alpha=0.3)
+    plt.legend()
+    
+    # 设置x轴日期格式
+    plt.gca().xaxis.set_major_formatter(mdates.DateFormatter('%Y-%m'))
+    plt.gca().xaxis.set_major_locator(mdates.MonthLocator(interval=6))
+    plt.xticks(rotation=45)
+    
+    # 自动调整布局
+    plt.tight_layout()
+    
+    # 显示图表
+    plt.show()
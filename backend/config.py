@@ -7,20 +7,111 @@ TUSHARE_TOKEN = '2876ea85cb005fb5fa17c809a98174f2d5aae8b1f830110a5ead6211'  # 
 # 数据配置
 MAX_YEARS = 3  # 最大历史数据年数
 TODAY = None  # 设置为None表示使用最新交易日
+ALL_TIME_YEARS = 10  # 判断历史新高时回看的年数
+HIGH_RISE_LOOKBACK_DAYS = 250  # 高涨幅股票接近"近期最高价"时回看的交易日数（由定时任务预先同步）
 
-# 涨幅区间配置
+# 交易日历配置
+MARKET_CLOSE_REFRESH_TIME = '15:30'  # 收盘后日线数据发布，过了这个时间才重新确认最新交易日
+CALENDAR_RETRY_MINUTES = 10  # 收盘后当日数据仍未发布时的重试间隔（分钟）
+
+# 全市场快照缓存配置
+SNAPSHOT_CACHE_SIZE = 30  # 最多缓存的交易日数量
+SNAPSHOT_TODAY_TTL_SECONDS = 600  # 当天快照在数据稳定前的有效期（秒）
+SNAPSHOT_SETTLE_TIME = '17:00'  # 过了这个时间当天数据视为不再变化
+
+# 股票列表查询配置
+STOCK_SORT_FIELDS = ['ts_code', 'open', 'high', 'low', 'close', 'pre_close',
+                     'change', 'pct_chg', 'vol', 'amount']  # 允许排序的字段（预先建立排序索引）
+STOCK_EXPORT_CHUNK_ROWS = 500  # 流式导出时每次转换和写出的行数
+
+# 新高检查结果缓存配置（stock_highest_check 表）
+HIGHEST_CHECK_RETENTION_DAYS = 20  # 保留最近多少个交易日的检查结果
+
+# 自选股批量检查配置
+WATCHLIST_MAX_CODES = 500  # 单次请求最多的股票数量
+WATCHLIST_MAX_WORKERS = 4  # 港股/美股等逐只检查时的并发线程数
+
+# HTTP缓存与压缩配置
+HTTP_CACHE_MAX_AGE = 6 * 3600  # 已收盘交易日数据的最长缓存时间（秒），实际不超过下一次数据发布
+HTTP_CACHE_LIVE_MAX_AGE = 60  # 当天数据稳定前的缓存时间（秒）
+HTTP_COMPRESS_MIN_BYTES = 1024  # 超过该大小的响应体才压缩
+HTTP_GZIP_LEVEL = 6
+DATA_VERSION_TTL_SECONDS = 5  # 由文件和数据库推导的数据版本在进程内缓存的秒数
+
+# 监控指标配置（/metrics 接口，Prometheus 文本格式）
+METRICS_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)  # 接口耗时分桶（秒）
+METRICS_TUSHARE_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2, 5, 10, 30)  # tushare调用耗时分桶（秒）
+METRICS_JOB_BUCKETS = (1, 5, 15, 30, 60, 120, 300, 600, 1800)  # 定时任务耗时分桶（秒）
+
+# 数据访问配置
+PROVIDER_MAX_CONCURRENCY = int(os.environ.get('PROVIDER_MAX_CONCURRENCY', 8))  # 同时进行的tushare调用上限
+
+# tushare限流配置（每分钟调用次数，按账号积分对应的额度调整）
+TUSHARE_RATE_LIMITS = {
+    'daily': 500,
+    'stock_basic': 100,
+    'trade_cal': 100,
+    'hk_daily': 10,
+    'us_daily': 10,
+    'hk_tradecal': 10,
+    'us_tradecal': 10,
+}
+TUSHARE_DEFAULT_RATE_LIMIT = 60  # 未单独配置的接口
+TUSHARE_RATE_WINDOW_SECONDS = 61  # 限流窗口，比1分钟略长以抵消请求到达服务端的延迟
+FETCH_MAX_WORKERS = 8  # 批量拉取的并发线程数
+FETCH_MAX_RETRIES = 3  # 调用失败后的重试次数
+FETCH_RETRY_BASE_SECONDS = 2.0  # 重试退避的初始等待（秒），之后每次翻倍
+
+# 本地历史数据存储配置
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
+HISTORY_DIR = os.path.join(DATA_DIR, 'daily')  # 按交易日分区的日线Parquet文件
+ROLLING_MAX_WINDOWS = {'3y': 3, '5y': 5}  # 新高索引维护的窗口（年）
+HK_HISTORY_DIR = os.path.join(DATA_DIR, 'hk')  # 港股按股票代码存储的日线Parquet文件
+US_HISTORY_DIR = os.path.join(DATA_DIR, 'us')  # 美股按股票代码存储的日线Parquet文件
+SYMBOL_HISTORY_CACHE_SIZE = 200  # 内存中缓存的港股/美股股票数量
+SYMBOL_HISTORY_SETTLE_DAYS = 2  # 最近几天的数据可能尚未发布（美股有时差），补数时总会重新确认
+SYMBOL_HISTORY_TOPUP_MINUTES = 30  # 同一只股票两次增量补数的最短间隔（分钟）
+
+# 数据库配置（SQLite，默认与本文件同目录，不受启动时工作目录影响）
+DATABASE_PATH = os.environ.get('DATABASE_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'market.db'))
+# 每个连接建立时设置的 PRAGMA：WAL 模式下读不阻塞写，写也不阻塞读
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',  # WAL 模式下 NORMAL 已能保证一致性，只在检查点时同步
+    'cache_size': -64000,  # 负数表示KB，约64MB页缓存
+    'mmap_size': 268435456,  # 256MB 内存映射读取
+    'temp_store': 'MEMORY',
+    'busy_timeout': 5000,  # 写锁被占用时最多等待5秒
+}
+DB_POOL_SIZE = 10  # 连接池常驻连接数
+DB_MAX_OVERFLOW = 20  # 连接池高峰时额外允许的连接数
+STORED_RESPONSE_GZIP_MIN_BYTES = 1024  # 预先序列化的响应体超过该大小时gzip压缩后存储
+
+# 定时任务配置（交易日收盘后依次执行 scheduler.py 中的 save_* 任务）
+ENABLE_JOB_SCHEDULER = os.environ.get('ENABLE_JOB_SCHEDULER', '1') == '1'  # 多进程部署时只在一个进程开启
+JOB_START_TIME = '17:00'  # 第一个任务的执行时间
+JOB_STAGGER_MINUTES = 5  # 相邻任务错开的分钟数
+JOB_MAX_RETRIES = 3  # 数据未就绪或执行失败时的重试次数
+JOB_RETRY_MINUTES = 15  # 重试间隔（分钟）
+JOB_STATE_PATH = os.path.join(DATA_DIR, 'job_state.json')  # 各任务最近一次成功处理的交易日
+JOB_MAX_WORKERS = 2  # 刷新接口提交的后台任务并发数
+JOB_STATUS_HISTORY = 100  # 任务状态接口保留的记录条数
+PIPELINE_MAX_WORKERS = 4  # 每日分析流水线中并行计算的阶段数
+PIPELINE_RECENT_DAYS = 5  # 流水线加载的最近交易日数量
+
+# 涨幅区间配置（与 pct_chg 一致，单位为百分数，按涨跌幅绝对值左闭右开统计，区间可重叠）
 RISE_RANGES = [
-    (0, 0.02, "0-2%"),
-    (0.02, 0.05, "2%-5%"),
-    (0.05, 0.07, "5%-7%"),
-    (0.07, float('inf'), "7%+"),
-    (0.10, 0.10, "涨停")  # 涨停通常为10%
+    (0, 2, "0-2%"),
+    (2, 5, "2%-5%"),
+    (5, 7, "5%-7%"),
+    (7, float('inf'), "7%+"),
+    (9.8, float('inf'), "涨停")  # 涨停通常为10%，按9.8%以上计
 ]
 
 FALL_RANGES = [
-    (0, 0.02, "0-2%"),
-    (0.02, 0.05, "2%-5%"),
-    (0.05, 0.07, "5%-7%"),
-    (0.07, float('inf'), "7%+"),
-    (0.10, 0.10, "跌停")  # 跌停通常为10%
+    (0, 2, "0-2%"),
+    (2, 5, "2%-5%"),
+    (5, 7, "5%-7%"),
+    (7, float('inf'), "7%+"),
+    (9.8, float('inf'), "跌停")  # 跌停通常为10%，按9.8%以上计
 ] 
\ No newline at end of file
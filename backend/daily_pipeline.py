@@ -0,0 +1,164 @@
+from concurrent.futures import ThreadPoolExecutor
+from config import PIPELINE_MAX_WORKERS, PIPELINE_RECENT_DAYS
+from fetcher import get_pro
+from history_store import history_store
+from trade_calendar import get_latest_trade_date, get_previous_trading_days
+from market_analysis import calculate_daily_stats, calculate_5day_average
+from distribution import analyze_distribution
+from new_high_scanner import scan_new_highs
+from rolling_max_index import rolling_max_index
+from models import SessionLocal
+from data_version import data_versions
+
+
+class Stage:
+    """流水线中的一个分析阶段：compute(context, 依赖阶段的输出) 得到结果，write(session, trade_date, 结果) 负责落库"""
+
+    def __init__(self, name, compute, write=None, deps=()):
+        self.name = name
+        self.compute = compute
+        self.write = write
+        self.deps = tuple(deps)
+
+
+def compute_market_stats(context, inputs):
+    """当日及最近几个交易日的涨跌统计"""
+    recent_stats = [calculate_daily_stats(df) for df in context['recent']]
+    return {
+        'today_stats': calculate_daily_stats(context['df']),
+        'recent_stats': recent_stats,
+        'avg_stats': calculate_5day_average(recent_stats)
+    }
+
+
+def compute_rise_fall_distribution(context, inputs):
+    """当日涨跌分布，返回 (上涨分布, 下跌分布)"""
+    return analyze_distribution(context['df'])
+
+
+def compute_unified_market_analysis(context, inputs):
+    """由涨跌统计和涨跌分布组合出综合分析"""
+    stats = inputs['market_stats']
+    rise_distribution, fall_distribution = inputs['rise_fall_distribution']
+    return {
+        'today_stats': stats['today_stats'],
+        'rise_distribution': rise_distribution,
+        'fall_distribution': fall_distribution,
+        'recent_stats': stats['recent_stats'],
+        'avg_stats': stats['avg_stats']
+    }
+
+
+def compute_high_rise_stocks(context, inputs):
+    """涨幅超过7%的股票及其新高判断（先把新高索引追加到该交易日）"""
+    rolling_max_index.catch_up(context['pro'], context['trade_date'])
+    return scan_new_highs(context['pro'], context['trade_date'], min_pct_chg=7.0)
+
+
+class PipelineError(RuntimeError):
+    """部分阶段失败（已成功的阶段照常写入），errors 为 阶段名 -> 异常"""
+
+    def __init__(self, trade_date, errors):
+        super().__init__(f"{trade_date} 流水线阶段失败: " + '; '.join(f"{name}: {e}" for name, e in errors.items()))
+        self.errors = errors
+
+
+class DailyPipeline:
+    """
+    每日分析流水线
+    一个交易日的全市场数据和最近几个交易日的历史只加载一次，各分析阶段按声明的依赖关系在线程池中并行计算，
+    成功阶段的结果在同一个数据库事务中写入。某个阶段失败时只跳过依赖它的阶段，其余阶段照常写入。
+    """
+
+    def __init__(self, stages, max_workers=PIPELINE_MAX_WORKERS, recent_days=PIPELINE_RECENT_DAYS):
+        self.stages = {stage.name: stage for stage in stages}
+        self.max_workers = max_workers
+        self.recent_days = recent_days
+
+    def _resolve(self, names):
+        """展开依赖，返回按依赖顺序排列的阶段名"""
+        order = []
+
+        def visit(name, path=()):
+            if name in order:
+                return
+            if name in path:
+                raise ValueError(f"流水线阶段存在循环依赖: {' -> '.join(path + (name,))}")
+            for dep in self.stages[name].deps:
+                visit(dep, path + (name,))
+            order.append(name)
+
+        for name in names:
+            visit(name)
+        return order
+
+    def load(self, pro, trade_date):
+        """加载流水线共用的数据：当天全市场日线和最近几个交易日的日线（最新在前）"""
+        recent_days = get_previous_trading_days(pro, self.recent_days, trade_date)
+        history_store.sync(pro, recent_days)
+        recent = [history_store.get_daily(pro, d) for d in recent_days]
+        recent = [df for df in recent if df is not None and not df.empty]
+        df = history_store.get_daily(pro, trade_date)
+        if df is None or df.empty:
+            return None
+        return {'pro': pro, 'trade_date': trade_date, 'df': df, 'recent': recent}
+
+    def compute(self, context, names=None):
+        """按依赖关系并行计算各阶段，返回 (阶段名 -> 结果, 阶段名 -> 异常)；依赖失败的阶段不执行，同样记为失败"""
+        order = self._resolve(names or list(self.stages))
+        results, errors = {}, {}
+        pending = list(order)
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='pipeline') as executor:
+            while pending:
+                for name in pending:
+                    failed = [dep for dep in self.stages[name].deps if dep in errors]
+                    if failed:
+                        errors[name] = RuntimeError(f"依赖的阶段 {', '.join(failed)} 失败，未执行")
+                pending = [name for name in pending if name not in errors]
+                # 依赖都已完成的阶段同一批并行执行
+                ready = [name for name in pending if all(dep in results for dep in self.stages[name].deps)]
+                futures = {}
+                for name in ready:
+                    stage = self.stages[name]
+                    inputs = {dep: results[dep] for dep in stage.deps}
+                    futures[name] = executor.submit(stage.compute, context, inputs)
+                for name, future in futures.items():
+                    try:
+                        results[name] = future.result()
+                        print(f"流水线阶段 {name} 完成")
+                    except Exception as e:
+                        errors[name] = e
+                        print(f"流水线阶段 {name} 失败: {e}")
+                pending = [name for name in pending if name not in futures]
+        return results, errors
+
+    def write(self, trade_date, results):
+        """在一个事务中写入各阶段的结果，任一写入失败则整体回滚"""
+        with SessionLocal() as session, session.begin():
+            for name, result in results.items():
+                stage = self.stages[name]
+                if stage.write is not None:
+                    stage.write(session, trade_date, result)
+        data_versions.bump('analysis')
+
+    def run(self, names=None, trade_date=None, pro=None):
+        """
+        运行流水线（默认全部阶段、最新可用交易日）并写库，返回各阶段结果
+        有阶段失败时先写入成功的阶段，再抛出 PipelineError。
+        """
+        pro = pro or get_pro()
+        trade_date = trade_date or get_latest_trade_date(pro)
+        if not trade_date:
+            raise RuntimeError("无法获取最新交易日数据")
+        context = self.load(pro, trade_date)
+        if context is None:
+            raise RuntimeError(f"未获取到 {trade_date} 的市场数据")
+        results, errors = self.compute(context, names)
+        if results:
+            self.write(trade_date, results)
+            print(f"{trade_date} 每日分析流水线完成: {', '.join(results)}")
+        if errors:
+            # 已写入成功的阶段，失败的阶段交给任务重试
+            raise PipelineError(trade_date, errors)
+        return results
+
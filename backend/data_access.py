@@ -0,0 +1,25 @@
+import asyncio
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from config import PROVIDER_MAX_CONCURRENCY
+
+# tushare调用都是同步HTTP请求，统一放到有界线程池里执行
+_executor = ThreadPoolExecutor(max_workers=PROVIDER_MAX_CONCURRENCY, thread_name_prefix='provider')
+
+
+async def run_blocking(func, *args, **kwargs):
+    """
+    在数据访问线程池中执行可能访问tushare的阻塞函数
+    async接口通过它调用数据层，等待远程数据时事件循环可以继续处理其他请求；
+    同时进行的远程调用数量不超过 PROVIDER_MAX_CONCURRENCY。
+    """
+    loop = asyncio.get_running_loop()
+    # 复制当前上下文（如监控指标使用的接口路径），线程池中的调用同样可见
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(_executor, partial(context.run, func, *args, **kwargs))
+
+
+def shutdown():
+    """关闭线程池（应用退出时调用）"""
+    _executor.shutdown(wait=False)
@@ -0,0 +1,70 @@
+import threading
+import time
+from datetime import datetime, timezone
+from sqlalchemy import text
+from config import DATA_VERSION_TTL_SECONDS
+from models import engine
+
+# 每日分析结果所在的表，HTTP缓存中这些数据以表名区分
+ANALYSIS_TABLES = ('market_stats', 'high_rise_stocks', 'rise_fall_distribution', 'unified_market_analysis')
+
+
+class DataVersions:
+    """
+    各类数据的版本，由落盘的数据推导，HTTP缓存据此生成 ETag / Last-Modified：
+    market 为该交易日日线分区文件的修改时间，分析结果（按表名）为表中最近一次写入的时间。
+    多个进程读取同一份文件和数据库，同一份数据得到相同的版本；不运行定时任务的进程也能看到新写入的分析结果。
+    版本在进程内缓存 DATA_VERSION_TTL_SECONDS 秒，写入数据的进程调用 bump(名称) 立即失效。
+    """
+
+    def __init__(self, ttl=DATA_VERSION_TTL_SECONDS):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._cache = {}  # (名称, 交易日) -> (过期时间, 版本)
+
+    def bump(self, name):
+        """数据已变化，清除缓存的版本；analysis 表示全部分析结果"""
+        names = ANALYSIS_TABLES if name == 'analysis' else (name,)
+        with self._lock:
+            for key in [key for key in self._cache if key[0] in names]:
+                del self._cache[key]
+
+    def version(self, name, trade_date):
+        """返回 (版本标识, 最近修改的时间戳, 该交易日的数据是否已写入)"""
+        now = time.monotonic()
+        with self._lock:
+            cached = self._cache.get((name, trade_date))
+            if cached is not None and now < cached[0]:
+                return cached[1]
+        if name == 'market':
+            version = self._market_version(trade_date)
+        else:
+            version = self._analysis_version(name, trade_date)
+        with self._lock:
+            self._cache[(name, trade_date)] = (now + self.ttl, version)
+        return version
+
+    def _market_version(self, trade_date):
+        from history_store import history_store
+
+        mtime_ns = history_store.partition_mtime_ns(trade_date)
+        if mtime_ns is None:
+            return '0', 0.0, False
+        return format(mtime_ns, 'x'), mtime_ns / 1e9, True
+
+    def _analysis_version(self, table, trade_date):
+        with engine.connect() as conn:
+            created_at, latest_date = conn.execute(text(f'SELECT MAX(created_at), MAX(date) FROM {table}')).one()
+            # 每日流水线在同一个事务中写入全部分析结果，当天没有符合条件的行（如没有高涨幅股票）时以涨跌统计为准
+            pipeline_date = conn.execute(text('SELECT MAX(date) FROM market_stats')).scalar()
+        ready = max(latest_date or '', pipeline_date or '') >= trade_date
+        if created_at is None:
+            return '0', 0.0, ready
+        # created_at 为 UTC 时间（datetime.utcnow），SQLite 中以字符串存储
+        if isinstance(created_at, str):
+            created_at = datetime.fromisoformat(created_at)
+        timestamp = created_at.replace(tzinfo=timezone.utc).timestamp()
+        return format(int(timestamp * 1e6), 'x'), timestamp, ready
+
+
+data_versions = DataVersions()
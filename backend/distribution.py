@@ -0,0 +1,98 @@
+import numpy as np
+from config import RISE_RANGES, FALL_RANGES
+from history_store import history_store
+
+
+class BucketHistogram:
+    """
+    按区间配置统计涨跌幅分布
+    区间 (下限, 上限, 标签) 以涨跌幅绝对值的百分数表示，左闭右开，允许互相重叠（如"7%+"与"涨停"）。
+    所有区间端点合并成一组有序边界，一次 searchsorted 定位每个值所在的最小区间、一次 bincount 计数，
+    再用累加和相减得到每个配置区间的数量。输入可以是二维数组（交易日×股票），每行得到一组分布。
+    """
+
+    def __init__(self, ranges):
+        self.labels = [label for _, _, label in ranges]
+        self.edges = np.unique(np.array([b for lo, hi, _ in ranges for b in (lo, hi)], dtype=float))
+        self._lo = np.searchsorted(self.edges, [lo for lo, _, _ in ranges])
+        self._hi = np.searchsorted(self.edges, [hi for _, hi, _ in ranges])
+
+    def counts(self, magnitudes, valid):
+        """统计每行落在各区间的数量，magnitudes/valid 为同形状的二维数组，返回 行数×区间数 的数组"""
+        n_rows = magnitudes.shape[0]
+        n_bins = len(self.edges) - 1
+        bins = np.searchsorted(self.edges, magnitudes, side='right') - 1
+        mask = valid & (bins >= 0) & (bins < n_bins)
+        rows = np.broadcast_to(np.arange(n_rows)[:, None], magnitudes.shape)
+        flat = rows[mask] * n_bins + bins[mask]
+        hist = np.bincount(flat, minlength=n_rows * n_bins).reshape(n_rows, n_bins)
+        cum = np.zeros((n_rows, n_bins + 1), dtype=np.int64)
+        np.cumsum(hist, axis=1, out=cum[:, 1:])
+        return cum[:, self._hi] - cum[:, self._lo]
+
+
+rise_histogram = BucketHistogram(RISE_RANGES)
+fall_histogram = BucketHistogram(FALL_RANGES)
+
+
+def compute_distributions(pct_chg):
+    """
+    计算涨跌分布计数
+    pct_chg 为一维（单个交易日）或二维（交易日×股票，缺失为NaN）的涨跌幅数组，
+    返回 (上涨计数, 下跌计数, 股票总数)，计数形状为 交易日数×区间数。
+    """
+    values = np.atleast_2d(np.asarray(pct_chg, dtype=float))
+    rise_counts = rise_histogram.counts(values, values > 0)
+    fall_counts = fall_histogram.counts(-values, values < 0)
+    totals = (~np.isnan(values)).sum(axis=1)
+    return rise_counts, fall_counts, totals
+
+
+def _percentage(count, total, digits=None):
+    if total <= 0:
+        return 0
+    percentage = int(count) / int(total) * 100
+    return round(percentage, digits) if digits is not None else percentage
+
+
+def _to_dict(labels, counts, total, digits=None):
+    """区间标签 -> {count, percentage}，digits 不为空时百分比保留该位数的小数"""
+    return {
+        label: {
+            'count': int(count),
+            'percentage': _percentage(count, total, digits)
+        }
+        for label, count in zip(labels, counts)
+    }
+
+
+def analyze_distribution(df, digits=None):
+    """分析单个交易日的涨跌分布，返回 (上涨分布, 下跌分布)；存库的分析结果百分比不取整，digits 为保留的小数位数"""
+    rise_counts, fall_counts, totals = compute_distributions(df['pct_chg'].to_numpy(dtype=float))
+    total = len(df)
+    return (_to_dict(rise_histogram.labels, rise_counts[0], total, digits),
+            _to_dict(fall_histogram.labels, fall_counts[0], total, digits))
+
+
+def analyze_multi_day_distribution(pro, trade_dates):
+    """一次计算多个交易日的涨跌分布，返回按交易日排列的列表（百分比保留两位小数）"""
+    trade_dates = sorted(trade_dates)
+    if not trade_dates:
+        return []
+    history_store.sync(pro, trade_dates)
+    hist = history_store.get_market_history(pro, trade_dates[0], trade_dates[-1],
+                                            columns=['ts_code', 'trade_date', 'pct_chg'])
+    hist = hist[hist['trade_date'].isin(trade_dates)]
+    if hist.empty:
+        return []
+    matrix = hist.pivot(index='trade_date', columns='ts_code', values='pct_chg').sort_index()
+    rise_counts, fall_counts, totals = compute_distributions(matrix.to_numpy(dtype=float))
+    return [
+        {
+            'trade_date': trade_date,
+            'total': int(total),
+            'rise_distribution': _to_dict(rise_histogram.labels, rise_counts[i], total, digits=2),
+            'fall_distribution': _to_dict(fall_histogram.labels, fall_counts[i], total, digits=2)
+        }
+        for i, (trade_date, total) in enumerate(zip(matrix.index, totals))
+    ]
@@ -0,0 +1,47 @@
+import numpy as np
+
+
+def lttb_indices(values, threshold):
+    """
+    Largest-Triangle-Three-Buckets 降采样，返回保留点的下标（升序）
+    横坐标按交易日序号等距处理；首尾两点总是保留，中间每个桶选出与前一个选中点、下一个桶均值围成三角形面积最大的点，
+    折线的峰谷形状得以保留。threshold 不小于数据点数时返回全部下标。
+    """
+    values = np.asarray(values, dtype=float)
+    n = len(values)
+    if threshold is None or threshold >= n or threshold < 3:
+        return np.arange(n)
+    x = np.arange(n, dtype=float)
+    # 缺失值按0参与面积计算，不影响桶的划分
+    y = np.nan_to_num(values)
+    every = (n - 2) / (threshold - 2)
+    selected = np.empty(threshold, dtype=np.int64)
+    selected[0] = 0
+    a = 0
+    for i in range(threshold - 2):
+        start = int(i * every) + 1
+        end = int((i + 1) * every) + 1
+        next_end = min(int((i + 2) * every) + 1, n)
+        avg_x = x[end:next_end].mean()
+        avg_y = y[end:next_end].mean()
+        area = np.abs((x[a] - avg_x) * (y[start:end] - y[a]) - (x[a] - x[start:end]) * (avg_y - y[a]))
+        a = start + int(np.argmax(area))
+        selected[i + 1] = a
+    selected[-1] = n - 1
+    return selected
+
+
+def downsample_history(df, points, value_column='close'):
+    """
+    把按日期升序排列的历史数据降采样到约 points 个点（LTTB）
+    最高收盘价和最新一天的点总是保留，因此结果最多为 points + 1 个点；points 为空时原样返回。
+    """
+    if not points or df is None or len(df) <= points:
+        return df
+    values = df[value_column].to_numpy(dtype=float, na_value=np.nan)
+    keep = lttb_indices(values, points)
+    extra = [len(df) - 1]
+    if not np.isnan(values).all():
+        extra.append(int(np.nanargmax(values)))
+    keep = np.union1d(keep, extra)
+    return df.iloc[keep]
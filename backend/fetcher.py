@@ -0,0 +1,129 @@
+import contextvars
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import tushare as ts
+from config import (TUSHARE_TOKEN, TUSHARE_RATE_LIMITS, TUSHARE_DEFAULT_RATE_LIMIT,
+                    TUSHARE_RATE_WINDOW_SECONDS, FETCH_MAX_WORKERS, FETCH_MAX_RETRIES, FETCH_RETRY_BASE_SECONDS)
+from metrics import current_route, tushare_calls, tushare_call_duration, tushare_rate_limit_wait
+
+
+class SlidingWindowLimiter:
+    """
+    滑动窗口限流：任意 window_seconds 秒内最多 limit 次调用
+    与tushare按分钟计数的额度一致，不会像令牌桶那样在满桶突发之后再加上一分钟的补充，超出额度。
+    """
+
+    def __init__(self, limit, window_seconds=TUSHARE_RATE_WINDOW_SECONDS):
+        self.limit = max(1, int(limit))
+        self.window_seconds = window_seconds
+        self._calls = deque()  # 窗口内各次调用的时间
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """登记一次调用，窗口内的调用次数已满时阻塞等待最早的一次移出窗口"""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                while self._calls and now - self._calls[0] >= self.window_seconds:
+                    self._calls.popleft()
+                if len(self._calls) < self.limit:
+                    self._calls.append(now)
+                    return
+                wait = self._calls[0] + self.window_seconds - now
+            time.sleep(wait)
+
+
+def _is_rate_limited(error):
+    """tushare超频时的报错，如 "抱歉，您每分钟最多访问该接口500次" """
+    message = str(error)
+    return '每分钟最多访问' in message or '访问频率' in message
+
+
+class RateLimitedPro:
+    """
+    tushare pro_api 的限流封装
+    每个接口（daily、stock_basic、trade_cal、hk_daily、us_daily ...）有独立的滑动窗口限流，
+    调用失败（包括超频）按指数退避重试，重试用尽后抛出最后一次的异常，不再静默丢数据。
+    用法与原 pro 对象一致：pro.daily(trade_date=...)。
+    """
+
+    def __init__(self, pro, rate_limits=TUSHARE_RATE_LIMITS, max_retries=FETCH_MAX_RETRIES,
+                 retry_base_seconds=FETCH_RETRY_BASE_SECONDS):
+        self._pro = pro
+        self._rate_limits = dict(rate_limits)
+        self._limiters = {}
+        self._limiters_lock = threading.Lock()
+        self.max_retries = max_retries
+        self.retry_base_seconds = retry_base_seconds
+
+    def _limiter(self, api_name):
+        with self._limiters_lock:
+            if api_name not in self._limiters:
+                limit = self._rate_limits.get(api_name, TUSHARE_DEFAULT_RATE_LIMIT)
+                self._limiters[api_name] = SlidingWindowLimiter(limit)
+            return self._limiters[api_name]
+
+    def call(self, api_name, **kwargs):
+        """限流并带重试地调用一个tushare接口"""
+        func = getattr(self._pro, api_name)
+        limiter = self._limiter(api_name)
+        for attempt in range(self.max_retries + 1):
+            start = time.perf_counter()
+            limiter.acquire()
+            acquired = time.perf_counter()
+            tushare_rate_limit_wait.inc(acquired - start, api=api_name)
+            try:
+                result = func(**kwargs)
+            except Exception as e:
+                tushare_call_duration.observe(time.perf_counter() - acquired, api=api_name)
+                tushare_calls.inc(api=api_name, route=current_route.get(), outcome='error')
+                if attempt >= self.max_retries:
+                    raise
+                delay = self.retry_base_seconds * (2 ** attempt)
+                if _is_rate_limited(e):
+                    # 服务端按分钟计数，超频后要等过一个完整的限流窗口才会恢复
+                    delay = max(delay, TUSHARE_RATE_WINDOW_SECONDS)
+                print(f"调用 {api_name} 失败（第{attempt + 1}次）: {e}，{delay:.1f}秒后重试")
+                time.sleep(delay)
+            else:
+                tushare_call_duration.observe(time.perf_counter() - acquired, api=api_name)
+                tushare_calls.inc(api=api_name, route=current_route.get(), outcome='ok')
+                return result
+
+    def __getattr__(self, api_name):
+        if api_name.startswith('_'):
+            raise AttributeError(api_name)
+        return lambda **kwargs: self.call(api_name, **kwargs)
+
+
+_executor = ThreadPoolExecutor(max_workers=FETCH_MAX_WORKERS, thread_name_prefix='fetcher')
+_pro = None
+_pro_lock = threading.Lock()
+
+
+def get_pro():
+    """进程内共享的限流tushare客户端"""
+    global _pro
+    with _pro_lock:
+        if _pro is None:
+            ts.set_token(TUSHARE_TOKEN)
+            _pro = RateLimitedPro(ts.pro_api())
+        return _pro
+
+
+def fetch_many(func, items):
+    """
+    用有界线程池并发执行 func(item)，按输入顺序返回 (item, 结果, 异常) 列表
+    并发上限为 FETCH_MAX_WORKERS，实际速率由各接口的滑动窗口限流控制。
+    """
+    # 在调用方的上下文中执行，tushare调用指标仍归到触发它的接口
+    futures = [(item, _executor.submit(contextvars.copy_context().run, func, item)) for item in items]
+    results = []
+    for item, future in futures:
+        try:
+            results.append((item, future.result(), None))
+        except Exception as e:
+            results.append((item, None, e))
+    return results
@@ -1,19 +1,16 @@
-import tushare as ts
 import pandas as pd
-import matplotlib.pyplot as plt
-from datetime import datetime, timedelta
-from config import TUSHARE_TOKEN, MAX_YEARS
+from fetcher import get_pro
+from history_store import history_store
+from reference_data import reference_data
+from trade_calendar import get_latest_trade_date
+from new_high_scanner import scan_new_highs
+from rolling_max_index import rolling_max_index
 
-# 设置中文字体
-plt.rcParams['font.sans-serif'] = ['SimHei', 'Microsoft YaHei']
-plt.rcParams['axes.unicode_minus'] = False
 
-
-def find_high_rise_stocks():
-    """找出是3年新高（或历史新高）且今天涨幅超过7%的股票"""
-    # 初始化 tushare
-    ts.set_token(TUSHARE_TOKEN)
-    pro = ts.pro_api()
+def find_high_rise_stocks(plot=False):
+    """找出是3年新高（或历史新高）且今天涨幅超过7%的股票，plot为True时绘制图表"""
+    # 获取限流的 tushare 客户端
+    pro = get_pro()
     
     # 获取最新可用交易日
     latest_trade_date = get_latest_trade_date(pro)
@@ -23,8 +20,8 @@ def find_high_rise_stocks():
     
     print(f"正在分析 {latest_trade_date} 的高涨幅创新高股票...")
     
-    # 获取最新交易日数据
-    df = pro.daily(trade_date=latest_trade_date)
+    # 获取最新交易日数据（同时写入本地历史数据）
+    df = history_store.get_daily(pro, latest_trade_date)
     
     if df is None or df.empty:
         print(f"未获取到 {latest_trade_date} 的市场数据！")
@@ -45,118 +42,24 @@ def find_high_rise_stocks():
     # 显示结果
     display_high_rise_results(high_rise_stocks, latest_trade_date)
     
-    # 绘制图表
-    plot_high_rise_chart(high_rise_stocks, latest_trade_date)
+    # 绘制图表（按需导入绘图层）
+    if plot:
+        from charts import plot_high_rise_chart
+        plot_high_rise_chart(high_rise_stocks, latest_trade_date)
     
     return high_rise_stocks
 
 
-def get_latest_trade_date(pro):
-    """获取最新可用交易日"""
-    # 获取最近30天的交易日历
-    end_date = datetime.today()
-    start_date = end_date - timedelta(days=30)
-    
-    trade_cal = pro.trade_cal(start_date=start_date.strftime('%Y%m%d'),
-                             end_date=end_date.strftime('%Y%m%d'))
-    
-    # 筛选交易日并按日期排序
-    trading_days = trade_cal[trade_cal['is_open'] == 1]['cal_date'].tolist()
-    trading_days.sort(reverse=True)  # 最新日期在前
-    
-    if not trading_days:
-        return None
-    
-    # 尝试获取最新交易日的数据
-    for trade_date in trading_days[:5]:  # 尝试最近5个交易日
-        try:
-            df = pro.daily(trade_date=trade_date)
-            if df is not None and not df.empty:
-                print(f"找到最新可用交易日: {trade_date}")
-                return trade_date
-        except Exception as e:
-            print(f"尝试获取 {trade_date} 数据时出错: {e}")
-            continue
-    
-    return None
-
-
 def analyze_high_rise_stocks(pro, high_rise_df, trade_date):
-    """分析高涨幅股票是否为3年新高或历史新高"""
-    high_rise_stocks = []
-    
-    # 计算日期范围
-    end_date = datetime.strptime(trade_date, '%Y%m%d')
-    start_date_3y = end_date - timedelta(days=MAX_YEARS * 365)
-    start_date_all = end_date - timedelta(days=10 * 365)  # 10年数据用于判断历史新高
-    
-    end_date_str = end_date.strftime('%Y%m%d')
-    start_date_3y_str = start_date_3y.strftime('%Y%m%d')
-    start_date_all_str = start_date_all.strftime('%Y%m%d')
-    
-    total_stocks = len(high_rise_df)
-    
-    for idx, row in high_rise_df.iterrows():
-        stock_code = row['ts_code']
-        current_price = row['close']
-        pct_chg = row['pct_chg']
-        
-        print(f"正在分析 {stock_code} ({idx+1}/{total_stocks})...")
-        
-        try:
-            # 获取3年历史数据
-            df_3y = pro.daily(ts_code=stock_code, 
-                             start_date=start_date_3y_str, 
-                             end_date=end_date_str)
-            
-            # 获取更长期历史数据（用于判断历史新高）
-            df_all = pro.daily(ts_code=stock_code, 
-                              start_date=start_date_all_str, 
-                              end_date=end_date_str)
-            
-            if df_3y is None or df_3y.empty:
-                continue
-                
-            # 计算3年最高价
-            max_3y = df_3y['close'].max()
-            is_3y_high = current_price >= max_3y
-            
-            # 计算历史最高价
-            is_all_time_high = False
-            if df_all is not None and not df_all.empty:
-                max_all = df_all['close'].max()
-                is_all_time_high = current_price >= max_all
-            
-            # 获取股票名称
-            stock_name = get_stock_name(pro, stock_code)
-            
-            high_rise_stocks.append({
-                'ts_code': stock_code,
-                'name': stock_name,
-                'current_price': current_price,
-                'pct_chg': pct_chg,
-                'is_3y_high': is_3y_high,
-                'is_all_time_high': is_all_time_high,
-                'max_3y': max_3y,
-                'max_all': max_all if df_all is not None and not df_all.empty else None
-            })
-            
-        except Exception as e:
-            print(f"分析 {stock_code} 时出错: {e}")
-            continue
-    
-    return high_rise_stocks
+    """分析高涨幅股票是否为3年新高或历史新高（全市场向量化扫描）"""
+    rolling_max_index.catch_up(pro, trade_date)
+    return scan_new_highs(pro, trade_date, min_pct_chg=None, ts_codes=high_rise_df['ts_code'].tolist())
 
 
 def get_stock_name(pro, ts_code):
-    """获取股票名称"""
+    """获取股票名称（读取每日缓存的股票基本信息）"""
     try:
-        # 获取股票基本信息
-        stock_basic = pro.stock_basic(ts_code=ts_code, fields='name')
-        if stock_basic is not None and not stock_basic.empty:
-            return stock_basic.iloc[0]['name']
-        else:
-            return "未知"
+        return reference_data.get_name(pro, ts_code)
     except:
         return "未知"
 
@@ -216,61 +119,6 @@ def display_high_rise_results(high_rise_stocks, trade_date):
               f"{stock['pct_chg']:<8.2f}% {three_year_mark:<8} {all_time_mark:<8}")
 
 
-def plot_high_rise_chart(high_rise_stocks, trade_date):
-    """绘制高涨幅创新高股票图表"""
-    if not high_rise_stocks:
-        return
-    
-    # 准备数据
-    three_year_highs = [stock for stock in high_rise_stocks if stock['is_3y_high']]
-    all_time_highs = [stock for stock in high_rise_stocks if stock['is_all_time_high']]
-    other_high_rise = [stock for stock in high_rise_stocks if not stock['is_3y_high']]
-    
-    # 创建图表
-    fig, (ax1, ax2) = plt.subplots(2, 1, figsize=(14, 12))
-    
-    # 上图：涨幅分布
-    categories = ['3年新高', '历史新高', '其他高涨幅']
-    counts = [len(three_year_highs), len(all_time_highs), len(other_high_rise)]
-    colors = ['#FF6B6B', '#4ECDC4', '#FFE66D']
-    
-    bars1 = ax1.bar(categories, counts, color=colors, alpha=0.8)
-    ax1.set_title(f'{trade_date} 高涨幅股票分类统计', fontsize=14, fontweight='bold')
-    ax1.set_ylabel('股票数量')
-    ax1.grid(True, alpha=0.3)
-    
-    # 在柱子上添加数值标签
-    for bar, count in zip(bars1, counts):
-        if count > 0:
-            ax1.text(bar.get_x() + bar.get_width()/2, bar.get_height() + 0.5, 
-                    str(count), ha='center', va='bottom', fontweight='bold')
-    
-    # 下图：涨幅分布散点图
-    if high_rise_stocks:
-        prices = [stock['current_price'] for stock in high_rise_stocks]
-        pct_chgs = [stock['pct_chg'] for stock in high_rise_stocks]
-        colors_scatter = ['red' if stock['is_3y_high'] else 'blue' for stock in high_rise_stocks]
-        sizes = [100 if stock['is_all_time_high'] else 50 for stock in high_rise_stocks]
-        
-        scatter = ax2.scatter(prices, pct_chgs, c=colors_scatter, s=sizes, alpha=0.7)
-        ax2.set_title(f'{trade_date} 高涨幅股票价格-涨幅分布', fontsize=14, fontweight='bold')
-        ax2.set_xlabel('股价（元）')
-        ax2.set_ylabel('涨幅（%）')
-        ax2.grid(True, alpha=0.3)
-        
-        # 添加图例
-        from matplotlib.patches import Patch
-        legend_elements = [
-            Patch(facecolor='red', alpha=0.7, label='3年新高'),
-            Patch(facecolor='blue', alpha=0.7, label='其他高涨幅'),
-            Patch(facecolor='white', edgecolor='black', label='大圆点=历史新高')
-        ]
-        ax2.legend(handles=legend_elements, loc='upper right')
-    
-    plt.tight_layout()
-    plt.show()
-
-
 if __name__ == "__main__":
     print("🚀 开始分析高涨幅创新高股票...")
-    find_high_rise_stocks() 
\ No newline at end of file
+    find_high_rise_stocks(plot=True) 
\ No newline at end of file
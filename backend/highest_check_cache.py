@@ -0,0 +1,85 @@
+import datetime
+import io
+import pandas as pd
+from sqlalchemy import delete
+from config import HIGHEST_CHECK_RETENTION_DAYS
+from models import StockHighestCheck
+from persistence import bulk_upsert
+from single_flight import single_flight
+from trade_calendar import get_latest_trade_date, get_previous_trading_days
+from history_store import get_symbol_latest_date
+from metrics import record_cache
+from is_highest_today import analyze_today_highest, with_history, HISTORY_FIELDS
+
+# 缓存的结果摘要字段（与 is_today_highest 的返回值一致，不含 history）
+SUMMARY_FIELDS = ['name', 'market', 'today_close', 'max_close', 'min_close', 'is_highest', 'trade_date',
+                  'pct_chg', 'vol', 'amount', 'data_period', 'total_days']
+
+
+def encode_history(history):
+    """把历史走势用到的列存为 Parquet 字节"""
+    columns = [column for _, column, _, _ in HISTORY_FIELDS if column in history.columns]
+    buffer = io.BytesIO()
+    history[columns].to_parquet(buffer, index=False)
+    return buffer.getvalue()
+
+
+def decode_history(data):
+    return pd.read_parquet(io.BytesIO(data))
+
+
+def load_cached(session, ts_code, as_of):
+    """从 stock_highest_check 表读取 (结果摘要, 历史数据)，没有缓存时返回 None"""
+    row = session.query(StockHighestCheck).filter_by(ts_code=ts_code, date=as_of).one_or_none()
+    if row is None or row.history is None:
+        return None
+    result = {"ts_code": ts_code}
+    result.update({field: getattr(row, field) for field in SUMMARY_FIELDS})
+    return result, decode_history(row.history)
+
+
+def store(session, pro, ts_code, as_of, result, history):
+    """写入检查结果，并删除超出保留期的旧结果"""
+    bulk_upsert(session, StockHighestCheck, [dict(
+        ts_code=ts_code,
+        date=as_of,
+        history=encode_history(history),
+        checked_at=datetime.datetime.utcnow(),
+        **{field: result[field] for field in SUMMARY_FIELDS}
+    )])
+    recent_days = get_previous_trading_days(pro, HIGHEST_CHECK_RETENTION_DAYS, as_of)
+    if recent_days:
+        session.execute(delete(StockHighestCheck).where(StockHighestCheck.date < recent_days[-1]))
+    session.commit()
+
+
+def check_highest(session, pro, ts_code, points=None, include_history=True):
+    """
+    读穿缓存的新高检查
+    以 (ts_code, 数据日期) 为键，同一数据日期重复检查同一只股票直接读 SQLite，不再拉取历史数据；
+    未命中时计算（同一键的并发请求只计算一次）并写入缓存。分析失败的结果不缓存。
+    A股的数据日期为最新交易日；港股/美股按各自市场更新，为本地补齐后最新一根日线的日期，不随A股交易日切换。
+    include_history 为False时只返回结果摘要。
+    """
+    by_bar = ts_code.endswith(('.HK', '.US'))
+    if by_bar:
+        as_of = get_symbol_latest_date(pro, ts_code, datetime.date.today().strftime('%Y%m%d'))
+    else:
+        as_of = get_latest_trade_date(pro)
+    if as_of:
+        cached = load_cached(session, ts_code, as_of)
+        record_cache('highest_check', cached is not None)
+        if cached is not None:
+            result, history = cached
+            return with_history(result, history if include_history else None, points)
+    result, history = single_flight.run(f"highest_check:{ts_code}:{as_of}", analyze_today_highest, ts_code)
+    if history is not None and by_bar and not as_of:
+        # 首次检查的港股/美股此前没有本地日线，以分析用到的最新一根日线为键
+        as_of = result['trade_date']
+    if history is not None and as_of:
+        try:
+            store(session, pro, ts_code, as_of, result, history)
+        except Exception as e:
+            session.rollback()
+            print(f"写入 {ts_code} 新高检查缓存失败: {e}")
+    return with_history(dict(result), history if include_history else None, points)
@@ -0,0 +1,357 @@
+import json
+import os
+import threading
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+from datetime import datetime, timedelta
+from config import (
+    HISTORY_DIR,
+    HK_HISTORY_DIR,
+    US_HISTORY_DIR,
+    SYMBOL_HISTORY_CACHE_SIZE,
+    SYMBOL_HISTORY_SETTLE_DAYS,
+    SYMBOL_HISTORY_TOPUP_MINUTES
+)
+from trade_calendar import trade_calendar, hk_calendar, us_calendar
+from fetcher import fetch_many
+from data_version import data_versions
+from metrics import record_cache, cache_evictions
+
+# 落盘保存的日线字段
+DAILY_COLUMNS = ['ts_code', 'trade_date', 'open', 'high', 'low', 'close',
+                 'pre_close', 'change', 'pct_chg', 'vol', 'amount']
+
+
+class HistoryStore:
+    """
+    本地日线历史数据存储
+    每个交易日一个Parquet文件，由一次 pro.daily(trade_date=...) 全市场拉取填充，之后只增量补齐缺失的交易日。
+    读取时把已落盘的分区合并成按 (ts_code, trade_date) 排序的内存表，单只股票的历史查询就是一次切片。
+    """
+
+    def __init__(self, root=HISTORY_DIR):
+        self.root = root
+        self._lock = threading.RLock()
+        self._frame = None        # 合并后的内存表
+        self._code_slices = {}    # ts_code -> (起始行, 结束行)
+        self._loaded_dates = set()
+        os.makedirs(root, exist_ok=True)
+
+    def _path(self, trade_date):
+        return os.path.join(self.root, f'{trade_date}.parquet')
+
+    def has_date(self, trade_date):
+        """本地是否已有该交易日的数据"""
+        return os.path.exists(self._path(trade_date))
+
+    def partition_mtime_ns(self, trade_date):
+        """该交易日分区文件的修改时间（纳秒），没有时返回None"""
+        try:
+            return os.stat(self._path(trade_date)).st_mtime_ns
+        except OSError:
+            return None
+
+    def stored_dates(self):
+        """本地已存储的全部交易日（升序）"""
+        return sorted(name[:-len('.parquet')] for name in os.listdir(self.root) if name.endswith('.parquet'))
+
+    def put_daily(self, trade_date, df):
+        """写入一个交易日的全市场日线，空数据不落盘（当天数据可能尚未发布）"""
+        if df is None or df.empty:
+            return
+        columns = [col for col in DAILY_COLUMNS if col in df.columns]
+        df = df[columns].reset_index(drop=True)
+        # 先写临时文件再替换，避免读到写了一半的分区
+        tmp_path = self._path(trade_date) + '.tmp'
+        df.to_parquet(tmp_path, index=False)
+        os.replace(tmp_path, self._path(trade_date))
+        trade_calendar.mark_available(trade_date)
+        data_versions.bump('market')
+        with self._lock:
+            if trade_date in self._loaded_dates:
+                # 已加载的分区被覆盖时，下次读取重新加载
+                self._loaded_dates.discard(trade_date)
+                self._frame = self._frame[self._frame['trade_date'] != trade_date]
+                self._rebuild_index(self._frame)
+
+    def get_daily(self, pro, trade_date):
+        """获取某交易日的全市场日线，本地没有时从tushare拉取并落盘"""
+        if self.has_date(trade_date):
+            return pd.read_parquet(self._path(trade_date))
+        df = pro.daily(trade_date=trade_date)
+        self.put_daily(trade_date, df)
+        return df
+
+    def sync(self, pro, trade_dates):
+        """
+        确保给定交易日都已落盘，返回本次新拉取到数据的交易日
+        缺失的交易日通过有界线程池并发拉取（速率由限流客户端控制），拉取失败的交易日会汇总打印，下次调用时重试。
+        """
+        missing = [d for d in trade_dates if not self.has_date(d)]
+        if not missing:
+            return []
+        fetched, failed = [], []
+        for trade_date, df, error in fetch_many(lambda d: self.get_daily(pro, d), missing):
+            if error is not None:
+                failed.append(trade_date)
+                print(f"同步 {trade_date} 日线数据时出错: {error}")
+            elif df is not None and not df.empty:
+                fetched.append(trade_date)
+        print(f"已同步 {len(fetched)}/{len(missing)} 个交易日的日线数据")
+        if failed:
+            print(f"以下交易日同步失败，将在下次同步时重试: {', '.join(failed)}")
+        return fetched
+
+    def _load(self, trade_dates):
+        """把已落盘但尚未加载的交易日并入内存表"""
+        with self._lock:
+            new_dates = [d for d in trade_dates if d not in self._loaded_dates and self.has_date(d)]
+            if not new_dates:
+                return
+            frames = [pd.read_parquet(self._path(d)) for d in new_dates]
+            if self._frame is not None:
+                frames.insert(0, self._frame)
+            frame = pd.concat(frames, ignore_index=True)
+            self._rebuild_index(frame)
+            self._loaded_dates.update(new_dates)
+
+    def _rebuild_index(self, frame):
+        """按 (ts_code, trade_date) 排序并记录每只股票所在的行区间"""
+        codes = frame['ts_code'].to_numpy()
+        order = np.lexsort((frame['trade_date'].to_numpy(), codes))
+        frame = frame.iloc[order].reset_index(drop=True)
+        codes = frame['ts_code'].to_numpy()
+        # 每只股票的起始位置
+        starts = np.flatnonzero(np.r_[True, codes[1:] != codes[:-1]]) if len(codes) else np.array([], dtype=int)
+        ends = np.r_[starts[1:], len(codes)]
+        self._code_slices = {codes[s]: (s, e) for s, e in zip(starts, ends)}
+        self._frame = frame
+
+    def missing_dates(self, pro, start_date, end_date):
+        """区间内尚未落盘的交易日（end_date 应为已发布数据的交易日）"""
+        trade_dates = trade_calendar.trading_days_between(pro, start_date, end_date)
+        with self._lock:
+            loaded = set(self._loaded_dates)
+        return [d for d in trade_dates if d not in loaded and not self.has_date(d)]
+
+    def get_history(self, pro, ts_code, start_date, end_date, sync=True):
+        """读取单只股票在区间内的日线（按日期升序）；sync为False时只读取本地已有的交易日（供接口请求使用）"""
+        trade_dates = trade_calendar.trading_days_between(pro, start_date, end_date)
+        if sync:
+            self.sync(pro, trade_dates)
+        self._load(trade_dates)
+        with self._lock:
+            if self._frame is None or ts_code not in self._code_slices:
+                return pd.DataFrame(columns=DAILY_COLUMNS)
+            start, end = self._code_slices[ts_code]
+            df = self._frame.iloc[start:end]
+        df = df[(df['trade_date'] >= start_date) & (df['trade_date'] <= end_date)]
+        return df.reset_index(drop=True)
+
+    def get_market_history(self, pro, start_date, end_date, columns=None, sync=True):
+        """读取全市场在区间内的日线；sync为False时只读取本地已有的交易日，不拉取缺失数据（供接口请求使用）"""
+        trade_dates = trade_calendar.trading_days_between(pro, start_date, end_date)
+        if sync:
+            self.sync(pro, trade_dates)
+        self._load(trade_dates)
+        with self._lock:
+            if self._frame is None:
+                return pd.DataFrame(columns=columns or DAILY_COLUMNS)
+            df = self._frame
+        df = df[(df['trade_date'] >= start_date) & (df['trade_date'] <= end_date)]
+        if columns:
+            df = df[columns]
+        return df.reset_index(drop=True)
+
+
+history_store = HistoryStore()
+
+
+class SymbolHistoryStore:
+    """
+    港股/美股日线的本地存储
+    这些市场的接口额度很低且只能按股票拉取：每只股票一个Parquet文件，索引文件记录每只股票已覆盖的日期区间，
+    再次读取时只拉取区间之外的日期（通常是上次之后新增的几天），有没有新交易日按该市场自己的交易日历判断。
+    最近读取的股票在内存中按LRU缓存。
+    """
+
+    def __init__(self, api_name, calendar, root, cache_size=SYMBOL_HISTORY_CACHE_SIZE):
+        self.api_name = api_name
+        self.calendar = calendar
+        self.root = root
+        self.cache_size = cache_size
+        self._lock = threading.RLock()
+        self._symbol_locks = {}
+        self._frames = OrderedDict()  # ts_code -> DataFrame（按日期升序）
+        self._coverage = None         # ts_code -> {'start', 'end', 'fetched_at'}
+
+    def _path(self, ts_code):
+        return os.path.join(self.root, f'{ts_code}.parquet')
+
+    def _coverage_path(self):
+        return os.path.join(self.root, 'coverage.json')
+
+    def _symbol_lock(self, ts_code):
+        with self._lock:
+            return self._symbol_locks.setdefault(ts_code, threading.Lock())
+
+    def _load_coverage(self):
+        with self._lock:
+            if self._coverage is None:
+                try:
+                    with open(self._coverage_path(), encoding='utf-8') as f:
+                        self._coverage = json.load(f)
+                except (OSError, ValueError):
+                    self._coverage = {}
+            return self._coverage
+
+    def _save_coverage(self, ts_code, coverage):
+        with self._lock:
+            self._load_coverage()[ts_code] = coverage
+            os.makedirs(self.root, exist_ok=True)
+            tmp_path = self._coverage_path() + '.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(self._coverage, f)
+            os.replace(tmp_path, self._coverage_path())
+
+    def _read(self, ts_code):
+        """读取已存储的日线（优先内存缓存），没有时返回None"""
+        with self._lock:
+            record_cache(f'{self.api_name}_history', ts_code in self._frames)
+            if ts_code in self._frames:
+                self._frames.move_to_end(ts_code)
+                return self._frames[ts_code]
+        if not os.path.exists(self._path(ts_code)):
+            return None
+        frame = pd.read_parquet(self._path(ts_code))
+        self._remember(ts_code, frame)
+        return frame
+
+    def _remember(self, ts_code, frame):
+        with self._lock:
+            self._frames[ts_code] = frame
+            self._frames.move_to_end(ts_code)
+            while len(self._frames) > self.cache_size:
+                self._frames.popitem(last=False)
+                cache_evictions.inc(cache=f'{self.api_name}_history', reason='capacity')
+
+    def _has_trading_days(self, pro, start_date, end_date):
+        """区间内是否有交易日；交易日历不可用时按有交易日处理"""
+        if start_date > end_date:
+            return False
+        try:
+            return bool(self.calendar.trading_days_between(pro, start_date, end_date))
+        except Exception as e:
+            print(f"获取 {self.api_name} 交易日历失败，直接拉取数据: {e}")
+            return True
+
+    def _fetch(self, pro, ts_code, start_date, end_date):
+        df = getattr(pro, self.api_name)(ts_code=ts_code, start_date=start_date, end_date=end_date)
+        if df is None or df.empty:
+            return None
+        # 美股接口的涨跌幅字段为 pct_change，统一为 pct_chg
+        if 'pct_chg' not in df.columns and 'pct_change' in df.columns:
+            df = df.rename(columns={'pct_change': 'pct_chg'})
+        return df[[col for col in DAILY_COLUMNS if col in df.columns]]
+
+    def get_history(self, pro, ts_code, start_date, end_date):
+        """读取单只股票在区间内的日线（按日期升序），只拉取本地没有覆盖的日期"""
+        with self._symbol_lock(ts_code):
+            frame = self._read(ts_code)
+            coverage = self._load_coverage().get(ts_code) if frame is not None else None
+            now = datetime.now()
+            ranges = []
+            if coverage is None:
+                ranges.append((start_date, end_date))
+            else:
+                if start_date < coverage['start']:
+                    before = _shift_date(coverage['start'], -1)
+                    if self._has_trading_days(pro, start_date, before):
+                        ranges.append((start_date, before))
+                after = _shift_date(coverage['end'], 1)
+                recently = now - datetime.fromisoformat(coverage['fetched_at']) < timedelta(minutes=SYMBOL_HISTORY_TOPUP_MINUTES)
+                if end_date > coverage['end'] and not recently and self._has_trading_days(pro, after, end_date):
+                    ranges.append((after, end_date))
+
+            if ranges:
+                parts = [frame] if frame is not None else []
+                parts.extend(df for df in (self._fetch(pro, ts_code, start, end) for start, end in ranges) if df is not None)
+                if parts:
+                    frame = pd.concat(parts, ignore_index=True)
+                    frame = frame.drop_duplicates('trade_date', keep='last').sort_values('trade_date').reset_index(drop=True)
+                    os.makedirs(self.root, exist_ok=True)
+                    tmp_path = self._path(ts_code) + '.tmp'
+                    frame.to_parquet(tmp_path, index=False)
+                    os.replace(tmp_path, self._path(ts_code))
+                    self._remember(ts_code, frame)
+                # 最近几天的数据可能还没发布，覆盖区间只记到已有数据或 SYMBOL_HISTORY_SETTLE_DAYS 天前
+                settled = (now - timedelta(days=SYMBOL_HISTORY_SETTLE_DAYS)).strftime('%Y%m%d')
+                last_date = frame['trade_date'].max() if frame is not None and not frame.empty else start_date
+                covered_end = max(last_date, min(end_date, settled))
+                if coverage is not None:
+                    covered_end = max(covered_end, coverage['end'])
+                self._save_coverage(ts_code, {
+                    'start': min(start_date, coverage['start']) if coverage else start_date,
+                    'end': covered_end,
+                    'fetched_at': now.isoformat(timespec='seconds')
+                })
+                print(f"{ts_code} 补充日线: {', '.join(f'{start}-{end}' for start, end in ranges)}")
+
+        if frame is None or frame.empty:
+            return pd.DataFrame(columns=DAILY_COLUMNS)
+        df = frame[(frame['trade_date'] >= start_date) & (frame['trade_date'] <= end_date)]
+        return df.reset_index(drop=True)
+
+    def latest_date(self, pro, ts_code, end_date):
+        """按增量补数规则补齐到 end_date 后，本地最新一根日线的日期；从未拉取过的股票返回None"""
+        coverage = self._load_coverage().get(ts_code)
+        if coverage is None:
+            return None
+        df = self.get_history(pro, ts_code, coverage['start'], end_date)
+        return df['trade_date'].iloc[-1] if not df.empty else None
+
+
+def _shift_date(date, days):
+    return (datetime.strptime(date, '%Y%m%d') + timedelta(days=days)).strftime('%Y%m%d')
+
+
+hk_history_store = SymbolHistoryStore('hk_daily', hk_calendar, HK_HISTORY_DIR)
+us_history_store = SymbolHistoryStore('us_daily', us_calendar, US_HISTORY_DIR)
+
+
+def get_symbol_history(pro, ts_code, start_date, end_date, sync=True):
+    """
+    按代码后缀从对应市场的本地存储读取单只股票的日线，无法识别的市场返回None
+    sync为False时A股只读取本地已有的交易日；港股/美股总是按股票增量补数（单只股票的拉取量很小）。
+    """
+    if ts_code.endswith(('.SZ', '.SH', '.BJ')):
+        return history_store.get_history(pro, ts_code, start_date, end_date, sync=sync)
+    if ts_code.endswith('.HK'):
+        return hk_history_store.get_history(pro, ts_code, start_date, end_date)
+    if ts_code.endswith('.US'):
+        return us_history_store.get_history(pro, ts_code, start_date, end_date)
+    return None
+
+
+def get_symbol_latest_date(pro, ts_code, end_date):
+    """港股/美股本地补齐后最新一根日线的日期，其他市场或从未拉取过时返回None"""
+    if ts_code.endswith('.HK'):
+        return hk_history_store.latest_date(pro, ts_code, end_date)
+    if ts_code.endswith('.US'):
+        return us_history_store.latest_date(pro, ts_code, end_date)
+    return None
+
+
+if __name__ == "__main__":
+    from config import ALL_TIME_YEARS
+    from fetcher import get_pro
+
+    # 回填本地历史数据
+    pro = get_pro()
+    end_date = datetime.today()
+    start_date = end_date - timedelta(days=ALL_TIME_YEARS * 365)
+    trade_dates = trade_calendar.trading_days_between(pro, start_date.strftime('%Y%m%d'), end_date.strftime('%Y%m%d'))
+    print(f"🚀 开始回填 {len(trade_dates)} 个交易日的日线数据...")
+    fetched = history_store.sync(pro, trade_dates)
+    print(f"回填完成，新增 {len(fetched)} 个交易日")
@@ -0,0 +1,149 @@
+from datetime import datetime
+from email.utils import formatdate, parsedate_to_datetime
+from fastapi import Request, Response
+from starlette.datastructures import MutableHeaders
+from starlette.middleware.gzip import GZipMiddleware
+from config import (
+    HTTP_CACHE_MAX_AGE,
+    HTTP_CACHE_LIVE_MAX_AGE,
+    HTTP_COMPRESS_MIN_BYTES,
+    HTTP_GZIP_LEVEL,
+    SNAPSHOT_SETTLE_TIME
+)
+from data_access import run_blocking
+from data_version import data_versions
+from trade_calendar import get_latest_trade_date, trade_calendar
+
+try:
+    # 可选依赖：安装 brotli-asgi 后优先使用 brotli，客户端不支持时回落到 gzip
+    from brotli_asgi import BrotliMiddleware
+except ImportError:
+    BrotliMiddleware = None
+
+# 接口路径前缀 -> 依赖的数据（data_versions 中的名称：market 或分析结果的表名），按最长前缀匹配
+# is-highest-today 的港股/美股数据不随A股交易日变化，不做缓存
+CACHE_ROUTES = {
+    '/api/stocks': 'market',
+    '/api/stock/': 'market',
+    '/api/filters': 'market',
+    '/api/high-rise-stocks': 'market',
+    '/api/market-analysis': 'market',
+    '/api/market-stats-simple': 'market',
+    '/api/rise_fall_distribution/recent': 'market',
+    '/api/market_stats': 'market_stats',
+    '/api/high_rise_stocks': 'high_rise_stocks',
+    '/api/rise_fall_distribution': 'rise_fall_distribution',
+    '/api/unified_market_analysis': 'unified_market_analysis',
+}
+
+
+def route_dataset(path):
+    """返回接口依赖的数据名称，不缓存的接口返回None"""
+    matched = None
+    for prefix in CACHE_ROUTES:
+        if path.startswith(prefix) and (matched is None or len(prefix) > len(matched)):
+            matched = prefix
+    return CACHE_ROUTES[matched] if matched else None
+
+
+def is_live(trade_date, now):
+    """最新交易日是今天且还没到数据稳定时间，数据仍可能变化"""
+    hour, minute = map(int, SNAPSHOT_SETTLE_TIME.split(':'))
+    settle_time = now.replace(hour=hour, minute=minute, second=0, microsecond=0)
+    return trade_date == now.strftime('%Y%m%d') and now < settle_time
+
+
+def cache_policy(trade_date, dataset, now=None):
+    """
+    按交易日历计算 (ETag, Last-Modified, Cache-Control)
+    已收盘的交易日数据不再变化，缓存到下一次可能出现新交易日数据的时间（不超过 HTTP_CACHE_MAX_AGE）；
+    当天数据稳定前只缓存 HTTP_CACHE_LIVE_MAX_AGE 秒，ETag 按同样的时间段变化。
+    该交易日的数据还没写入时（分析结果由收盘后的定时任务生成，可能晚于数据稳定时间并按间隔重试）
+    返回 no-cache，客户端每次都重新验证，数据写入后立即拿到新结果。
+    """
+    now = now or datetime.now()
+    token, modified_at, ready = data_versions.version(dataset, trade_date)
+    etag = f'{trade_date}-{token}'
+    if not ready:
+        cache_control = 'no-cache'
+    elif is_live(trade_date, now):
+        etag += f'-{int(now.timestamp()) // HTTP_CACHE_LIVE_MAX_AGE}'
+        cache_control = f'public, max-age={HTTP_CACHE_LIVE_MAX_AGE}'
+    else:
+        valid_until = trade_calendar.latest_valid_until()
+        max_age = HTTP_CACHE_MAX_AGE
+        if valid_until is not None:
+            max_age = max(0, min(max_age, int((valid_until - now).total_seconds())))
+        cache_control = f'public, max-age={max_age}'
+    last_modified = formatdate(modified_at, usegmt=True)
+    return f'W/"{etag}"', last_modified, cache_control
+
+
+def not_modified(request, etag, last_modified):
+    """客户端缓存是否仍然有效：优先比较 If-None-Match，没有时比较 If-Modified-Since"""
+    if_none_match = request.headers.get('if-none-match')
+    if if_none_match is not None:
+        return etag in [tag.strip() for tag in if_none_match.split(',')] or if_none_match.strip() == '*'
+    if_modified_since = request.headers.get('if-modified-since')
+    if if_modified_since:
+        try:
+            return parsedate_to_datetime(last_modified) <= parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+    return False
+
+
+class ConditionalGetMiddleware:
+    """
+    基于交易日和数据版本的条件请求（ASGI中间件，不改变响应体的流式传输）
+    ETag 在调用接口之前就能确定，客户端缓存有效时直接返回304，不执行接口；
+    接口自己设置了 ETag（如预先序列化的综合分析）时保留接口的 ETag，只补充 Cache-Control。
+    """
+
+    def __init__(self, app, pro):
+        self.app = app
+        self.pro = pro
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http' or scope['method'] not in ('GET', 'HEAD'):
+            await self.app(scope, receive, send)
+            return
+        dataset = route_dataset(scope['path'])
+        trade_date = await run_blocking(get_latest_trade_date, self.pro) if dataset else None
+        if not trade_date:
+            await self.app(scope, receive, send)
+            return
+        # 数据版本可能需要查询数据库，与交易日一样放到线程池中计算
+        etag, last_modified, cache_control = await run_blocking(cache_policy, trade_date, dataset)
+        cache_headers = {'ETag': etag, 'Last-Modified': last_modified, 'Cache-Control': cache_control}
+        if not_modified(Request(scope), etag, last_modified):
+            await Response(status_code=304, headers=cache_headers)(scope, receive, send)
+            return
+
+        async def send_with_cache_headers(message):
+            if message['type'] == 'http.response.start':
+                headers = MutableHeaders(scope=message)
+                if message['status'] == 200:
+                    if 'etag' in headers:
+                        headers['Cache-Control'] = cache_control
+                    else:
+                        for name, value in cache_headers.items():
+                            headers[name] = value
+                elif message['status'] != 304:
+                    headers['Cache-Control'] = 'no-store'
+            await send(message)
+
+        await self.app(scope, receive, send_with_cache_headers)
+
+
+def add_http_cache(app, pro):
+    """注册条件请求中间件，须在 CORS 中间件之前调用，使304响应同样带上跨域头"""
+    app.add_middleware(ConditionalGetMiddleware, pro=pro)
+
+
+def add_compression(app):
+    """注册响应压缩中间件，在 CORS 之后调用使其位于最外层；已设置 Content-Encoding 的响应不会重复压缩"""
+    if BrotliMiddleware is not None:
+        app.add_middleware(BrotliMiddleware, minimum_size=HTTP_COMPRESS_MIN_BYTES, gzip_fallback=True)
+    else:
+        app.add_middleware(GZipMiddleware, minimum_size=HTTP_COMPRESS_MIN_BYTES, compresslevel=HTTP_GZIP_LEVEL)
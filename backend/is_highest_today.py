@@ -1,19 +1,32 @@
-import tushare as ts
-import matplotlib.pyplot as plt
-import matplotlib.dates as mdates
 from datetime import datetime, timedelta
-from config import TUSHARE_TOKEN, MAX_YEARS
+from config import MAX_YEARS
+from fetcher import get_pro
 import pandas as pd
-
-# 设置中文字体
-plt.rcParams['font.sans-serif'] = ['SimHei', 'Microsoft YaHei']
-plt.rcParams['axes.unicode_minus'] = False
-
-
-def is_today_highest(stock_code: str):
-    # 初始化 tushare
-    ts.set_token(TUSHARE_TOKEN)
-    pro = ts.pro_api()
+from history_store import history_store, get_symbol_history
+from trade_calendar import get_latest_trade_date
+from reference_data import reference_data
+from rolling_max_index import rolling_max_index
+from serialization import frame_to_records
+from downsample import downsample_history
+
+# 折线图历史数据字段：(字段名, 列名, 类型, 缺失值)，港股/美股没有的列取缺失值
+HISTORY_FIELDS = [
+    ("date", "trade_date", str, ""),
+    ("close", "close", float, 0.0),
+    ("high", "high", float, 0.0),
+    ("low", "low", float, 0.0),
+    ("pct_chg", "pct_chg", float, 0.0),
+    ("vol", "vol", float, 0.0),
+]
+
+
+def analyze_today_highest(stock_code: str):
+    """
+    判断股票今日收盘价是否为近几年最高
+    返回 (结果摘要, 按日期升序的历史数据DataFrame)；无法分析时返回 ({"error": ...}, None)。
+    """
+    # 获取限流的 tushare 客户端
+    pro = get_pro()
 
     # 计算日期范围
     end_date = datetime.today()
@@ -22,23 +35,24 @@ def is_today_highest(stock_code: str):
     start_date_str = start_date.strftime('%Y%m%d')
 
     # 判断股票类型
+    # 各市场都读取本地历史数据（港股/美股按股票增量补齐）
     if stock_code.endswith('.SZ') or stock_code.endswith('.SH') or stock_code.endswith('.BJ'):
-        # A股
-        df = pro.daily(ts_code=stock_code, start_date=start_date_str, end_date=end_date_str)
         market = 'A股'
     elif stock_code.endswith('.HK'):
-        # 港股
-        df = pro.hk_daily(ts_code=stock_code, start_date=start_date_str, end_date=end_date_str)
         market = '港股'
     elif stock_code.endswith('.US'):
-        # 美股
-        df = pro.us_daily(ts_code=stock_code, start_date=start_date_str, end_date=end_date_str)
         market = '美股'
     else:
-        return {"error": "无法识别股票代码后缀，请输入标准股票代码，如 000001.SZ、01810.HK、AAPL.US"}
+        return {"error": "无法识别股票代码后缀，请输入标准股票代码，如 000001.SZ、01810.HK、AAPL.US"}, None
+    if market == 'A股':
+        # A股只读本地已同步的全市场日线（由定时任务同步），窗口不完整时不分析，避免把部分历史当作全部
+        latest_date = get_latest_trade_date(pro)
+        if not latest_date or history_store.missing_dates(pro, start_date_str, latest_date):
+            return {"error": "A股历史日线尚未同步完成，请稍后再试"}, None
+    df = get_symbol_history(pro, stock_code, start_date_str, end_date_str, sync=False)
 
     if df is None or df.empty:
-        return {"error": f"未获取到股票 {stock_code} 的历史数据"}
+        return {"error": f"未获取到股票 {stock_code} 的历史数据"}, None
 
     # 按交易日期排序（最新在前）
     df = df.sort_values('trade_date', ascending=False)
@@ -53,24 +67,14 @@ def is_today_highest(stock_code: str):
     # 获取股票名称
     stock_name = None
     try:
-        stock_info = pro.stock_basic(ts_code=stock_code)
-        if not stock_info.empty:
-            stock_name = stock_info.iloc[0]['name']
+        stock_info = reference_data.lookup(pro, stock_code)
+        if stock_info is not None:
+            stock_name = stock_info['name']
     except Exception as e:
         stock_name = None
 
-    # 准备历史数据用于前端折线图
-    df_sorted = df.sort_values('trade_date')
-    history = []
-    for _, row in df_sorted.iterrows():
-        history.append({
-            "date": str(row['trade_date']),
-            "close": float(row['close']),
-            "high": float(row['high']),
-            "low": float(row['low']),
-            "pct_chg": float(row['pct_chg']) if 'pct_chg' in row else 0.0,
-            "vol": float(row['vol']) if 'vol' in row else 0.0
-        })
+    # 历史数据按日期升序，用于前端折线图
+    df_sorted = df.sort_values('trade_date').reset_index(drop=True)
 
     # 计算数据期间和天数
     if not df_sorted.empty:
@@ -82,7 +86,13 @@ def is_today_highest(stock_code: str):
         data_period = ""
         total_days = 0
 
-    is_highest = today_close >= max_close
+    # A股直接查新高索引（索引已追加到最新交易日时）
+    index_info = rolling_max_index.lookup(stock_code) if market == 'A股' else None
+    if index_info and index_info['last_date'] == str(today_date) and index_info.get(f'max_{MAX_YEARS}y') is not None:
+        max_close = index_info[f'max_{MAX_YEARS}y']
+        is_highest = rolling_max_index.is_new_high(stock_code, f'{MAX_YEARS}y')
+    else:
+        is_highest = today_close >= max_close
 
     result = {
         "ts_code": stock_code,
@@ -96,7 +106,6 @@ def is_today_highest(stock_code: str):
         "pct_chg": pct_chg,
         "vol": vol,
         "amount": amount,
-        "history": history,
         "data_period": data_period,
         "total_days": total_days
     }
@@ -106,61 +115,28 @@ def is_today_highest(stock_code: str):
     else:
         print(f"{stock_code}（{market}）在 {today_date} 的收盘价 {today_close} 不是近{MAX_YEARS}年内最高价，最高为 {max_close}")
 
+    return result, df_sorted
+
+
+def with_history(result, history, points=None):
+    """把历史数据转换为前端折线图使用的列表加入结果，points 不为空时降采样到约 points 个点（保留最高收盘价和最新一天）"""
+    if history is not None:
+        result["history"] = frame_to_records(downsample_history(history, points), HISTORY_FIELDS)
     return result
 
 
-def plot_price_curve(df, stock_code, market, today_close, max_close, today_date):
-    """绘制股价曲线"""
-    # 转换日期格式
-    df['trade_date'] = pd.to_datetime(df['trade_date'], format='%Y%m%d')
-    
-    # 按日期正序排列
-    df_sorted = df.sort_values('trade_date')
-    
-    # 创建图表
-    plt.figure(figsize=(12, 8))
-    
-    # 绘制收盘价曲线
-    plt.plot(df_sorted['trade_date'], df_sorted['close'], linewidth=2, color='blue', label='收盘价')
-    
-    # 标注最高价点
-    max_price_date = df_sorted.loc[df_sorted['close'].idxmax(), 'trade_date']
-    plt.scatter(max_price_date, max_close, color='red', s=100, zorder=5, label=f'最高价: {max_close:.2f}')
-    plt.annotate(f'最高价\n{max_close:.2f}', 
-                xy=(max_price_date, max_close), 
-                xytext=(10, 10), textcoords='offset points',
-                bbox=dict(boxstyle='round,pad=0.3', facecolor='red', alpha=0.7),
-                fontsize=10, color='white')
-    
-    # 标注今日价格
-    today_date_dt = pd.to_datetime(today_date, format='%Y%m%d')
-    plt.scatter(today_date_dt, today_close, color='green', s=100, zorder=5, label=f'今日价格: {today_close:.2f}')
-    plt.annotate(f'今日价格\n{today_close:.2f}', 
-                xy=(today_date_dt, today_close), 
-                xytext=(10, -20), textcoords='offset points',
-                bbox=dict(boxstyle='round,pad=0.3', facecolor='green', alpha=0.7),
-                fontsize=10, color='white')
-    
-    # 设置图表属性
-    plt.title(f'{stock_code}（{market}）近{MAX_YEARS}年股价走势图', fontsize=16, fontweight='bold')
-    plt.xlabel('日期', fontsize=12)
-    plt.ylabel('股价（元）', fontsize=12)
-    plt.grid(True, alpha=0.3)
-    plt.legend()
-    
-    # 设置x轴日期格式
-    plt.gca().xaxis.set_major_formatter(mdates.DateFormatter('%Y-%m'))
-    plt.gca().xaxis.set_major_locator(mdates.MonthLocator(interval=6))
-    plt.xticks(rotation=45)
-    
-    # 自动调整布局
-    plt.tight_layout()
-    
-    # 显示图表
-    plt.show()
+def is_today_highest(stock_code: str, points=None):
+    """判断股票今日收盘价是否为近几年最高，结果包含历史走势"""
+    result, history = analyze_today_highest(stock_code)
+    return with_history(result, history, points)
 
 
 if __name__ == "__main__":
     # 示例：输入股票代码
     stock_code = input("请输入股票代码（如 000001.SZ、01810.HK、AAPL.US）: ")
-    is_today_highest(stock_code) 
\ No newline at end of file
+    result = is_today_highest(stock_code)
+    if 'error' not in result:
+        from charts import plot_price_curve
+        history_df = pd.DataFrame(result['history']).rename(columns={'date': 'trade_date'})
+        plot_price_curve(history_df, stock_code, result['market'], result['today_close'],
+                         result['max_close'], result['trade_date']) 
\ No newline at end of file
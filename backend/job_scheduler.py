@@ -0,0 +1,158 @@
+import json
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+from apscheduler.schedulers.background import BackgroundScheduler
+from apscheduler.triggers.cron import CronTrigger
+from config import (JOB_START_TIME, JOB_STAGGER_MINUTES, JOB_MAX_RETRIES,
+                    JOB_RETRY_MINUTES, JOB_STATE_PATH)
+from fetcher import get_pro
+from trade_calendar import get_latest_trade_date, is_trading_day
+from single_flight import single_flight
+from scheduler import save_daily_analysis, warm_market_history
+from metrics import job_runs, job_duration
+
+# 按执行顺序排列的任务，相邻任务错开 JOB_STAGGER_MINUTES 分钟
+# market_history 同步接口读取的本地历史日线并更新新高索引；
+# 每日分析流水线一次加载全市场数据，完成涨跌统计、涨跌分布、综合分析和高涨幅新高四项分析（合为一个任务，避免重复拉取）
+JOBS = [
+    ('market_history', warm_market_history),
+    ('daily_analysis', save_daily_analysis),
+]
+
+
+class JobScheduler:
+    """
+    交易日收盘后的定时任务
+    每个任务按错开的时间在工作日触发，非交易日直接跳过；当天数据尚未就绪或执行失败时按间隔重试。
+    每个任务最近一次成功处理的交易日持久化到本地文件，重启后只补跑缺失的交易日，不重复计算。
+    """
+
+    def __init__(self, jobs=JOBS, state_path=JOB_STATE_PATH):
+        self.jobs = dict(jobs)
+        self._order = [name for name, _ in jobs]
+        self.state_path = state_path
+        self._lock = threading.Lock()
+        self._running = set()
+        self._state = self._load_state()
+        self._scheduler = None
+
+    def _load_state(self):
+        if not os.path.exists(self.state_path):
+            return {}
+        try:
+            with open(self.state_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except Exception as e:
+            print(f"读取定时任务状态失败: {e}")
+            return {}
+
+    def _save_state(self):
+        os.makedirs(os.path.dirname(self.state_path), exist_ok=True)
+        tmp_path = self.state_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self._state, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.state_path)
+
+    def last_trade_date(self, name):
+        """任务最近一次成功处理的交易日"""
+        with self._lock:
+            return self._state.get(name, {}).get('trade_date')
+
+    def _record(self, name, trade_date):
+        with self._lock:
+            self._state[name] = {
+                'trade_date': trade_date,
+                'finished_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+            }
+            self._save_state()
+
+    def run_job(self, name, expected_date=None, attempt=0):
+        """
+        执行一个任务
+        expected_date 为本次应处理的交易日（定时触发时为当天），最新可用交易日还没到时视为数据未就绪，稍后重试。
+        """
+        with self._lock:
+            if name in self._running:
+                print(f"任务 {name} 正在执行，跳过本次触发")
+                job_runs.inc(job=name, outcome='overlap')
+                return
+            self._running.add(name)
+        start = time.perf_counter()
+        outcome = 'failed'
+        try:
+            pro = get_pro()
+            latest = get_latest_trade_date(pro)
+            if latest is None or (expected_date and latest < expected_date):
+                outcome = 'not_ready'
+                raise RuntimeError(f"{expected_date or '最新交易日'} 的数据尚未就绪")
+            if (self.last_trade_date(name) or '') >= latest:
+                print(f"任务 {name} 已处理过 {latest}，跳过")
+                outcome = 'skipped'
+                return
+            print(f"开始执行任务 {name}（交易日 {latest}）")
+            # 与刷新接口共用同一个 "任务名:交易日" 键，同时触发时只执行一次
+            single_flight.run(f'{name}:{latest}', self.jobs[name])
+            self._record(name, latest)
+            outcome = 'success'
+            print(f"任务 {name} 执行完成（交易日 {latest}）")
+        except Exception as e:
+            print(f"任务 {name} 执行失败（第{attempt + 1}次）: {e}")
+            self._schedule_retry(name, expected_date, attempt)
+        finally:
+            with self._lock:
+                self._running.discard(name)
+            job_runs.inc(job=name, outcome=outcome)
+            job_duration.observe(time.perf_counter() - start, job=name, outcome=outcome)
+
+    def _schedule_retry(self, name, expected_date, attempt):
+        if self._scheduler is None:
+            return
+        if attempt >= JOB_MAX_RETRIES:
+            print(f"任务 {name} 重试次数已用尽")
+            return
+        run_date = datetime.now() + timedelta(minutes=JOB_RETRY_MINUTES)
+        self._scheduler.add_job(self.run_job, 'date', run_date=run_date,
+                                args=[name, expected_date, attempt + 1],
+                                id=f'{name}_retry', replace_existing=True)
+        print(f"任务 {name} 将于 {run_date.strftime('%H:%M')} 重试")
+
+    def _run_scheduled(self, name):
+        """定时触发入口：只在交易日执行"""
+        today = datetime.now().strftime('%Y%m%d')
+        try:
+            if not is_trading_day(get_pro(), today):
+                return
+        except Exception as e:
+            print(f"查询交易日历失败: {e}")
+        self.run_job(name, expected_date=today)
+
+    def catch_up(self):
+        """按顺序补跑最近一个可用交易日尚未处理的任务（包括同步本地历史数据）"""
+        for name in self._order:
+            self.run_job(name)
+
+    def start(self):
+        """启动调度器，并在后台补跑重启期间错过的任务"""
+        if self._scheduler is not None:
+            return
+        self._scheduler = BackgroundScheduler(job_defaults={'coalesce': True, 'max_instances': 1})
+        hour, minute = map(int, JOB_START_TIME.split(':'))
+        start = datetime(2000, 1, 1, hour, minute)
+        for i, name in enumerate(self._order):
+            run_at = start + timedelta(minutes=i * JOB_STAGGER_MINUTES)
+            self._scheduler.add_job(self._run_scheduled, CronTrigger(day_of_week='mon-fri', hour=run_at.hour,
+                                                                     minute=run_at.minute),
+                                    args=[name], id=name, misfire_grace_time=3600)
+        self._scheduler.add_job(self.catch_up, 'date', run_date=datetime.now(), id='catch_up')
+        self._scheduler.start()
+        print(f"定时任务已启动: {', '.join(self._order)}，每个交易日 {JOB_START_TIME} 起执行")
+
+    def shutdown(self):
+        if self._scheduler is not None:
+            self._scheduler.shutdown(wait=False)
+            self._scheduler = None
+
+
+job_scheduler = JobScheduler()
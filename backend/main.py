@@ -1,23 +1,49 @@
-from fastapi import FastAPI, HTTPException, Query, BackgroundTasks
+from fastapi import FastAPI, HTTPException, Query, Depends, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
-import tushare as ts
-import pandas as pd
+from fastapi.responses import StreamingResponse
 from datetime import datetime, timedelta
 from typing import Optional, List
+from pydantic import BaseModel, Field
 import json
-from config import TUSHARE_TOKEN
+import csv
+import io
+import orjson
 from scheduler import (
+    save_daily_analysis,
     save_market_stats,
     save_high_rise_stocks,
     save_rise_fall_distribution,
     save_unified_market_analysis
 )
-from models import SessionLocal, MarketStats, HighRiseStock, RiseFallDistribution, UnifiedMarketAnalysis, StockHighestCheck
-from is_highest_today import is_today_highest
+from sqlalchemy.orm import Session
+from models import engine, init_db, get_db, MarketStats, HighRiseStock, RiseFallDistribution, UnifiedMarketAnalysis
+from highest_check_cache import check_highest
+from watchlist import check_watchlist, shutdown as shutdown_watchlist
+from history_store import history_store
+from trade_calendar import get_latest_trade_date, get_previous_trading_days
+from snapshot_cache import get_market_snapshot
+from stock_query import get_stock_query, encode_cursor, decode_cursor
+from reference_data import reference_data
+from rolling_max_index import IndexNotReady
+from distribution import analyze_distribution, analyze_multi_day_distribution
+from data_access import run_blocking, shutdown as shutdown_data_access
+from job_scheduler import job_scheduler
+from single_flight import single_flight
+from downsample import downsample_history
+from serialization import stored_body_response, FastJSONResponse, frame_to_records
+from fetcher import get_pro
+from http_cache import add_http_cache, add_compression
+from metrics import add_metrics, render as render_metrics
+from config import ENABLE_JOB_SCHEDULER, HIGH_RISE_LOOKBACK_DAYS, STOCK_SORT_FIELDS, STOCK_EXPORT_CHUNK_ROWS, WATCHLIST_MAX_CODES
 
 app = FastAPI(title="股票信息API", version="1.0.0")
 
+# 初始化tushare（限流并带重试的客户端）
+pro = get_pro()
+
+# 按交易日和数据版本生成 ETag，客户端缓存有效时直接返回304
+add_http_cache(app, pro)
+
 # 配置CORS
 app.add_middleware(
     CORSMiddleware,
@@ -27,18 +53,71 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# 初始化tushare
-ts.set_token(TUSHARE_TOKEN)
-pro = ts.pro_api()
+# 压缩较大的响应
+add_compression(app)
+
+# 接口耗时、并发数等监控指标（最外层，包含304和压缩的耗时）
+add_metrics(app)
+
+# 股票列表每行输出的字段：(字段名, 列名, 类型, 缺失值)
+STOCK_FIELDS = [
+    ("ts_code", "ts_code", str, "未知"),
+    ("name", "name", str, "未知"),
+    ("close", "close", float, 0.0),
+    ("pct_chg", "pct_chg", float, 0.0),
+    ("vol", "vol", float, 0.0),
+    ("amount", "amount", float, 0.0),
+    ("area", "area", str, "未知"),
+    ("industry", "industry", str, "未知"),
+    ("market", "market", str, "未知"),
+    ("trade_date", "trade_date", str, ""),
+]
+
+# 股票详情中的历史走势字段
+DETAIL_HISTORY_FIELDS = [
+    ("date", "trade_date", str, ""),
+    ("close", "close", float, 0.0),
+    ("pct_chg", "pct_chg", float, 0.0),
+    ("vol", "vol", float, 0.0),
+]
+
+# 高涨幅股票输出的字段
+HIGH_RISE_FIELDS = [
+    ("ts_code", "ts_code", str, ""),
+    ("name", "name", str, "未知"),
+    ("area", "area", str, "未知"),
+    ("industry", "industry", str, "未知"),
+    ("close", "close", float, 0.0),
+    ("pct_chg", "pct_chg", float, 0.0),
+    ("vol", "vol", float, 0.0),
+    ("amount", "amount", float, 0.0),
+    ("recent_high", "recent_high", float, 0.0),
+]
+
+@app.on_event("startup")
+def on_startup():
+    init_db(engine)
+    # 收盘后定时刷新数据库中的分析结果
+    if ENABLE_JOB_SCHEDULER:
+        job_scheduler.start()
+
+@app.on_event("shutdown")
+def on_shutdown():
+    job_scheduler.shutdown()
+    single_flight.shutdown()
+    shutdown_watchlist()
+    shutdown_data_access()
 
 @app.get("/")
 async def root():
     return {"message": "股票信息API服务运行中"}
 
-@app.get("/api/stocks")
-async def get_stocks(
-    page: int = Query(1, ge=1, description="页码"),
-    page_size: int = Query(50, ge=1, le=100, description="每页数量"),
+@app.get("/metrics")
+async def metrics():
+    """Prometheus 文本格式的监控指标：接口耗时与并发、tushare调用、缓存命中和定时任务"""
+    return Response(content=render_metrics(), media_type="text/plain; version=0.0.4")
+
+def stock_list_params(
     min_rise: Optional[float] = Query(None, description="最小涨幅"),
     max_rise: Optional[float] = Query(None, description="最大涨幅"),
     min_price: Optional[float] = Query(None, description="最低价格"),
@@ -47,94 +126,71 @@ async def get_stocks(
     sort_by: str = Query("pct_chg", description="排序字段"),
     sort_order: str = Query("desc", description="排序方向(asc/desc)")
 ):
-    """获取股票列表"""
+    """股票列表和导出共用的过滤、排序参数"""
+    if sort_by not in STOCK_SORT_FIELDS:
+        raise HTTPException(status_code=400, detail=f"不支持的排序字段: {sort_by}，可选: {', '.join(STOCK_SORT_FIELDS)}")
+    return {
+        "sort_by": sort_by,
+        "ascending": sort_order == "asc",
+        "filters": dict(min_rise=min_rise, max_rise=max_rise, min_price=min_price, max_price=max_price, market=market)
+    }
+
+async def load_stock_query():
+    """获取最新交易日及其查询索引（预先建立排序索引，按交易日缓存）"""
+    latest_date = await run_blocking(get_latest_trade_date, pro)
+    if not latest_date:
+        raise HTTPException(status_code=500, detail="无法获取最新交易日数据")
+    query = await run_blocking(get_stock_query, pro, latest_date)
+    if query is None:
+        raise HTTPException(status_code=500, detail="无法获取股票数据")
+    return latest_date, query
+
+@app.get("/api/stocks")
+async def get_stocks(
+    page: int = Query(1, ge=1, description="页码"),
+    page_size: int = Query(50, ge=1, le=100, description="每页数量"),
+    cursor: Optional[str] = Query(None, description="分页游标（上一页返回的next_cursor），传入时忽略page"),
+    params: dict = Depends(stock_list_params)
+):
+    """获取股票列表（支持页码分页和游标分页）"""
+    sort_by, ascending = params["sort_by"], params["ascending"]
+    try:
+        after = decode_cursor(cursor, sort_by, ascending) if cursor else None
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     try:
-        print(f"开始处理股票列表请求: page={page}, page_size={page_size}")
+        latest_date, query = await load_stock_query()
         
-        # 获取最新交易日
-        latest_date = get_latest_trade_date()
-        print(f"最新交易日: {latest_date}")
-        if not latest_date:
-            raise HTTPException(status_code=500, detail="无法获取最新交易日数据")
+        # 过滤条件合并为一个掩码，在预先排好的顺序上筛选；有游标时从游标之后开始
+        positions = query.positions(sort_by, ascending=ascending, after=after, **params["filters"])
+        offset = 0 if after is not None else (page - 1) * page_size
         
-        # 获取股票数据
-        print("正在获取股票数据...")
-        df = pro.daily(trade_date=latest_date)
-        if df is None or df.empty:
-            raise HTTPException(status_code=500, detail="无法获取股票数据")
-        print(f"获取到股票数据: {len(df)}只股票")
-        
-        # 获取股票基本信息（只获取需要的字段）
-        print("正在获取股票基本信息...")
-        stock_basic = pro.stock_basic(fields='ts_code,name,area,industry,market')
-        print(f"获取到股票基本信息: {len(stock_basic)}只股票")
-        
-        # 合并数据
-        print("正在合并数据...")
-        df = df.merge(stock_basic, on='ts_code', how='left')
-        print(f"合并后数据: {len(df)}只股票")
-        
-        # 应用过滤条件
-        print("正在应用过滤条件...")
-        if min_rise is not None:
-            df = df[df['pct_chg'] >= min_rise]
-        if max_rise is not None:
-            df = df[df['pct_chg'] <= max_rise]
-        if min_price is not None:
-            df = df[df['close'] >= min_price]
-        if max_price is not None:
-            df = df[df['close'] <= max_price]
-        if market:
-            df = df[df['ts_code'].str.endswith(f'.{market}')]
-        
-        # 排序
-        print(f"正在按{sort_by}排序...")
-        if sort_order == "desc":
-            df = df.sort_values(sort_by, ascending=False)
+        # 分页，只对当前页关联股票基本信息
+        total = len(positions)
+        page_data = query.page(positions, offset, page_size)
+        
+        # 按列转换为JSON格式，缺失值填默认值
+        stocks = frame_to_records(page_data, STOCK_FIELDS)
+        
+        # 还有后续数据时返回下一页的游标
+        next_cursor = None
+        if offset + page_size < total:
+            next_cursor = encode_cursor(sort_by, ascending, query.cursor_key(sort_by, positions[offset + page_size - 1]))
+        
+        pagination = {"page_size": page_size, "next_cursor": next_cursor}
+        if after is None:
+            pagination.update(page=page, total=total, total_pages=(total + page_size - 1) // page_size)
         else:
-            df = df.sort_values(sort_by, ascending=True)
-        
-        # 分页
-        total = len(df)
-        start_idx = (page - 1) * page_size
-        end_idx = start_idx + page_size
-        df_page = df.iloc[start_idx:end_idx]
-        print(f"分页结果: 第{page}页，共{len(df_page)}条记录")
-        
-        # 转换为JSON格式（优化）
-        print("正在转换为JSON格式...")
-        stocks = []
-        for _, row in df_page.iterrows():
-            try:
-                stock = {
-                    "ts_code": str(row['ts_code']),
-                    "name": str(row['name']) if pd.notna(row['name']) else "未知",
-                    "close": float(row['close']) if pd.notna(row['close']) else 0.0,
-                    "pct_chg": float(row['pct_chg']) if pd.notna(row['pct_chg']) else 0.0,
-                    "vol": float(row['vol']) if pd.notna(row['vol']) else 0.0,
-                    "amount": float(row['amount']) if pd.notna(row['amount']) else 0.0,
-                    "area": str(row['area']) if pd.notna(row['area']) else "未知",
-                    "industry": str(row['industry']) if pd.notna(row['industry']) else "未知",
-                    "market": str(row['market']) if pd.notna(row['market']) else "未知",
-                    "trade_date": str(row['trade_date'])
-                }
-                stocks.append(stock)
-            except Exception as e:
-                print(f"处理股票数据时出错: {e}, 股票代码: {row.get('ts_code', 'unknown')}")
-                continue
-        
-        print("请求处理完成")
-        return {
+            # 游标分页时 total 为游标之后剩余的数量
+            pagination.update(remaining=total)
+        return FastJSONResponse({
             "data": stocks,
-            "pagination": {
-                "page": page,
-                "page_size": page_size,
-                "total": total,
-                "total_pages": (total + page_size - 1) // page_size
-            },
+            "pagination": pagination,
             "trade_date": latest_date
-        }
+        })
         
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         print(f"处理股票列表请求时出错: {str(e)}")
         import traceback
@@ -142,37 +198,70 @@ async def get_stocks(
         print(traceback.format_exc())
         raise HTTPException(status_code=500, detail=f"获取股票数据失败: {str(e)}")
 
+def iter_stock_export(query, positions, fmt):
+    """按块把行转换为 NDJSON 或 CSV 文本，内存占用只与块大小有关"""
+    names = [field[0] for field in STOCK_FIELDS]
+    if fmt == "csv":
+        # 带BOM，Excel打开时中文不乱码
+        yield "\ufeff" + ",".join(names) + "\r\n"
+    for offset in range(0, len(positions), STOCK_EXPORT_CHUNK_ROWS):
+        records = frame_to_records(query.page(positions, offset, STOCK_EXPORT_CHUNK_ROWS), STOCK_FIELDS)
+        if fmt == "csv":
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            writer.writerows([record[name] for name in names] for record in records)
+            yield buffer.getvalue()
+        else:
+            yield b"".join(orjson.dumps(record) + b"\n" for record in records)
+
+@app.get("/api/stocks/export")
+async def export_stocks(
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$", description="导出格式(ndjson/csv)"),
+    params: dict = Depends(stock_list_params)
+):
+    """按与股票列表相同的过滤和排序条件，一次流式导出全部结果"""
+    latest_date, query = await load_stock_query()
+    positions = query.positions(params["sort_by"], ascending=params["ascending"], **params["filters"])
+    media_type = "text/csv" if format == "csv" else "application/x-ndjson"
+    headers = {
+        "Content-Disposition": f'attachment; filename="stocks_{latest_date}.{format}"',
+        "X-Total-Count": str(len(positions))
+    }
+    return StreamingResponse(iter_stock_export(query, positions, format), media_type=media_type, headers=headers)
+
 @app.get("/api/stock/{ts_code}")
-async def get_stock_detail(ts_code: str):
+async def get_stock_detail(
+    ts_code: str,
+    points: Optional[int] = Query(None, ge=3, le=5000, description="历史走势降采样后的点数，不传返回全部")
+):
     """获取单个股票详细信息"""
     try:
         # 标准化股票代码格式
         ts_code = ts_code.upper()
         
-        latest_date = get_latest_trade_date()
+        latest_date = await run_blocking(get_latest_trade_date, pro)
         if not latest_date:
             raise HTTPException(status_code=500, detail="无法获取最新交易日数据")
         
-        # 获取股票数据
-        df = pro.daily(ts_code=ts_code, trade_date=latest_date)
+        # 获取股票数据（从本地当日全市场数据中取出）
+        df = await run_blocking(history_store.get_daily, pro, latest_date)
+        df = df[df['ts_code'] == ts_code] if df is not None and not df.empty else df
         if df is None or df.empty:
             raise HTTPException(status_code=404, detail="股票数据不存在")
         
         # 获取股票基本信息
-        stock_basic = pro.stock_basic(ts_code=ts_code, fields='ts_code,name,area,industry,market,list_date')
-        if stock_basic is None or stock_basic.empty:
+        basic_data = await run_blocking(reference_data.lookup, pro, ts_code)
+        if basic_data is None:
             raise HTTPException(status_code=404, detail="股票基本信息不存在")
         
         # 获取历史数据（最近30天）
         end_date = datetime.strptime(latest_date, '%Y%m%d')
         start_date = end_date - timedelta(days=30)
         
-        hist_df = pro.daily(ts_code=ts_code, 
-                           start_date=start_date.strftime('%Y%m%d'),
-                           end_date=latest_date)
+        hist_df = await run_blocking(history_store.get_history, pro, ts_code, start_date.strftime('%Y%m%d'), latest_date,
+                                     sync=False)
         
         stock_data = df.iloc[0]
-        basic_data = stock_basic.iloc[0]
         
         result = {
             "ts_code": stock_data['ts_code'],
@@ -191,19 +280,12 @@ async def get_stock_detail(ts_code: str):
             "trade_date": stock_data['trade_date']
         }
         
-        # 添加历史数据
+        # 添加历史数据（按日期降序，与 pro.daily 的返回顺序一致，前端翻转为正序绘图）
         if hist_df is not None and not hist_df.empty:
-            hist_data = []
-            for _, row in hist_df.iterrows():
-                hist_data.append({
-                    "date": row['trade_date'],
-                    "close": float(row['close']),
-                    "pct_chg": float(row['pct_chg']),
-                    "vol": float(row['vol'])
-                })
-            result["history"] = hist_data
-        
-        return result
+            history = downsample_history(hist_df, points).iloc[::-1]
+            result["history"] = frame_to_records(history, DETAIL_HISTORY_FIELDS)
+        
+        return FastJSONResponse(result)
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"获取股票详情失败: {str(e)}")
@@ -212,18 +294,14 @@ async def get_stock_detail(ts_code: str):
 async def get_filters():
     """获取过滤选项"""
     try:
-        latest_date = get_latest_trade_date()
+        latest_date = await run_blocking(get_latest_trade_date, pro)
         if not latest_date:
             raise HTTPException(status_code=500, detail="无法获取最新交易日数据")
         
-        df = pro.daily(trade_date=latest_date)
+        df = await run_blocking(get_market_snapshot, pro, latest_date)
         if df is None or df.empty:
             raise HTTPException(status_code=500, detail="无法获取股票数据")
         
-        # 获取股票基本信息
-        stock_basic = pro.stock_basic(fields='ts_code,area,industry,market')
-        df = df.merge(stock_basic, on='ts_code', how='left')
-        
         # 获取地区列表
         areas = df['area'].dropna().unique().tolist()
         areas.sort()
@@ -261,156 +339,170 @@ async def get_filters():
 
 @app.get("/api/high-rise-stocks")
 async def get_high_rise_stocks():
-    """获取3年新高且当天涨幅超过7%的股票"""
+    """获取3年新高且当天涨幅超过7%的股票（同一交易日的并发请求只计算一次）"""
     try:
-        latest_date = get_latest_trade_date()
+        latest_date = await run_blocking(get_latest_trade_date, pro)
         if not latest_date:
             raise HTTPException(status_code=500, detail="无法获取最新交易日数据")
         
-        print(f"开始获取高涨幅股票数据，日期: {latest_date}")
-        
-        # 获取最新交易日数据
-        df = pro.daily(trade_date=latest_date)
-        if df is None or df.empty:
-            raise HTTPException(status_code=500, detail="无法获取股票数据")
-        
-        print(f"获取到 {len(df)} 只股票数据")
-        
-        # 筛选涨幅超过7%的股票
-        high_rise_df = df[df['pct_chg'] > 7].copy()
-        print(f"涨幅超过7%的股票: {len(high_rise_df)} 只")
-        
-        if high_rise_df.empty:
-            return {"stocks": [], "count": 0, "trade_date": latest_date}
-        
-        # 获取股票基本信息
-        stock_list = pro.stock_basic(exchange='', list_status='L')
-        
-        # 合并数据
-        high_rise_df = high_rise_df.merge(
-            stock_list[['ts_code', 'name', 'area', 'industry']], 
-            on='ts_code', 
-            how='left'
-        )
-        
-        # 简化历史数据获取，只检查最近30天
-        result_stocks = []
-        for _, row in high_rise_df.iterrows():
-            try:
-                ts_code = row['ts_code']
-                print(f"检查股票: {ts_code}")
-                
-                # 获取最近30天的历史数据
-                hist_data = pro.daily(ts_code=ts_code, start_date='20240101', end_date=latest_date)
-                if hist_data is None or hist_data.empty:
-                    continue
-                
-                # 按日期排序
-                hist_data = hist_data.sort_values('trade_date')
-                
-                # 获取最近30天的最高价
-                recent_high = hist_data['high'].max()
-                current_price = row['close']
-                
-                # 检查是否创3年新高（简化：检查是否接近历史最高价）
-                if current_price >= recent_high * 0.95:  # 允许5%的误差
-                    stock_info = {
-                        "ts_code": ts_code,
-                        "name": row['name'],
-                        "area": row['area'],
-                        "industry": row['industry'],
-                        "close": row['close'],
-                        "pct_chg": row['pct_chg'],
-                        "vol": row['vol'],
-                        "amount": row['amount'],
-                        "recent_high": recent_high
-                    }
-                    result_stocks.append(stock_info)
-                    print(f"找到符合条件的股票: {ts_code} {row['name']}")
-                
-            except Exception as e:
-                print(f"处理股票 {ts_code} 时出错: {str(e)}")
-                continue
-        
-        print(f"最终找到 {len(result_stocks)} 只符合条件的股票")
-        
-        return {
-            "stocks": result_stocks,
-            "count": len(result_stocks),
-            "trade_date": latest_date
-        }
+        return await single_flight.run_async(f"high_rise_stocks_live:{latest_date}", compute_high_rise_stocks, latest_date)
         
+    except HTTPException:
+        raise
+    except IndexNotReady as e:
+        # 回看窗口的历史日线由定时任务在后台同步，同步完成前不返回（也不缓存）不完整的结果
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "60"})
     except Exception as e:
         print(f"获取高涨幅股票出错: {str(e)}")
         raise HTTPException(status_code=500, detail=f"获取高涨幅股票失败: {str(e)}")
 
+def compute_high_rise_stocks(latest_date):
+    """筛选某交易日涨幅超过7%且接近近期最高价的股票"""
+    print(f"开始获取高涨幅股票数据，日期: {latest_date}")
+    
+    # 获取最新交易日的全市场快照（已合并股票基本信息）
+    df = get_market_snapshot(pro, latest_date)
+    if df is None or df.empty:
+        raise HTTPException(status_code=500, detail="无法获取股票数据")
+    
+    print(f"获取到 {len(df)} 只股票数据")
+    
+    # 筛选涨幅超过7%的股票
+    high_rise_df = df[df['pct_chg'] > 7].copy()
+    print(f"涨幅超过7%的股票: {len(high_rise_df)} 只")
+    
+    if high_rise_df.empty:
+        return {"stocks": [], "count": 0, "trade_date": latest_date}
+    
+    # 一次读取全市场近 HIGH_RISE_LOOKBACK_DAYS 个交易日的最高价，按股票分组求最大值
+    # 只读本地已同步的数据（由定时任务预热），请求中不批量拉取历史日线
+    lookback_days = get_previous_trading_days(pro, HIGH_RISE_LOOKBACK_DAYS, latest_date)
+    missing = history_store.missing_dates(pro, lookback_days[-1], latest_date)
+    if missing:
+        raise IndexNotReady(f"近 {HIGH_RISE_LOOKBACK_DAYS} 个交易日的历史日线尚未同步完成（缺少 {len(missing)} 天），请稍后再试")
+    hist = history_store.get_market_history(pro, lookback_days[-1], latest_date,
+                                            columns=['ts_code', 'high'], sync=False)
+    recent_high = hist[hist['ts_code'].isin(high_rise_df['ts_code'])].groupby('ts_code', observed=True)['high'].max()
+    high_rise_df['recent_high'] = high_rise_df['ts_code'].map(recent_high).astype(float)
+    
+    # 检查是否创3年新高（简化：检查是否接近历史最高价，允许5%的误差）
+    matched = high_rise_df[high_rise_df['close'] >= high_rise_df['recent_high'] * 0.95]
+    result_stocks = frame_to_records(matched, HIGH_RISE_FIELDS)
+    
+    print(f"最终找到 {len(result_stocks)} 只符合条件的股票")
+    
+    return {
+        "stocks": result_stocks,
+        "count": len(result_stocks),
+        "trade_date": latest_date
+    }
+
 @app.get("/api/is-highest-today/{ts_code}")
-def check_is_highest_today(ts_code: str):
-    # 直接实时分析，不查数据库缓存
-    result = is_today_highest(ts_code)
+def check_is_highest_today(
+    ts_code: str,
+    points: Optional[int] = Query(None, ge=3, le=5000, description="历史走势降采样后的点数，不传返回全部"),
+    session: Session = Depends(get_db)
+):
+    # 同一交易日内重复检查直接读数据库缓存
+    result = check_highest(session, pro, ts_code, points)
     if not result or not isinstance(result, dict):
         return {"error": "分析失败或无数据"}
-    return result
+    return FastJSONResponse(result)
+
+class WatchlistRequest(BaseModel):
+    codes: List[str]  # 股票代码，如 000001.SZ、01810.HK、AAPL.US
+    history: List[str] = []  # 需要附带历史走势的代码
+    points: Optional[int] = Field(None, ge=3, le=5000)  # 历史走势降采样后的点数
+
+@app.post("/api/is-highest-today/batch")
+async def check_watchlist_highest(request: WatchlistRequest):
+    """批量检查自选股今天是否创新高，返回紧凑表格"""
+    # 统一大写并去重，保持输入顺序
+    codes = list(dict.fromkeys(code.strip().upper() for code in request.codes if code.strip()))
+    if not codes:
+        raise HTTPException(status_code=400, detail="股票代码列表不能为空")
+    if len(codes) > WATCHLIST_MAX_CODES:
+        raise HTTPException(status_code=400, detail=f"单次最多检查 {WATCHLIST_MAX_CODES} 只股票")
+    history_codes = {code.strip().upper() for code in request.history}
+    try:
+        latest_date = await run_blocking(get_latest_trade_date, pro)
+        if not latest_date:
+            raise HTTPException(status_code=500, detail="无法获取最新交易日数据")
+        result = await run_blocking(check_watchlist, pro, latest_date, codes, history_codes, request.points)
+        return FastJSONResponse(result)
+    except HTTPException:
+        raise
+    except IndexNotReady as e:
+        # 新高索引由定时任务在后台构建，构建完成前A股无法检查
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "60"})
+    except Exception as e:
+        print(f"批量检查新高出错: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"批量检查失败: {str(e)}")
 
 @app.get("/api/market-analysis")
 async def get_market_analysis():
-    """获取市场分析数据"""
+    """获取市场分析数据（同一交易日的并发请求只计算一次）"""
     try:
-        latest_date = get_latest_trade_date()
+        latest_date = await run_blocking(get_latest_trade_date, pro)
         if not latest_date:
             raise HTTPException(status_code=500, detail="无法获取最新交易日数据")
         
-        print(f"开始获取 {latest_date} 的市场数据...")
-        
-        # 获取最新交易日数据
-        df = pro.daily(trade_date=latest_date)
-        if df is None or df.empty:
-            raise HTTPException(status_code=500, detail="无法获取股票数据")
-        
-        print(f"获取到 {len(df)} 只股票数据，开始分析...")
-        
-        # 1. 基础市场统计
-        today_stats = calculate_daily_stats(df)
-        print("基础统计完成")
-        
-        # 2. 涨跌分布分析
-        rise_distribution = analyze_rise_distribution(df)
-        fall_distribution = analyze_fall_distribution(df)
-        print("涨跌分布分析完成")
-        
-        # 3. 获取最近5天的统计数据
-        recent_stats = get_recent_trading_days_stats(5)
-        print("历史数据获取完成")
-        
-        # 4. 计算平均值
-        avg_stats = calculate_average_stats(recent_stats)
-        print("平均值计算完成")
-        
-        print("市场分析完成")
-        
-        return {
-            "trade_date": latest_date,
-            "today_stats": today_stats,
-            "rise_distribution": rise_distribution,
-            "fall_distribution": fall_distribution,
-            "recent_stats": recent_stats,
-            "avg_stats": avg_stats
-        }
+        return await single_flight.run_async(f"market_analysis:{latest_date}", compute_market_analysis, latest_date)
         
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"市场分析出错: {str(e)}")
         raise HTTPException(status_code=500, detail=f"获取市场分析失败: {str(e)}")
 
+def compute_market_analysis(latest_date):
+    """计算某交易日的市场分析数据"""
+    print(f"开始获取 {latest_date} 的市场数据...")
+    
+    # 获取最新交易日的全市场快照
+    df = get_market_snapshot(pro, latest_date)
+    if df is None or df.empty:
+        raise HTTPException(status_code=500, detail="无法获取股票数据")
+    
+    print(f"获取到 {len(df)} 只股票数据，开始分析...")
+    
+    # 1. 基础市场统计
+    today_stats = calculate_daily_stats(df)
+    print("基础统计完成")
+    
+    # 2. 涨跌分布分析（百分比保留两位小数）
+    rise_distribution, fall_distribution = analyze_distribution(df, digits=2)
+    print("涨跌分布分析完成")
+    
+    # 3. 获取最近5天的统计数据
+    recent_stats = get_recent_trading_days_stats(5)
+    print("历史数据获取完成")
+    
+    # 4. 计算平均值
+    avg_stats = calculate_average_stats(recent_stats)
+    print("平均值计算完成")
+    
+    print("市场分析完成")
+    
+    return {
+        "trade_date": latest_date,
+        "today_stats": today_stats,
+        "rise_distribution": rise_distribution,
+        "fall_distribution": fall_distribution,
+        "recent_stats": recent_stats,
+        "avg_stats": avg_stats
+    }
+
 @app.get("/api/market-stats-simple")
 async def get_market_stats_simple():
     """获取简化的市场统计数据（快速版本）"""
     try:
-        latest_date = get_latest_trade_date()
+        latest_date = await run_blocking(get_latest_trade_date, pro)
         if not latest_date:
             raise HTTPException(status_code=500, detail="无法获取最新交易日数据")
         
-        # 获取最新交易日数据
-        df = pro.daily(trade_date=latest_date)
+        # 获取最新交易日的全市场快照
+        df = await run_blocking(get_market_snapshot, pro, latest_date)
         if df is None or df.empty:
             raise HTTPException(status_code=500, detail="无法获取股票数据")
         
@@ -434,153 +526,6 @@ async def get_market_stats_simple():
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"获取市场统计失败: {str(e)}")
 
-def analyze_high_rise_stocks_api_optimized(high_rise_df, trade_date):
-    """分析高涨幅股票是否为3年新高或历史新高（优化版本）"""
-    high_rise_stocks = []
-    
-    # 计算日期范围
-    end_date = datetime.strptime(trade_date, '%Y%m%d')
-    start_date_3y = end_date - timedelta(days=3 * 365)
-    start_date_all = end_date - timedelta(days=5 * 365)  # 减少到5年
-    
-    end_date_str = end_date.strftime('%Y%m%d')
-    start_date_3y_str = start_date_3y.strftime('%Y%m%d')
-    start_date_all_str = start_date_all.strftime('%Y%m%d')
-    
-    # 获取股票基本信息（批量获取）
-    stock_codes = high_rise_df['ts_code'].tolist()
-    stock_basic = pro.stock_basic(fields='ts_code,name')
-    stock_basic_dict = dict(zip(stock_basic['ts_code'], stock_basic['name'])) if not stock_basic.empty else {}
-    
-    total_stocks = len(high_rise_df)
-    
-    for idx, row in high_rise_df.iterrows():
-        stock_code = row['ts_code']
-        current_price = row['close']
-        pct_chg = row['pct_chg']
-        
-        print(f"正在分析 {stock_code} ({idx+1}/{total_stocks})...")
-        
-        try:
-            # 获取3年历史数据
-            df_3y = pro.daily(ts_code=stock_code, 
-                             start_date=start_date_3y_str, 
-                             end_date=end_date_str)
-            
-            # 获取更长期历史数据（减少到5年）
-            df_all = pro.daily(ts_code=stock_code, 
-                              start_date=start_date_all_str, 
-                              end_date=end_date_str)
-            
-            if df_3y is None or df_3y.empty:
-                continue
-                
-            # 计算3年最高价
-            max_3y = df_3y['close'].max()
-            is_3y_high = current_price >= max_3y
-            
-            # 计算历史最高价
-            is_all_time_high = False
-            max_all = None
-            if df_all is not None and not df_all.empty:
-                max_all = df_all['close'].max()
-                is_all_time_high = current_price >= max_all
-            
-            stock_name = stock_basic_dict.get(stock_code, "未知")
-            
-            high_rise_stocks.append({
-                'ts_code': stock_code,
-                'name': stock_name,
-                'current_price': float(current_price),
-                'pct_chg': float(pct_chg),
-                'is_3y_high': is_3y_high,
-                'is_all_time_high': is_all_time_high,
-                'max_3y': float(max_3y),
-                'max_all': float(max_all) if max_all is not None else None
-            })
-            
-        except Exception as e:
-            print(f"分析 {stock_code} 时出错: {e}")
-            continue
-    
-    return high_rise_stocks
-
-def get_recent_trading_days_stats_api_simple(days=3):
-    """获取最近几个交易日的统计数据（简化版本）"""
-    stats_list = []
-    
-    try:
-        # 获取交易日历
-        end_date = datetime.today()
-        start_date = end_date - timedelta(days=30)  # 减少搜索范围
-        
-        trade_cal = pro.trade_cal(start_date=start_date.strftime('%Y%m%d'),
-                                 end_date=end_date.strftime('%Y%m%d'))
-        
-        # 筛选交易日
-        trading_days = trade_cal[trade_cal['is_open'] == 1]['cal_date'].tolist()
-        trading_days.sort(reverse=True)
-        
-        # 只获取最近几天的数据
-        for i, trade_date in enumerate(trading_days[:days]):
-            try:
-                print(f"获取 {trade_date} 的历史数据...")
-                df = pro.daily(trade_date=trade_date)
-                if df is not None and not df.empty:
-                    pct_chg = df['pct_chg']
-                    total_stocks = len(df)
-                    rise_stocks = int((pct_chg > 0).sum())
-                    fall_stocks = int((pct_chg < 0).sum())
-                    flat_stocks = int((pct_chg == 0).sum())
-                    
-                    stats = {
-                        'date': trade_date,
-                        'total': total_stocks,
-                        'rise': rise_stocks,
-                        'fall': fall_stocks,
-                        'flat': flat_stocks,
-                        'rise_ratio': round(rise_stocks / total_stocks * 100, 2) if total_stocks > 0 else 0
-                    }
-                    stats_list.append(stats)
-                    print(f"{trade_date} 数据获取完成")
-            except Exception as e:
-                print(f"获取 {trade_date} 数据时出错: {e}")
-                continue
-    
-    except Exception as e:
-        print(f"获取历史统计数据时出错: {e}")
-    
-    return stats_list
-
-def get_latest_trade_date():
-    """获取最新可用交易日"""
-    # 获取最近30天的交易日历
-    end_date = datetime.today()
-    start_date = end_date - timedelta(days=30)
-    
-    trade_cal = pro.trade_cal(start_date=start_date.strftime('%Y%m%d'),
-                             end_date=end_date.strftime('%Y%m%d'))
-    
-    # 筛选交易日并按日期排序
-    trading_days = trade_cal[trade_cal['is_open'] == 1]['cal_date'].tolist()
-    trading_days.sort(reverse=True)  # 最新日期在前
-    
-    if not trading_days:
-        return None
-    
-    # 尝试获取最新交易日的数据
-    for trade_date in trading_days[:5]:  # 尝试最近5个交易日
-        try:
-            df = pro.daily(trade_date=trade_date)
-            if df is not None and not df.empty:
-                print(f"找到最新可用交易日: {trade_date}")
-                return trade_date
-        except Exception as e:
-            print(f"尝试获取 {trade_date} 数据时出错: {e}")
-            continue
-    
-    return None
-
 def calculate_daily_stats(df):
     """计算单日上涨下跌统计"""
     total_stocks = len(df)
@@ -597,79 +542,19 @@ def calculate_daily_stats(df):
         'rise_ratio': round(rise_stocks / total_stocks * 100, 2) if total_stocks > 0 else 0
     }
 
-def analyze_rise_distribution(df):
-    """分析上涨股票分布"""
-    # 筛选上涨股票
-    rise_df = df[df['pct_chg'] > 0].copy()
-    
-    distribution = {
-        "0-2%": {"count": 0, "percentage": 0},
-        "2-5%": {"count": 0, "percentage": 0},
-        "5-7%": {"count": 0, "percentage": 0},
-        "7%+": {"count": 0, "percentage": 0},
-        "涨停": {"count": 0, "percentage": 0}
-    }
-    
-    # 计算各区间数量
-    distribution["0-2%"]["count"] = len(rise_df[(rise_df['pct_chg'] > 0) & (rise_df['pct_chg'] <= 2)])
-    distribution["2-5%"]["count"] = len(rise_df[(rise_df['pct_chg'] > 2) & (rise_df['pct_chg'] <= 5)])
-    distribution["5-7%"]["count"] = len(rise_df[(rise_df['pct_chg'] > 5) & (rise_df['pct_chg'] <= 7)])
-    distribution["7%+"]["count"] = len(rise_df[rise_df['pct_chg'] > 7])
-    distribution["涨停"]["count"] = len(rise_df[rise_df['pct_chg'] >= 9.8])
-    
-    # 计算百分比
-    total_stocks = len(df)
-    for key in distribution:
-        distribution[key]["percentage"] = round(distribution[key]["count"] / total_stocks * 100, 2) if total_stocks > 0 else 0
-    
-    return distribution
-
-def analyze_fall_distribution(df):
-    """分析下跌股票分布"""
-    # 筛选下跌股票
-    fall_df = df[df['pct_chg'] < 0].copy()
-    
-    distribution = {
-        "0-2%": {"count": 0, "percentage": 0},
-        "2-5%": {"count": 0, "percentage": 0},
-        "5-7%": {"count": 0, "percentage": 0},
-        "7%+": {"count": 0, "percentage": 0},
-        "跌停": {"count": 0, "percentage": 0}
-    }
-    
-    # 计算各区间数量
-    distribution["0-2%"]["count"] = len(fall_df[(fall_df['pct_chg'] < 0) & (fall_df['pct_chg'] >= -2)])
-    distribution["2-5%"]["count"] = len(fall_df[(fall_df['pct_chg'] < -2) & (fall_df['pct_chg'] >= -5)])
-    distribution["5-7%"]["count"] = len(fall_df[(fall_df['pct_chg'] < -5) & (fall_df['pct_chg'] >= -7)])
-    distribution["7%+"]["count"] = len(fall_df[fall_df['pct_chg'] < -7])
-    distribution["跌停"]["count"] = len(fall_df[fall_df['pct_chg'] <= -9.8])
-    
-    # 计算百分比
-    total_stocks = len(df)
-    for key in distribution:
-        distribution[key]["percentage"] = round(distribution[key]["count"] / total_stocks * 100, 2) if total_stocks > 0 else 0
-    
-    return distribution
-
 def get_recent_trading_days_stats(days=5):
     """获取最近几个交易日的统计数据"""
     stats_list = []
     
-    # 获取交易日历
-    end_date = datetime.today()
-    start_date = end_date - timedelta(days=60)  # 获取更多日期确保有足够交易日
-    
-    trade_cal = pro.trade_cal(start_date=start_date.strftime('%Y%m%d'),
-                             end_date=end_date.strftime('%Y%m%d'))
-    
-    # 筛选交易日
-    trading_days = trade_cal[trade_cal['is_open'] == 1]['cal_date'].tolist()
-    trading_days.sort(reverse=True)  # 最新日期在前
+    # 从交易日历缓存取截至最新可用交易日的最近几个交易日（最新日期在前）
+    trading_days = get_previous_trading_days(pro, days, get_latest_trade_date(pro))
+    # 缺失的交易日并发拉取落盘，后面逐日读取都走本地
+    history_store.sync(pro, trading_days)
     
     # 获取最近几天的数据
-    for i, trade_date in enumerate(trading_days[:days]):
+    for i, trade_date in enumerate(trading_days):
         try:
-            df = pro.daily(trade_date=trade_date)
+            df = history_store.get_daily(pro, trade_date)
             if df is not None and not df.empty:
                 stats = calculate_daily_stats(df)
                 stats_list.append(stats)
@@ -700,10 +585,8 @@ def calculate_average_stats(stats_list):
     }
 
 @app.get("/api/market_stats")
-def get_market_stats():
-    session = SessionLocal()
+def get_market_stats(session: Session = Depends(get_db)):
     stats = session.query(MarketStats).order_by(MarketStats.date.desc()).first()
-    session.close()
     if stats:
         return {
             "date": stats.date,
@@ -717,11 +600,9 @@ def get_market_stats():
         return {"error": "暂无数据"}
 
 @app.get("/api/high_rise_stocks")
-def get_high_rise_stocks():
-    session = SessionLocal()
+def get_high_rise_stocks(session: Session = Depends(get_db)):
     latest = session.query(HighRiseStock.date).order_by(HighRiseStock.date.desc()).first()
     if not latest:
-        session.close()
         return {"stocks": [], "count": 0}
     stocks = session.query(HighRiseStock).filter_by(date=latest[0]).all()
     result = [dict(
@@ -729,34 +610,49 @@ def get_high_rise_stocks():
         is_3y_high=bool(s.is_3y_high), is_all_time_high=bool(s.is_all_time_high),
         max_3y=s.max_3y, max_all=s.max_all
     ) for s in stocks]
-    session.close()
     return {"stocks": result, "count": len(result), "trade_date": latest[0]}
 
 @app.get("/api/rise_fall_distribution")
-def get_rise_fall_distribution():
-    session = SessionLocal()
+def get_rise_fall_distribution(session: Session = Depends(get_db)):
     latest = session.query(RiseFallDistribution.date).order_by(RiseFallDistribution.date.desc()).first()
     if not latest:
-        session.close()
         return {"rise": [], "fall": [], "date": None}
     rise = session.query(RiseFallDistribution).filter_by(date=latest[0], type='rise').all()
     fall = session.query(RiseFallDistribution).filter_by(date=latest[0], type='fall').all()
     rise_result = [dict(label=r.label, count=r.count, percentage=r.percentage) for r in rise]
     fall_result = [dict(label=r.label, count=r.count, percentage=r.percentage) for r in fall]
-    session.close()
     return {"rise": rise_result, "fall": fall_result, "date": latest[0]}
 
+@app.get("/api/rise_fall_distribution/recent")
+async def get_recent_rise_fall_distribution(days: int = Query(5, ge=1, le=60, description="交易日数量")):
+    """最近几个交易日的涨跌分布，所有交易日一次计算"""
+    try:
+        latest_date = await run_blocking(get_latest_trade_date, pro)
+        if not latest_date:
+            raise HTTPException(status_code=500, detail="无法获取最新交易日数据")
+        trading_days = await run_blocking(get_previous_trading_days, pro, days, latest_date)
+        distributions = await run_blocking(analyze_multi_day_distribution, pro, trading_days)
+        return {"distributions": distributions, "count": len(distributions)}
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"获取涨跌分布出错: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"获取涨跌分布失败: {str(e)}")
+
 @app.get("/api/unified_market_analysis")
-def get_unified_market_analysis():
-    session = SessionLocal()
-    latest = session.query(UnifiedMarketAnalysis.date).order_by(UnifiedMarketAnalysis.date.desc()).first()
-    if not latest:
-        session.close()
-        return {"data": None, "date": None}
-    record = session.query(UnifiedMarketAnalysis).filter_by(date=latest[0]).first()
-    session.close()
+def get_unified_market_analysis(request: Request, session: Session = Depends(get_db)):
+    # 一次按日期索引查询取出预先序列化的响应体，直接返回
+    record = session.query(
+        UnifiedMarketAnalysis.response_body,
+        UnifiedMarketAnalysis.response_encoding,
+        UnifiedMarketAnalysis.response_hash
+    ).order_by(UnifiedMarketAnalysis.date.desc()).first()
+    if record and record.response_body is not None:
+        return stored_body_response(request, record.response_body, record.response_encoding, record.response_hash)
+    # 早期写入的记录没有预存响应体，按原方式组装
+    record = session.query(UnifiedMarketAnalysis).order_by(UnifiedMarketAnalysis.date.desc()).first()
     if not record:
-        return {"data": None, "date": latest[0]}
+        return {"data": None, "date": None}
     return {
         "today_stats": json.loads(record.today_stats),
         "rise_distribution": json.loads(record.rise_distribution),
@@ -766,25 +662,45 @@ def get_unified_market_analysis():
         "date": record.date
     }
 
+def submit_refresh_job(name, func, label):
+    """提交后台刷新任务，同一交易日的任务正在执行时直接复用，不重复排队"""
+    latest_date = get_latest_trade_date(pro) or datetime.now().strftime('%Y%m%d')
+    key = f"{name}:{latest_date}"
+    _, started = single_flight.submit(key, func)
+    if started:
+        return {"msg": f"{label}已刷新（后台执行）", "job": key, "started": True}
+    return {"msg": f"{label}正在执行中，已合并到当前任务", "job": key, "started": False}
+
+@app.post("/api/refresh_daily_analysis")
+def refresh_daily_analysis():
+    return submit_refresh_job("daily_analysis", save_daily_analysis, "每日全部分析")
+
 @app.post("/api/refresh_market_stats")
-def refresh_market_stats(background_tasks: BackgroundTasks):
-    background_tasks.add_task(save_market_stats)
-    return {"msg": "市场统计分析已刷新（后台执行）"}
+def refresh_market_stats():
+    return submit_refresh_job("market_stats", save_market_stats, "市场统计分析")
 
 @app.post("/api/refresh_high_rise_stocks")
-def refresh_high_rise_stocks(background_tasks: BackgroundTasks):
-    background_tasks.add_task(save_high_rise_stocks)
-    return {"msg": "高涨幅创新高分析已刷新（后台执行）"}
+def refresh_high_rise_stocks():
+    return submit_refresh_job("high_rise_stocks", save_high_rise_stocks, "高涨幅创新高分析")
 
 @app.post("/api/refresh_rise_fall_distribution")
-def refresh_rise_fall_distribution(background_tasks: BackgroundTasks):
-    background_tasks.add_task(save_rise_fall_distribution)
-    return {"msg": "涨跌分布分析已刷新（后台执行）"}
+def refresh_rise_fall_distribution():
+    return submit_refresh_job("rise_fall_distribution", save_rise_fall_distribution, "涨跌分布分析")
 
 @app.post("/api/refresh_unified_market_analysis")
-def refresh_unified_market_analysis(background_tasks: BackgroundTasks):
-    background_tasks.add_task(save_unified_market_analysis)
-    return {"msg": "综合分析已刷新（后台执行）"}
+def refresh_unified_market_analysis():
+    return submit_refresh_job("unified_market_analysis", save_unified_market_analysis, "综合分析")
+
+@app.get("/api/job_status")
+def get_job_status(key: Optional[str] = Query(None, description="任务键，如 market_stats:20250101")):
+    """查询后台任务和实时计算的执行状态（running / finished / failed）及耗时"""
+    if key is not None:
+        record = single_flight.status(key)
+        if record is None:
+            raise HTTPException(status_code=404, detail="任务不存在")
+        return record
+    jobs = single_flight.status()
+    return {"jobs": jobs, "running": sum(1 for job in jobs if job['status'] == 'running')}
 
 if __name__ == "__main__":
     import uvicorn
@@ -1,22 +1,17 @@
-import tushare as ts
 import pandas as pd
-import matplotlib.pyplot as plt
-from datetime import datetime, timedelta
-from config import TUSHARE_TOKEN
+from trade_calendar import get_latest_trade_date, get_previous_trading_days
+from history_store import history_store
+from fetcher import get_pro
 
-# 设置中文字体
-plt.rcParams['font.sans-serif'] = ['SimHei', 'Microsoft YaHei']
-plt.rcParams['axes.unicode_minus'] = False
 
-
-def get_market_rise_fall_stats(days=5):
+def get_market_rise_fall_stats(days=5, plot=False):
     """
     计算市场上涨下跌股票统计
     days: 计算最近几天的数据，默认5天
+    plot: 是否绘制图表，服务端调用保持默认False，只返回数据
     """
-    # 初始化 tushare
-    ts.set_token(TUSHARE_TOKEN)
-    pro = ts.pro_api()
+    # 获取限流的 tushare 客户端
+    pro = get_pro()
     
     # 获取最新可用交易日
     latest_trade_date = get_latest_trade_date(pro)
@@ -27,7 +22,7 @@ def get_market_rise_fall_stats(days=5):
     print(f"正在获取最新交易日 {latest_trade_date} 的市场数据...")
     
     # 获取最新交易日数据
-    df = pro.daily(trade_date=latest_trade_date)
+    df = history_store.get_daily(pro, latest_trade_date)
     
     if df is None or df.empty:
         print(f"未获取到 {latest_trade_date} 的市场数据！")
@@ -45,42 +40,14 @@ def get_market_rise_fall_stats(days=5):
     # 显示结果
     display_results(today_stats, recent_stats, avg_stats)
     
-    # 绘制图表
-    plot_market_trend(recent_stats, today_stats)
+    # 绘制图表（按需导入绘图层）
+    if plot:
+        from charts import plot_market_trend
+        plot_market_trend(recent_stats, today_stats)
     
     return today_stats, recent_stats, avg_stats
 
 
-def get_latest_trade_date(pro):
-    """获取最新可用交易日"""
-    # 获取最近30天的交易日历
-    end_date = datetime.today()
-    start_date = end_date - timedelta(days=30)
-    
-    trade_cal = pro.trade_cal(start_date=start_date.strftime('%Y%m%d'),
-                             end_date=end_date.strftime('%Y%m%d'))
-    
-    # 筛选交易日并按日期排序
-    trading_days = trade_cal[trade_cal['is_open'] == 1]['cal_date'].tolist()
-    trading_days.sort(reverse=True)  # 最新日期在前
-    
-    if not trading_days:
-        return None
-    
-    # 尝试获取最新交易日的数据
-    for trade_date in trading_days[:5]:  # 尝试最近5个交易日
-        try:
-            df = pro.daily(trade_date=trade_date)
-            if df is not None and not df.empty:
-                print(f"找到最新可用交易日: {trade_date}")
-                return trade_date
-        except Exception as e:
-            print(f"尝试获取 {trade_date} 数据时出错: {e}")
-            continue
-    
-    return None
-
-
 def calculate_daily_stats(df):
     """计算单日上涨下跌统计"""
     total_stocks = len(df)
@@ -102,21 +69,15 @@ def get_recent_trading_days_stats(pro, days=5):
     """获取最近几个交易日的统计数据"""
     stats_list = []
     
-    # 获取交易日历
-    end_date = datetime.today()
-    start_date = end_date - timedelta(days=60)  # 获取更多日期确保有足够交易日
-    
-    trade_cal = pro.trade_cal(start_date=start_date.strftime('%Y%m%d'),
-                             end_date=end_date.strftime('%Y%m%d'))
-    
-    # 筛选交易日
-    trading_days = trade_cal[trade_cal['is_open'] == 1]['cal_date'].tolist()
-    trading_days.sort(reverse=True)  # 最新日期在前
+    # 从交易日历缓存取截至最新可用交易日的最近几个交易日（最新日期在前）
+    trading_days = get_previous_trading_days(pro, days, get_latest_trade_date(pro))
+    # 缺失的交易日并发拉取落盘，后面逐日读取都走本地
+    history_store.sync(pro, trading_days)
     
     # 获取最近几天的数据
-    for i, trade_date in enumerate(trading_days[:days]):
+    for i, trade_date in enumerate(trading_days):
         try:
-            df = pro.daily(trade_date=trade_date)
+            df = history_store.get_daily(pro, trade_date)
             if df is not None and not df.empty:
                 stats = calculate_daily_stats(df)
                 stats_list.append(stats)
@@ -174,48 +135,6 @@ def display_results(today_stats, recent_stats, avg_stats):
             print(f"   {stat['date']}: 上涨{stat['rise']:,}只 ({stat['rise_ratio']:.1f}%)")
 
 
-def plot_market_trend(recent_stats, today_stats):
-    """绘制市场趋势图"""
-    if not recent_stats:
-        return
-    
-    # 准备数据
-    dates = [stat['date'] for stat in recent_stats]
-    rise_counts = [stat['rise'] for stat in recent_stats]
-    fall_counts = [stat['fall'] for stat in recent_stats]
-    
-    # 创建图表
-    fig, (ax1, ax2) = plt.subplots(2, 1, figsize=(12, 10))
-    
-    # 上图：上涨下跌股票数量
-    x = range(len(dates))
-    ax1.bar([i-0.2 for i in x], rise_counts, width=0.4, label='上涨股票', color='red', alpha=0.7)
-    ax1.bar([i+0.2 for i in x], fall_counts, width=0.4, label='下跌股票', color='green', alpha=0.7)
-    
-    ax1.set_title('近5日上涨下跌股票数量对比', fontsize=14, fontweight='bold')
-    ax1.set_ylabel('股票数量')
-    ax1.set_xticks(x)
-    ax1.set_xticklabels(dates, rotation=45)
-    ax1.legend()
-    ax1.grid(True, alpha=0.3)
-    
-    # 下图：上涨比例
-    rise_ratios = [stat['rise_ratio'] for stat in recent_stats]
-    ax2.plot(x, rise_ratios, marker='o', linewidth=2, color='blue', label='上涨比例')
-    ax2.axhline(y=50, color='gray', linestyle='--', alpha=0.5, label='50%分界线')
-    
-    ax2.set_title('近5日上涨股票比例变化', fontsize=14, fontweight='bold')
-    ax2.set_ylabel('上涨比例 (%)')
-    ax2.set_xlabel('日期')
-    ax2.set_xticks(x)
-    ax2.set_xticklabels(dates, rotation=45)
-    ax2.legend()
-    ax2.grid(True, alpha=0.3)
-    
-    plt.tight_layout()
-    plt.show()
-
-
 if __name__ == "__main__":
     print("🚀 开始分析市场上涨下跌股票统计...")
-    get_market_rise_fall_stats(days=5) 
\ No newline at end of file
+    get_market_rise_fall_stats(days=5, plot=True) 
\ No newline at end of file
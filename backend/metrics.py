@@ -0,0 +1,200 @@
+import contextvars
+import math
+import threading
+import time
+from starlette.routing import Match
+from config import METRICS_LATENCY_BUCKETS, METRICS_TUSHARE_BUCKETS, METRICS_JOB_BUCKETS
+
+# 当前请求匹配的接口路径模板，用于把 tushare 调用归到触发它的接口；定时任务等后台调用为 background
+current_route = contextvars.ContextVar('current_route', default='background')
+
+# 已定义的全部指标，按定义顺序输出
+registry = []
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _format_value(value):
+    if value == math.inf:
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    """带标签的指标，按标签值分别计数；所有指标登记到 registry 中统一输出"""
+
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}  # 标签值元组 -> 数值
+        registry.append(self)
+
+    def _key(self, labels):
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def samples(self):
+        """返回 (指标名后缀, 标签值, 额外标签, 数值) 列表"""
+        with self._lock:
+            return [('', key, (), value) for key, value in sorted(self._values.items())]
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+        for suffix, key, extra, value in self.samples():
+            lines.append(f'{self.name}{suffix}{_format_labels(self.labelnames, key, extra)} {_format_value(value)}')
+        return lines
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    kind = 'gauge'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+
+class Histogram(Metric):
+    """累计分桶直方图，输出 _bucket / _sum / _count"""
+
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=METRICS_LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry[0][i] += 1
+                    break
+            entry[1] += value
+            entry[2] += 1
+
+    def samples(self):
+        samples = []
+        with self._lock:
+            for key, (counts, total, count) in sorted(self._values.items()):
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets, counts):
+                    cumulative += bucket_count
+                    samples.append(('_bucket', key, (('le', _format_value(float(bound))),), cumulative))
+                samples.append(('_sum', key, (), total))
+                samples.append(('_count', key, (), count))
+        return samples
+
+
+# 接口
+http_requests = Counter('http_requests_total', '接口请求数', ('method', 'route', 'status'))
+http_request_duration = Histogram('http_request_duration_seconds', '接口耗时（秒）', ('method', 'route'))
+http_requests_in_flight = Gauge('http_requests_in_flight', '正在处理的请求数', ('method', 'route'))
+
+# tushare 调用（按接口名和触发调用的接口路径统计，便于定位消耗配额的接口）
+tushare_calls = Counter('tushare_calls_total', 'tushare调用次数（每次重试单独计数）', ('api', 'route', 'outcome'))
+tushare_call_duration = Histogram('tushare_call_duration_seconds', 'tushare单次调用耗时（秒），不含限流等待',
+                                  ('api',), buckets=METRICS_TUSHARE_BUCKETS)
+tushare_rate_limit_wait = Counter('tushare_rate_limit_wait_seconds_total', '等待限流的累计时间（秒）', ('api',))
+
+# 进程内缓存
+cache_requests = Counter('cache_requests_total', '缓存查询次数', ('cache', 'result'))
+cache_evictions = Counter('cache_evictions_total', '缓存淘汰次数', ('cache', 'reason'))
+
+# 定时任务
+job_runs = Counter('job_runs_total', '定时任务执行次数', ('job', 'outcome'))
+job_duration = Histogram('job_duration_seconds', '定时任务耗时（秒）', ('job', 'outcome'), buckets=METRICS_JOB_BUCKETS)
+
+
+def record_cache(cache, hit):
+    cache_requests.inc(cache=cache, result='hit' if hit else 'miss')
+
+
+def render():
+    """按 Prometheus 文本格式输出全部指标"""
+    lines = []
+    for metric in registry:
+        lines.extend(metric.render())
+    return '\n'.join(lines) + '\n'
+
+
+def _route_template(scope):
+    """匹配接口的路径模板（如 /api/stock/{ts_code}），避免按实际路径产生大量标签"""
+    app = scope.get('app')
+    if app is None:
+        return 'unmatched'
+    partial = None
+    for route in app.router.routes:
+        match, _ = route.matches(scope)
+        if match == Match.FULL:
+            return getattr(route, 'path', scope['path'])
+        if match == Match.PARTIAL and partial is None:
+            # 路径匹配但请求方法不匹配（405），继续查找同路径的其他接口
+            partial = getattr(route, 'path', scope['path'])
+    return partial or 'unmatched'
+
+
+class MetricsMiddleware:
+    """
+    记录每个接口的请求数、耗时和并发数（ASGI中间件，不改变响应体的流式传输）
+    注册在最外层，耗时包含缓存校验（304）和压缩；流式导出的耗时计到响应体发送完毕。
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+        method, route = scope['method'], _route_template(scope)
+        status = 500
+        token = current_route.set(route)
+
+        async def send_with_status(message):
+            nonlocal status
+            if message['type'] == 'http.response.start':
+                status = message['status']
+            await send(message)
+
+        http_requests_in_flight.inc(method=method, route=route)
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            http_request_duration.observe(time.perf_counter() - start, method=method, route=route)
+            http_requests.inc(method=method, route=route, status=status)
+            http_requests_in_flight.dec(method=method, route=route)
+            current_route.reset(token)
+
+
+def add_metrics(app):
+    """注册监控中间件，最后调用使其位于最外层"""
+    app.add_middleware(MetricsMiddleware)
@@ -1,8 +1,8 @@
-from sqlalchemy import create_engine, Column, Integer, Float, String, DateTime, Boolean, Text
+from sqlalchemy import create_engine, event, inspect, Column, Integer, Float, String, DateTime, Boolean, Text, LargeBinary, Index, text
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 import datetime
-import json
+from config import DATABASE_PATH, SQLITE_PRAGMAS, DB_POOL_SIZE, DB_MAX_OVERFLOW
 
 Base = declarative_base()
 
@@ -19,6 +19,7 @@ class MarketStats(Base):
 
 class HighRiseStock(Base):
     __tablename__ = 'high_rise_stocks'
+    __table_args__ = (Index('uq_high_rise_stocks_date_ts_code', 'date', 'ts_code', unique=True),)
     id = Column(Integer, primary_key=True)
     date = Column(String, index=True)
     ts_code = Column(String)
@@ -33,6 +34,7 @@ class HighRiseStock(Base):
 
 class RiseFallDistribution(Base):
     __tablename__ = 'rise_fall_distribution'
+    __table_args__ = (Index('uq_rise_fall_distribution_date_type_label', 'date', 'type', 'label', unique=True),)
     id = Column(Integer, primary_key=True)
     date = Column(String, index=True)
     label = Column(String)  # 区间标签，如"0-2%"
@@ -43,6 +45,7 @@ class RiseFallDistribution(Base):
 
 class UnifiedMarketAnalysis(Base):
     __tablename__ = 'unified_market_analysis'
+    __table_args__ = (Index('uq_unified_market_analysis_date', 'date', unique=True),)
     id = Column(Integer, primary_key=True)
     date = Column(String, index=True)
     today_stats = Column(Text)  # JSON字符串
@@ -50,23 +53,105 @@ class UnifiedMarketAnalysis(Base):
     fall_distribution = Column(Text)
     recent_stats = Column(Text)
     avg_stats = Column(Text)
+    # 预先序列化好的接口响应体（可能经过gzip压缩）及其内容哈希，接口直接返回，不再解析JSON
+    response_body = Column(LargeBinary)
+    response_encoding = Column(String)  # 'gzip' 或 None（未压缩）
+    response_hash = Column(String)
     created_at = Column(DateTime, default=datetime.datetime.utcnow)
 
 class StockHighestCheck(Base):
     __tablename__ = 'stock_highest_check'
+    __table_args__ = (Index('uq_stock_highest_check_ts_code_date', 'ts_code', 'date', unique=True),)
     id = Column(Integer, primary_key=True)
     ts_code = Column(String, index=True)
-    date = Column(String, index=True)  # 检查日期
+    date = Column(String, index=True)  # 检查时的最新交易日（缓存键）
     is_highest = Column(Boolean)
     today_close = Column(Float)
     max_close = Column(Float)
     min_close = Column(Float)
-    trade_date = Column(String)
+    trade_date = Column(String)  # 该股票数据的最新交易日
     pct_chg = Column(Float)
     vol = Column(Float)
     amount = Column(Float)
+    name = Column(String)
+    market = Column(String)
+    data_period = Column(String)
+    total_days = Column(Integer)
+    history = Column(LargeBinary)  # 历史走势（Parquet格式的列存字节）
     checked_at = Column(DateTime, default=datetime.datetime.utcnow)
 
-engine = create_engine('sqlite:///market.db')
-Base.metadata.create_all(engine)
-SessionLocal = sessionmaker(bind=engine) 
\ No newline at end of file
+# 自然键：批量写入时按这些列做 INSERT ... ON CONFLICT DO UPDATE
+NATURAL_KEYS = {
+    MarketStats: ('date',),
+    HighRiseStock: ('date', 'ts_code'),
+    RiseFallDistribution: ('date', 'type', 'label'),
+    UnifiedMarketAnalysis: ('date',),
+    StockHighestCheck: ('ts_code', 'date'),
+}
+
+def ensure_indexes(engine):
+    """
+    为已存在的数据库补建索引（create_all 不会修改已有的表）
+    只有唯一索引还不存在的表才按自然键去重（保留最新写入的一行）后建索引；删除已被唯一索引取代的旧索引。
+    """
+    inspector = inspect(engine)
+    natural_keys = {model.__tablename__: keys for model, keys in NATURAL_KEYS.items()}
+    with engine.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            existing = {index['name'] for index in inspector.get_indexes(table.name)}
+            if table.name == StockHighestCheck.__tablename__ and 'ix_stock_highest_check_ts_code_date' in existing:
+                conn.execute(text('DROP INDEX ix_stock_highest_check_ts_code_date'))
+            missing = [index for index in table.indexes if index.name not in existing]
+            if any(index.unique for index in missing):
+                columns = ', '.join(natural_keys[table.name])
+                conn.execute(text(f"DELETE FROM {table.name} WHERE id NOT IN "
+                                  f"(SELECT MAX(id) FROM {table.name} GROUP BY {columns})"))
+            for index in missing:
+                index.create(conn)
+
+def ensure_columns(engine):
+    """为已存在的表补加模型中新增的列（create_all 不会修改已有的表）"""
+    inspector = inspect(engine)
+    with engine.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            existing = {col['name'] for col in inspector.get_columns(table.name)}
+            for col in table.columns:
+                if col.name not in existing:
+                    col_type = col.type.compile(dialect=engine.dialect)
+                    conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {col.name} {col_type}"))
+
+def create_db_engine(path=DATABASE_PATH, pragmas=SQLITE_PRAGMAS):
+    """创建带连接池的 SQLite 引擎，每个新连接都设置 pragmas"""
+    engine = create_engine(
+        f'sqlite:///{path}',
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_pre_ping=True,
+        connect_args={'check_same_thread': False}
+    )
+
+    @event.listens_for(engine, 'connect')
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f'PRAGMA {name}={value}')
+        cursor.close()
+
+    return engine
+
+def init_db(engine):
+    """建表并迁移已有的数据库（补列、补建索引），由服务启动时调用，导入本模块不修改数据库"""
+    Base.metadata.create_all(engine)
+    ensure_columns(engine)
+    ensure_indexes(engine)
+
+engine = create_db_engine()
+SessionLocal = sessionmaker(bind=engine)
+
+def get_db():
+    """FastAPI 依赖：每个请求从连接池取一个会话，请求结束后归还"""
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close() 
\ No newline at end of file
@@ -0,0 +1,147 @@
+import threading
+import numpy as np
+import pandas as pd
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from config import MAX_YEARS, ALL_TIME_YEARS
+from history_store import history_store
+from reference_data import reference_data
+from rolling_max_index import rolling_max_index, IndexNotReady
+from serialization import frame_to_records
+from metrics import record_cache, cache_evictions
+
+# 最多缓存几个交易日的全市场扫描结果
+SCAN_CACHE_SIZE = 5
+
+# scan_new_highs 输出的字段：(字段名, 列名, 类型, 缺失值)
+NEW_HIGH_FIELDS = [
+    ('ts_code', 'ts_code', str, None),
+    ('name', 'name', str, None),
+    ('trade_date', 'trade_date', str, None),
+    ('current_price', 'current_price', float, None),
+    ('pct_chg', 'pct_chg', float, None),
+    ('is_3y_high', 'is_3y_high', bool, False),
+    ('is_all_time_high', 'is_all_time_high', bool, False),
+    ('max_3y', 'max_3y', float, None),
+    ('max_all', 'max_all', float, None),
+]
+
+
+class NewHighScanner:
+    """
+    全市场新高扫描
+    优先查询增量维护的新高索引；索引不覆盖该交易日时，从本地历史数据构建 交易日×股票 的收盘价矩阵，
+    按列一次性求出3年最高价和历史最高价，得到全市场每只股票的 is_3y_high / is_all_time_high。
+    结果按交易日缓存，任意涨幅阈值的筛选都直接基于它完成。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._results = OrderedDict()  # trade_date -> 全市场扫描结果
+
+    def build_close_matrix(self, pro, start_date, end_date):
+        """构建 交易日×股票 的收盘价矩阵，缺失值为NaN"""
+        hist = history_store.get_market_history(pro, start_date, end_date,
+                                                columns=['ts_code', 'trade_date', 'close'])
+        return hist.pivot(index='trade_date', columns='ts_code', values='close').sort_index()
+
+    def scan_market(self, pro, trade_date):
+        """计算某交易日全市场每只股票的3年/历史最高价及是否创新高"""
+        with self._lock:
+            record_cache('new_high_scan', trade_date in self._results)
+            if trade_date in self._results:
+                self._results.move_to_end(trade_date)
+                return self._results[trade_date]
+
+        # 新高索引由定时任务构建和追加，这里只使用已有的索引，不在请求中回填历史数据
+        # 索引没有配置 MAX_YEARS 年窗口时回退到收盘价矩阵
+        if f'{MAX_YEARS}y' in rolling_max_index.windows:
+            rolling_max_index.catch_up(pro, trade_date, fetch=False)
+            if rolling_max_index.last_date != trade_date:
+                raise IndexNotReady(f"新高索引尚未更新到 {trade_date}（当前为 {rolling_max_index.last_date}），请稍后再试")
+            result = self._scan_from_index(pro, trade_date)
+        else:
+            result = self._scan_from_matrix(pro, trade_date)
+        if result.empty:
+            return result
+        result['trade_date'] = trade_date
+        result = reference_data.join(pro, result, columns=('name',))
+        result['name'] = result['name'].astype(object).where(result['name'].notna(), "未知")
+        result = result.reset_index(drop=True)
+
+        with self._lock:
+            self._results[trade_date] = result
+            while len(self._results) > SCAN_CACHE_SIZE:
+                self._results.popitem(last=False)
+                cache_evictions.inc(cache='new_high_scan', reason='capacity')
+        return result
+
+    def _scan_from_index(self, pro, trade_date):
+        """按新高索引逐只查询窗口最高价"""
+        today = history_store.get_daily(pro, trade_date)
+        if today is None or today.empty:
+            return pd.DataFrame()
+        result = today[['ts_code', 'close', 'pct_chg']].rename(columns={'close': 'current_price'})
+        max_3y, max_all = [], []
+        for ts_code in result['ts_code'].to_numpy():
+            info = rolling_max_index.lookup(ts_code)
+            max_3y.append(info[f'max_{MAX_YEARS}y'] if info else np.nan)
+            max_all.append(info['max_all'] if info else np.nan)
+        result['max_3y'] = np.array(max_3y, dtype=float)
+        result['max_all'] = np.array(max_all, dtype=float)
+        return self._flag(result)
+
+    def _scan_from_matrix(self, pro, trade_date):
+        """从收盘价矩阵按列求窗口最高价"""
+        end_date = datetime.strptime(trade_date, '%Y%m%d')
+        start_date_3y = (end_date - timedelta(days=MAX_YEARS * 365)).strftime('%Y%m%d')
+        start_date_all = (end_date - timedelta(days=ALL_TIME_YEARS * 365)).strftime('%Y%m%d')
+
+        matrix = self.build_close_matrix(pro, start_date_all, trade_date)
+        today = history_store.get_daily(pro, trade_date)
+        if matrix.empty or today is None or today.empty:
+            return pd.DataFrame()
+
+        values = matrix.to_numpy(dtype=float)
+        split = np.searchsorted(matrix.index.to_numpy(), start_date_3y)
+        # fmax.reduce 忽略NaN，整列都缺失时结果为NaN
+        max_all = np.fmax.reduce(values, axis=0)
+        max_3y = np.fmax.reduce(values[split:], axis=0) if split < len(values) else np.full(values.shape[1], np.nan)
+
+        result = today[['ts_code', 'close', 'pct_chg']].rename(columns={'close': 'current_price'})
+        positions = matrix.columns.get_indexer(result['ts_code'])
+        found = positions >= 0
+        result['max_3y'] = np.where(found, max_3y[positions], np.nan)
+        result['max_all'] = np.where(found, max_all[positions], np.nan)
+        return self._flag(result)
+
+    def _flag(self, result):
+        """根据窗口最高价判断是否创新高，没有3年历史数据的股票不参与判断"""
+        result = result[result['max_3y'].notna()].copy()
+        result['is_3y_high'] = result['current_price'].to_numpy() >= result['max_3y'].to_numpy()
+        result['is_all_time_high'] = result['current_price'].to_numpy() >= result['max_all'].to_numpy()
+        return result
+
+    def scan(self, pro, trade_date, min_pct_chg=7.0, ts_codes=None):
+        """
+        筛选涨幅超过 min_pct_chg 的股票并给出新高判断
+        min_pct_chg 为None时不按涨幅筛选；ts_codes 可限定股票范围
+        """
+        result = self.scan_market(pro, trade_date)
+        if result.empty:
+            return result
+        mask = np.ones(len(result), dtype=bool)
+        if min_pct_chg is not None:
+            mask &= result['pct_chg'].to_numpy() > min_pct_chg
+        if ts_codes is not None:
+            mask &= result['ts_code'].isin(ts_codes).to_numpy()
+        return result[mask].reset_index(drop=True)
+
+
+new_high_scanner = NewHighScanner()
+
+
+def scan_new_highs(pro, trade_date, min_pct_chg=7.0, ts_codes=None):
+    """返回涨幅超过阈值的股票及其3年新高/历史新高判断（字典列表）"""
+    result = new_high_scanner.scan(pro, trade_date, min_pct_chg, ts_codes)
+    return frame_to_records(result, NEW_HIGH_FIELDS)
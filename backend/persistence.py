@@ -0,0 +1,44 @@
+from sqlalchemy import delete, tuple_
+from sqlalchemy.dialects.sqlite import insert
+from models import NATURAL_KEYS
+
+
+def bulk_upsert(session, model, rows, keys=None):
+    """
+    批量写入：INSERT ... ON CONFLICT(自然键) DO UPDATE，一条语句以 executemany 方式提交所有行
+    rows 为字典列表，已存在的行按自然键更新为新值。
+    """
+    if not rows:
+        return 0
+    keys = keys or NATURAL_KEYS[model]
+    stmt = insert(model)
+    update_columns = [col for col in rows[0] if col not in keys and col != 'id']
+    stmt = stmt.on_conflict_do_update(
+        index_elements=list(keys),
+        set_={col: stmt.excluded[col] for col in update_columns}
+    )
+    session.execute(stmt, rows)
+    return len(rows)
+
+
+def replace_date(session, model, date, rows, keys=None):
+    """
+    用 rows 替换某个日期的全部数据：按自然键批量写入，再删除该日期下本次没有出现的旧行
+    代替原来的"先删除当天数据再逐行 add"，数据不变的行不会被删除重建。
+    """
+    keys = keys or NATURAL_KEYS[model]
+    other_keys = [key for key in keys if key != 'date']
+    bulk_upsert(session, model, rows, keys)
+    stale = delete(model).where(model.date == date)
+    if rows:
+        if not other_keys:
+            # 自然键只有日期时，写入本身就已替换了当天的数据
+            return len(rows)
+        columns = [getattr(model, key) for key in other_keys]
+        current = [tuple(row[key] for key in other_keys) for row in rows]
+        if len(columns) == 1:
+            stale = stale.where(columns[0].not_in([values[0] for values in current]))
+        else:
+            stale = stale.where(tuple_(*columns).not_in(current))
+    session.execute(stale)
+    return len(rows)
@@ -0,0 +1,102 @@
+import threading
+import numpy as np
+import pandas as pd
+from datetime import datetime
+from data_version import data_versions
+
+# 股票基本信息中按字典编码存储的列
+CATEGORICAL_COLUMNS = ['name', 'area', 'industry', 'market']
+REFERENCE_FIELDS = 'ts_code,name,area,industry,market,list_date'
+
+
+class ReferenceData:
+    """
+    股票基本信息（stock_basic）缓存
+    每天只从tushare加载一次，name/area/industry/market 以 category 列存储，
+    按 ts_code 查询单只股票是一次字典查找，与行情表的合并按整列取值完成。
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._frame = None
+        self._index = None        # ts_code 组成的 pd.Index，用于批量定位
+        self._positions = {}      # ts_code -> 行号
+        self._loaded_date = None
+
+    def _ensure_loaded(self, pro):
+        today = datetime.today().strftime('%Y%m%d')
+        with self._lock:
+            if self._frame is not None and self._loaded_date == today:
+                return
+            stock_basic = pro.stock_basic(fields=REFERENCE_FIELDS)
+            if stock_basic is None or stock_basic.empty:
+                # 加载失败时沿用旧数据
+                if self._frame is not None:
+                    return
+                stock_basic = pd.DataFrame(columns=REFERENCE_FIELDS.split(','))
+            frame = stock_basic.drop_duplicates('ts_code').reset_index(drop=True)
+            for col in CATEGORICAL_COLUMNS:
+                if col in frame.columns:
+                    frame[col] = frame[col].astype('category')
+            self._frame = frame
+            self._index = pd.Index(frame['ts_code'])
+            self._positions = {code: i for i, code in enumerate(frame['ts_code'])}
+            self._loaded_date = today
+            data_versions.bump('market')
+            print(f"已加载股票基本信息: {len(frame)}只股票")
+
+    def frame(self, pro):
+        """完整的股票基本信息表（只读）"""
+        self._ensure_loaded(pro)
+        return self._frame
+
+    def lookup(self, pro, ts_code):
+        """按 ts_code 查询单只股票的基本信息，不存在时返回None"""
+        self._ensure_loaded(pro)
+        with self._lock:
+            pos = self._positions.get(ts_code)
+            if pos is None:
+                return None
+            row = self._frame.iloc[pos]
+        return {col: (None if pd.isna(row[col]) else row[col]) for col in self._frame.columns}
+
+    def get_name(self, pro, ts_code, default="未知"):
+        """查询股票名称"""
+        info = self.lookup(pro, ts_code)
+        if info is None or info.get('name') is None:
+            return default
+        return info['name']
+
+    def locate(self, pro, ts_codes):
+        """返回 (基本信息表, 每个 ts_code 在表中的行号)，未匹配的行号为-1"""
+        self._ensure_loaded(pro)
+        with self._lock:
+            frame = self._frame
+            index = self._index
+        return frame, index.get_indexer(ts_codes)
+
+    def join(self, pro, df, columns=('name', 'area', 'industry', 'market')):
+        """给行情表按 ts_code 追加基本信息列（左连接），返回新表"""
+        self._ensure_loaded(pro)
+        with self._lock:
+            frame = self._frame
+            index = self._index
+        positions = index.get_indexer(df['ts_code'])
+        missing = positions < 0
+        result = df.copy()
+        for col in columns:
+            if col not in frame.columns:
+                continue
+            source = frame[col]
+            if isinstance(source.dtype, pd.CategoricalDtype):
+                # 直接按编码取值，未匹配的行编码为-1即缺失值
+                codes = np.where(missing, -1, source.cat.codes.to_numpy()[positions])
+                result[col] = pd.Categorical.from_codes(codes, dtype=source.dtype)
+            else:
+                values = source.to_numpy(dtype=object)[positions]
+                values[missing] = None
+                result[col] = values
+        return result
+
+
+reference_data = ReferenceData()
@@ -0,0 +1,175 @@
+import os
+import pickle
+import threading
+from collections import deque
+from datetime import datetime, timedelta
+from config import ALL_TIME_YEARS, DATA_DIR, ROLLING_MAX_WINDOWS
+from history_store import history_store
+from trade_calendar import trade_calendar
+
+INDEX_PATH = os.path.join(DATA_DIR, 'rolling_max_index.pkl')
+
+
+class IndexNotReady(RuntimeError):
+    """新高索引或它依赖的本地历史日线尚未就绪（由定时任务在后台构建）"""
+
+
+def _cutoff(trade_date, years):
+    """窗口起始日期（含），与其他模块一样按 years*365 个自然日回看"""
+    return (datetime.strptime(trade_date, '%Y%m%d') - timedelta(days=years * 365)).strftime('%Y%m%d')
+
+
+class RollingMaxIndex:
+    """
+    按股票维护的N年最高收盘价索引
+    每个窗口用一个单调递减队列保存 (交易日, 收盘价)，队首即窗口内最高价及其出现日期；
+    历史最高价单独记录。每追加一个交易日，每只股票的更新均摊 O(1)，判断是否创新高只需一次字典查询。
+    索引持久化到本地文件，重启后从上次的交易日继续追加。
+    _lock 只保护内存中的索引，持有时间为追加一天或一次查询；追加、加载和保存由 _update_lock 串行，
+    读取历史数据和写文件期间查询不受影响。
+    """
+
+    def __init__(self, path=INDEX_PATH, windows=ROLLING_MAX_WINDOWS):
+        self.path = path
+        self.windows = dict(windows)  # 窗口名 -> 年数
+        self._lock = threading.RLock()
+        self._update_lock = threading.RLock()
+        self._entries = {}   # ts_code -> {'windows': {窗口名: deque}, 'max_all': (收盘价, 日期), 'last': (日期, 收盘价)}
+        self.last_date = None
+        self._loaded_mtime = None  # 已加载的索引文件的修改时间
+        self._load()
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            mtime = os.path.getmtime(self.path)
+            with open(self.path, 'rb') as f:
+                state = pickle.load(f)
+        except Exception as e:
+            print(f"加载新高索引失败，将重新构建: {e}")
+            return
+        with self._lock:
+            self._loaded_mtime = mtime
+            if state.get('windows') == self.windows and (self.last_date or '') < (state.get('last_date') or ''):
+                self._entries = state['entries']
+                self.last_date = state['last_date']
+
+    def _reload_if_changed(self):
+        """索引文件被其他进程（运行定时任务的进程）更新过时重新加载"""
+        try:
+            mtime = os.path.getmtime(self.path)
+        except OSError:
+            return
+        if mtime != self._loaded_mtime:
+            self._load()
+
+    def save(self):
+        # 只有持有 _update_lock 时才会修改索引，写文件期间不阻塞查询
+        with self._update_lock:
+            state = {'windows': self.windows, 'entries': self._entries, 'last_date': self.last_date}
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            tmp_path = f'{self.path}.{os.getpid()}.tmp'
+            with open(tmp_path, 'wb') as f:
+                pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, self.path)
+
+    def append_day(self, trade_date, df):
+        """追加一个交易日的全市场收盘价，交易日必须晚于已追加的最后一天"""
+        with self._lock:
+            if self.last_date is not None and trade_date <= self.last_date:
+                return
+            cutoffs = {name: _cutoff(trade_date, years) for name, years in self.windows.items()}
+            for ts_code, close in zip(df['ts_code'].tolist(), df['close'].astype(float).tolist()):
+                if close != close:  # NaN
+                    continue
+                entry = self._entries.get(ts_code)
+                if entry is None:
+                    entry = {'windows': {name: deque() for name in self.windows}, 'max_all': (close, trade_date)}
+                    self._entries[ts_code] = entry
+                for name, window in entry['windows'].items():
+                    # 比当前收盘价低（或相等）的旧值不可能再成为窗口最大值
+                    while window and window[-1][1] <= close:
+                        window.pop()
+                    window.append((trade_date, close))
+                    while window[0][0] < cutoffs[name]:
+                        window.popleft()
+                if close >= entry['max_all'][0]:
+                    entry['max_all'] = (close, trade_date)
+                entry['last'] = (trade_date, close)
+            self.last_date = trade_date
+
+    def catch_up(self, pro, end_date, fetch=True):
+        """
+        把索引追加到 end_date，首次使用时回看 ALL_TIME_YEARS 年构建（跳过本地缺失的交易日）
+        fetch为False时（接口请求）不拉取数据也不构建：只重新加载其他进程保存的索引并追加本地已有的交易日，
+        其他线程正在追加时直接返回；索引还没有构建时抛出 IndexNotReady。
+        拉取和读取历史数据时不持有 _lock，只在追加每一天时短暂持有，查询不会被长时间阻塞。
+        """
+        if not self._update_lock.acquire(blocking=fetch):
+            return
+        try:
+            if not fetch:
+                self._reload_if_changed()
+            last_date = self.last_date
+            if last_date is not None and last_date >= end_date:
+                return
+            if last_date is None:
+                if not fetch:
+                    raise IndexNotReady("新高索引正在后台构建，请稍后再试")
+                start_date = _cutoff(end_date, ALL_TIME_YEARS)
+            else:
+                start_date = (datetime.strptime(last_date, '%Y%m%d') + timedelta(days=1)).strftime('%Y%m%d')
+            trade_dates = trade_calendar.trading_days_between(pro, start_date, end_date)
+            if not trade_dates:
+                return
+            if fetch:
+                print(f"正在更新新高索引: {trade_dates[0]} 至 {trade_dates[-1]}，共{len(trade_dates)}个交易日")
+                history_store.sync(pro, trade_dates)
+            skipped = []
+            for trade_date in trade_dates:
+                if not history_store.has_date(trade_date):
+                    if last_date is None:
+                        # 首次构建时跳过缺失的交易日（拉取失败或没有数据），一天的缺失不阻塞整个索引
+                        skipped.append(trade_date)
+                        continue
+                    # 增量追加时停在这里，下次从缺失的交易日继续
+                    break
+                self.append_day(trade_date, history_store.get_daily(pro, trade_date))
+            if skipped:
+                print(f"构建新高索引时跳过 {len(skipped)} 个缺失数据的交易日: {', '.join(skipped[:10])}")
+            if fetch and self.last_date is not None:
+                self.save()
+        finally:
+            self._update_lock.release()
+
+    def lookup(self, ts_code):
+        """查询某只股票的窗口最高价，返回字典；索引中没有该股票时返回None"""
+        with self._lock:
+            entry = self._entries.get(ts_code)
+            if entry is None:
+                return None
+            last_date, last_close = entry['last']
+            result = {'ts_code': ts_code, 'last_date': last_date, 'last_close': last_close}
+            for name, window in entry['windows'].items():
+                # 停牌的股票没有新的交易日触发淘汰，队首可能已滑出窗口；
+                # 队列按日期递增、收盘价递减，第一个仍在窗口内的元素就是窗口最高价
+                cutoff = _cutoff(self.last_date, self.windows[name])
+                result[f'max_{name}'], result[f'max_{name}_date'] = None, None
+                for date, close in window:
+                    if date >= cutoff:
+                        result[f'max_{name}'], result[f'max_{name}_date'] = close, date
+                        break
+            result['max_all'], result['max_all_date'] = entry['max_all']
+            return result
+
+    def is_new_high(self, ts_code, window='3y'):
+        """最新交易日的收盘价是否为窗口内最高价"""
+        info = self.lookup(ts_code)
+        if info is None or info['last_date'] != self.last_date:
+            return False
+        key = 'max_all' if window == 'all' else f'max_{window}'
+        return info[key] is not None and info['last_close'] >= info[key]
+
+
+rolling_max_index = RollingMaxIndex()
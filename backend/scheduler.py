@@ -1,101 +1,117 @@
-from market_analysis import get_market_rise_fall_stats
-from high_rise_stocks import find_high_rise_stocks
-from models import MarketStats, SessionLocal, HighRiseStock, RiseFallDistribution, UnifiedMarketAnalysis
+from models import MarketStats, HighRiseStock, RiseFallDistribution, UnifiedMarketAnalysis
 import datetime
-from rise_fall_analysis import analyze_rise_fall_distribution
 import json
-from Total_market_analysis import unified_market_analysis
+from config import HIGH_RISE_LOOKBACK_DAYS
+from fetcher import get_pro
+from history_store import history_store
+from rolling_max_index import rolling_max_index
+from trade_calendar import get_latest_trade_date, get_previous_trading_days
+from persistence import bulk_upsert, replace_date
+from serialization import encode_stored_body
+from daily_pipeline import (
+    DailyPipeline,
+    Stage,
+    compute_market_stats,
+    compute_rise_fall_distribution,
+    compute_unified_market_analysis,
+    compute_high_rise_stocks
+)
 
-def save_market_stats():
-    today_stats, _, _ = get_market_rise_fall_stats(days=5)
-    if today_stats:
-        session = SessionLocal()
-        # 检查当天是否已存在
-        exists = session.query(MarketStats).filter_by(date=today_stats['date']).first()
-        if not exists:
-            stats = MarketStats(
-                date=today_stats['date'],
-                total=today_stats['total'],
-                rise=today_stats['rise'],
-                fall=today_stats['fall'],
-                flat=today_stats['flat'],
-                rise_ratio=today_stats['rise_ratio'],
-                created_at=datetime.datetime.utcnow()
-            )
-            session.add(stats)
-            session.commit()
-        session.close()
+def write_market_stats(session, date, result):
+    today_stats = result['today_stats']
+    bulk_upsert(session, MarketStats, [dict(
+        date=date,
+        total=today_stats['total'],
+        rise=today_stats['rise'],
+        fall=today_stats['fall'],
+        flat=today_stats['flat'],
+        rise_ratio=today_stats['rise_ratio'],
+        created_at=datetime.datetime.utcnow()
+    )])
 
-def save_high_rise_stocks():
-    stocks = find_high_rise_stocks()
-    if stocks:
-        session = SessionLocal()
-        date = stocks[0].get('trade_date') or datetime.datetime.now().strftime('%Y%m%d')
-        # 先删除当天旧数据
-        session.query(HighRiseStock).filter_by(date=date).delete()
-        for s in stocks:
-            stock = HighRiseStock(
-                date=date,
-                ts_code=s['ts_code'],
-                name=s['name'],
-                current_price=s['current_price'],
-                pct_chg=s['pct_chg'],
-                is_3y_high=bool(s['is_3y_high']),
-                is_all_time_high=bool(s['is_all_time_high']),
-                max_3y=s['max_3y'],
-                max_all=s['max_all']
-            )
-            session.add(stock)
-        session.commit()
-        session.close()
+def write_high_rise_stocks(session, date, stocks):
+    # 按 (date, ts_code) 批量写入，并删除当天不再符合条件的旧数据
+    replace_date(session, HighRiseStock, date, [dict(
+        date=date,
+        ts_code=s['ts_code'],
+        name=s['name'],
+        current_price=s['current_price'],
+        pct_chg=s['pct_chg'],
+        is_3y_high=bool(s['is_3y_high']),
+        is_all_time_high=bool(s['is_all_time_high']),
+        max_3y=s['max_3y'],
+        max_all=s['max_all'],
+        created_at=datetime.datetime.utcnow()
+    ) for s in stocks])
 
-def save_rise_fall_distribution():
-    result = analyze_rise_fall_distribution()
-    if result:
-        rise_distribution, fall_distribution = result
-        # 获取今天日期
-        today = datetime.datetime.now().strftime('%Y%m%d')
-        session = SessionLocal()
-        # 先删除当天旧数据
-        session.query(RiseFallDistribution).filter_by(date=today).delete()
-        # 写入上涨分布
-        for label, data in rise_distribution.items():
-            record = RiseFallDistribution(
-                date=today,
-                label=label,
-                count=data['count'],
-                percentage=data['percentage'],
-                type='rise'
-            )
-            session.add(record)
-        # 写入下跌分布
-        for label, data in fall_distribution.items():
-            record = RiseFallDistribution(
-                date=today,
+def write_rise_fall_distribution(session, date, result):
+    rise_distribution, fall_distribution = result
+    rows = []
+    # 上涨分布和下跌分布按 (date, type, label) 批量写入
+    for type_, distribution in (('rise', rise_distribution), ('fall', fall_distribution)):
+        for label, data in distribution.items():
+            rows.append(dict(
+                date=date,
                 label=label,
                 count=data['count'],
                 percentage=data['percentage'],
-                type='fall'
-            )
-            session.add(record)
-        session.commit()
-        session.close()
+                type=type_,
+                created_at=datetime.datetime.utcnow()
+            ))
+    replace_date(session, RiseFallDistribution, date, rows)
+
+def write_unified_market_analysis(session, date, result):
+    # 同时存入接口的完整响应体，读取时直接返回
+    body, encoding, digest = encode_stored_body({
+        "today_stats": result['today_stats'],
+        "rise_distribution": result['rise_distribution'],
+        "fall_distribution": result['fall_distribution'],
+        "recent_stats": result['recent_stats'],
+        "avg_stats": result['avg_stats'],
+        "date": date
+    })
+    bulk_upsert(session, UnifiedMarketAnalysis, [dict(
+        date=date,
+        today_stats=json.dumps(result['today_stats'], ensure_ascii=False),
+        rise_distribution=json.dumps(result['rise_distribution'], ensure_ascii=False),
+        fall_distribution=json.dumps(result['fall_distribution'], ensure_ascii=False),
+        recent_stats=json.dumps(result['recent_stats'], ensure_ascii=False),
+        avg_stats=json.dumps(result['avg_stats'], ensure_ascii=False),
+        response_body=body,
+        response_encoding=encoding,
+        response_hash=digest,
+        created_at=datetime.datetime.utcnow()
+    )])
+
+# 四个分析共用一次加载的数据，综合分析依赖涨跌统计和涨跌分布的结果
+daily_pipeline = DailyPipeline([
+    Stage('market_stats', compute_market_stats, write_market_stats),
+    Stage('rise_fall_distribution', compute_rise_fall_distribution, write_rise_fall_distribution),
+    Stage('unified_market_analysis', compute_unified_market_analysis, write_unified_market_analysis,
+          deps=('market_stats', 'rise_fall_distribution')),
+    Stage('high_rise_stocks', compute_high_rise_stocks, write_high_rise_stocks),
+])
+
+def save_daily_analysis():
+    daily_pipeline.run()
+
+def save_market_stats():
+    daily_pipeline.run(['market_stats'])
+
+def save_high_rise_stocks():
+    daily_pipeline.run(['high_rise_stocks'])
+
+def save_rise_fall_distribution():
+    daily_pipeline.run(['rise_fall_distribution'])
 
 def save_unified_market_analysis():
-    result = unified_market_analysis()
-    if result:
-        today = result['today_stats']['date'] if result['today_stats'] else datetime.datetime.now().strftime('%Y%m%d')
-        session = SessionLocal()
-        # 先删除当天旧数据
-        session.query(UnifiedMarketAnalysis).filter_by(date=today).delete()
-        record = UnifiedMarketAnalysis(
-            date=today,
-            today_stats=json.dumps(result['today_stats'], ensure_ascii=False),
-            rise_distribution=json.dumps(result['rise_distribution'], ensure_ascii=False),
-            fall_distribution=json.dumps(result['fall_distribution'], ensure_ascii=False),
-            recent_stats=json.dumps(result['recent_stats'], ensure_ascii=False),
-            avg_stats=json.dumps(result['avg_stats'], ensure_ascii=False)
-        )
-        session.add(record)
-        session.commit()
-        session.close() 
\ No newline at end of file
+    daily_pipeline.run(['unified_market_analysis'])
+
+def warm_market_history():
+    """预先同步接口用到的历史日线并构建新高索引，接口请求只读取本地数据"""
+    pro = get_pro()
+    latest_date = get_latest_trade_date(pro)
+    if not latest_date:
+        raise RuntimeError("无法获取最新交易日数据")
+    history_store.sync(pro, get_previous_trading_days(pro, HIGH_RISE_LOOKBACK_DAYS, latest_date))
+    rolling_max_index.catch_up(pro, latest_date)
@@ -0,0 +1,85 @@
+import gzip
+import hashlib
+import json
+import numpy as np
+import pandas as pd
+import orjson
+from fastapi import Response
+from fastapi.responses import JSONResponse
+from config import STORED_RESPONSE_GZIP_MIN_BYTES
+
+
+class FastJSONResponse(JSONResponse):
+    """
+    用 orjson 编码的 JSON 响应
+    直接返回该响应时跳过 FastAPI 的 jsonable_encoder 逐字段转换；numpy 标量和数组可以直接编码。
+    """
+
+    def render(self, content):
+        return orjson.dumps(content, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS)
+
+
+def _column_values(data, size, column, kind, default):
+    """把一列转换为 Python 值列表，缺失值替换为 default"""
+    if column not in data:
+        return [default] * size
+    column_data = data[column]
+    if kind is float or kind is int:
+        values = np.asarray(column_data, dtype=float)
+        missing = np.isnan(values)
+        if kind is int:
+            values = np.where(missing, 0, values).astype(np.int64)
+        values = values.tolist()
+    else:
+        missing = np.asarray(pd.isna(column_data))
+        values = np.asarray(column_data, dtype=object)
+        if kind is bool:
+            values = np.where(missing, False, values).astype(bool).tolist()
+        else:
+            values = values.astype(str).tolist()
+    if missing.any():
+        for i in np.flatnonzero(missing).tolist():
+            values[i] = default
+    return values
+
+
+def frame_to_records(data, fields):
+    """
+    按列把 DataFrame（或 列名 -> 数组 的字典）转换为字典列表，代替 iterrows 逐行逐格的 pd.notna/float 转换
+    fields 为 (输出字段名, 列名, 类型, 缺失值) 的列表，类型为 float/int/bool/str；列不存在时整列取缺失值。
+    """
+    size = len(data) if isinstance(data, pd.DataFrame) else len(next(iter(data.values()), ()))
+    names = [field[0] for field in fields]
+    columns = [_column_values(data, size, column, kind, default) for _, column, kind, default in fields]
+    return [dict(zip(names, row)) for row in zip(*columns)]
+
+
+def encode_stored_body(payload, gzip_min_bytes=STORED_RESPONSE_GZIP_MIN_BYTES):
+    """
+    把接口响应预先序列化为存储用的字节串，返回 (body, encoding, hash)
+    与FastAPI默认输出一致（紧凑分隔符、保留中文）；超过 gzip_min_bytes 时gzip压缩，hash基于未压缩内容计算。
+    """
+    raw = json.dumps(payload, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    digest = hashlib.sha256(raw).hexdigest()[:32]
+    if len(raw) >= gzip_min_bytes:
+        # mtime固定为0，相同内容压缩结果一致
+        return gzip.compress(raw, mtime=0), 'gzip', digest
+    return raw, None, digest
+
+
+def stored_body_response(request, body, encoding, digest):
+    """
+    直接返回预先序列化的响应体
+    带 ETag，客户端缓存一致时返回304；客户端支持gzip时原样返回压缩数据，否则解压后返回。
+    """
+    etag = f'"{digest}"'
+    headers = {'ETag': etag}
+    if request.headers.get('if-none-match') == etag:
+        return Response(status_code=304, headers=headers)
+    if encoding == 'gzip':
+        if 'gzip' in request.headers.get('accept-encoding', ''):
+            headers['Content-Encoding'] = 'gzip'
+            headers['Vary'] = 'Accept-Encoding'
+        else:
+            body = gzip.decompress(body)
+    return Response(content=body, media_type='application/json', headers=headers)
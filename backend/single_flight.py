@@ -0,0 +1,112 @@
+import asyncio
+import contextvars
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import datetime
+from config import JOB_MAX_WORKERS, JOB_STATUS_HISTORY
+from data_access import run_blocking
+
+
+class SingleFlight:
+    """
+    按键合并重复的计算
+    键一般是 "任务名:交易日"。同一个键正在执行时，后来的调用不再重新计算，而是等待正在执行的那一次并共享其结果（或异常）。
+    每个键最近一次执行的状态、耗时和合并的调用数都会记录下来，供任务状态接口查询。
+    """
+
+    def __init__(self, max_workers=JOB_MAX_WORKERS, history_size=JOB_STATUS_HISTORY):
+        self._lock = threading.Lock()
+        self._inflight = {}            # key -> Future
+        self._records = OrderedDict()  # key -> 执行状态
+        self.history_size = history_size
+        # 后台任务（刷新接口）专用线程池，不占用数据访问线程池
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='job')
+
+    def _begin(self, key):
+        """登记一次调用，返回 (Future, 是否由本次调用执行)"""
+        with self._lock:
+            future = self._inflight.get(key)
+            if future is not None:
+                self._records[key]['joined'] += 1
+                return future, False
+            future = Future()
+            self._inflight[key] = future
+            self._records.pop(key, None)
+            self._records[key] = {
+                'key': key,
+                'status': 'running',
+                'started_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+                'finished_at': None,
+                'duration': None,
+                'error': None,
+                'joined': 0
+            }
+            self._trim()
+            return future, True
+
+    def _trim(self):
+        """只保留最近 history_size 条记录，从最早的已完成记录删起（正在执行的记录不删除）；调用时须持有 _lock"""
+        excess = len(self._records) - self.history_size
+        if excess <= 0:
+            return
+        for key in [key for key in self._records if key not in self._inflight][:excess]:
+            del self._records[key]
+
+    def _execute(self, key, future, func, args, kwargs):
+        start = time.perf_counter()
+        try:
+            result = func(*args, **kwargs)
+        except BaseException as e:
+            self._finish(key, 'failed', start, str(e))
+            future.set_exception(e)
+        else:
+            self._finish(key, 'finished', start, None)
+            future.set_result(result)
+
+    def _finish(self, key, status, start, error):
+        with self._lock:
+            self._inflight.pop(key, None)
+            record = self._records.get(key)
+            if record is not None:
+                record['status'] = status
+                record['finished_at'] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+                record['duration'] = round(time.perf_counter() - start, 3)
+                record['error'] = error
+            self._trim()
+
+    def run(self, key, func, *args, **kwargs):
+        """在当前线程执行（或等待正在执行的同键调用）并返回结果"""
+        future, leader = self._begin(key)
+        if leader:
+            self._execute(key, future, func, args, kwargs)
+        return future.result()
+
+    async def run_async(self, key, func, *args, **kwargs):
+        """async接口使用：在数据访问线程池中执行，等待中的重复请求不占用线程"""
+        future, leader = self._begin(key)
+        if leader:
+            await run_blocking(self._execute, key, future, func, args, kwargs)
+        return await asyncio.wrap_future(future)
+
+    def submit(self, key, func, *args, **kwargs):
+        """提交后台执行，返回 (Future, 是否新启动)；同键任务已在执行时直接返回它的Future"""
+        future, leader = self._begin(key)
+        if leader:
+            self._executor.submit(contextvars.copy_context().run, self._execute, key, future, func, args, kwargs)
+        return future, leader
+
+    def status(self, key=None):
+        """查询执行状态：指定key时返回该条记录（不存在为None），否则按开始时间倒序返回全部记录"""
+        with self._lock:
+            if key is not None:
+                record = self._records.get(key)
+                return dict(record) if record else None
+            return [dict(record) for record in reversed(self._records.values())]
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False)
+
+
+single_flight = SingleFlight()
@@ -0,0 +1,86 @@
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from config import SNAPSHOT_CACHE_SIZE, SNAPSHOT_TODAY_TTL_SECONDS, SNAPSHOT_SETTLE_TIME
+from history_store import history_store
+from reference_data import reference_data
+from metrics import record_cache, cache_evictions
+
+
+class SnapshotCache:
+    """
+    按交易日缓存的全市场快照（日线 + 股票基本信息合并后的表）
+    已收盘的历史交易日数据不会再变，缓存永不过期；当天的快照在数据稳定时间点之前按TTL过期。
+    超过容量时按LRU淘汰。返回的DataFrame由所有请求共享，调用方只读不改。
+    """
+
+    def __init__(self, name, max_size=SNAPSHOT_CACHE_SIZE):
+        self.name = name  # 监控指标中的缓存名称
+        self.max_size = max_size
+        self._lock = threading.RLock()
+        self._entries = OrderedDict()  # trade_date -> (DataFrame, 过期时间或None)
+
+    def _expires_at(self, trade_date, now):
+        """计算快照的过期时间，None表示永不过期"""
+        if trade_date < now.strftime('%Y%m%d'):
+            return None
+        hour, minute = map(int, SNAPSHOT_SETTLE_TIME.split(':'))
+        settle_time = now.replace(hour=hour, minute=minute, second=0, microsecond=0)
+        if now >= settle_time:
+            return None
+        return min(now + timedelta(seconds=SNAPSHOT_TODAY_TTL_SECONDS), settle_time)
+
+    def get(self, trade_date):
+        """读取缓存，未命中或已过期返回None"""
+        with self._lock:
+            entry = self._entries.get(trade_date)
+            if entry is None:
+                record_cache(self.name, False)
+                return None
+            df, expires_at = entry
+            if expires_at is not None and datetime.now() >= expires_at:
+                del self._entries[trade_date]
+                cache_evictions.inc(cache=self.name, reason='expired')
+                record_cache(self.name, False)
+                return None
+            self._entries.move_to_end(trade_date)
+            record_cache(self.name, True)
+            return df
+
+    def put(self, trade_date, df):
+        with self._lock:
+            self._entries[trade_date] = (df, self._expires_at(trade_date, datetime.now()))
+            self._entries.move_to_end(trade_date)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                cache_evictions.inc(cache=self.name, reason='capacity')
+
+    def invalidate(self, trade_date=None):
+        """清除某个交易日（或全部）的快照"""
+        with self._lock:
+            if trade_date is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(trade_date, None)
+
+
+snapshot_cache = SnapshotCache('market_snapshot')
+
+
+def build_market_snapshot(pro, trade_date):
+    """拉取某交易日的日线并合并股票基本信息"""
+    df = history_store.get_daily(pro, trade_date)
+    if df is None or df.empty:
+        return None
+    return reference_data.join(pro, df)
+
+
+def get_market_snapshot(pro, trade_date):
+    """获取某交易日的全市场快照，优先读缓存"""
+    df = snapshot_cache.get(trade_date)
+    if df is not None:
+        return df
+    df = build_market_snapshot(pro, trade_date)
+    if df is not None:
+        snapshot_cache.put(trade_date, df)
+    return df
@@ -0,0 +1,187 @@
+import base64
+import threading
+import numpy as np
+import orjson
+import pandas as pd
+from config import STOCK_SORT_FIELDS
+from history_store import history_store
+from reference_data import reference_data
+from snapshot_cache import SnapshotCache
+
+# 取页时关联的股票基本信息列
+REFERENCE_COLUMNS = ['name', 'area', 'industry', 'market']
+
+
+class StockQuery:
+    """
+    某交易日全市场日线上的查询索引
+    构建时为每个可排序字段预先算好升序/降序的 argsort 排列（缺失值始终排在最后），
+    过滤条件合并成一个 NumPy 布尔掩码，只在排列上做一次筛选；
+    股票基本信息只对返回的那一页行做关联。对象构建后只读，可被并发请求共享。
+    """
+
+    def __init__(self, df, reference, reference_positions, sort_fields=STOCK_SORT_FIELDS):
+        self.frame = df.reset_index(drop=True)
+        self.size = len(self.frame)
+        self._columns = {col: self.frame[col].to_numpy() for col in self.frame.columns}
+        # 构建时的股票基本信息表及每行在其中的行号，取页时按行号取值
+        self._reference = {col: reference[col].to_numpy(dtype=object)
+                           for col in REFERENCE_COLUMNS if col in reference.columns}
+        self._reference_positions = np.asarray(reference_positions)
+        self.close = self.frame['close'].to_numpy(dtype=float, na_value=np.nan)
+        self.pct_chg = self.frame['pct_chg'].to_numpy(dtype=float, na_value=np.nan)
+        # ts_code 的交易所后缀（SZ/SH/BJ）
+        self.exchange = self.frame['ts_code'].astype(str).str.rpartition('.')[2].to_numpy()
+        self.ts_code = self.frame['ts_code'].astype(str).to_numpy(dtype=object)
+        self._values = {}
+        self._valid = {}
+        self._orders = {}
+        for field in sort_fields:
+            if field in self.frame.columns:
+                self._values[field], self._valid[field], self._orders[field] = \
+                    self._build_orders(self.frame[field], self.ts_code)
+
+    @staticmethod
+    def _build_orders(series, ts_code):
+        """
+        返回 (排序用的值, 是否非缺失, (升序排列, 降序排列))
+        按 (值, ts_code) 排序，ts_code 唯一，顺序完全确定；降序是升序在有效值和缺失值两段内各自反转，缺失值都在末尾。
+        """
+        if not pd.api.types.is_numeric_dtype(series):
+            values = series.astype(str).to_numpy(dtype=object)
+            valid = series.notna().to_numpy()
+        else:
+            values = series.to_numpy(dtype=float, na_value=np.nan)
+            valid = ~np.isnan(values)
+        ascending = np.lexsort((ts_code, values))
+        ascending = np.concatenate([ascending[valid[ascending]], ascending[~valid[ascending]]])
+        count = int(valid.sum())
+        descending = np.concatenate([ascending[:count][::-1], ascending[count:][::-1]])
+        return values, valid, (ascending, descending)
+
+    @property
+    def sort_fields(self):
+        return list(self._orders)
+
+    def _seek(self, sort_by, order, ascending, value, ts_code):
+        """返回排列中第一个排在游标 (value, ts_code) 之后的下标"""
+        values = self._values[sort_by][order]
+        codes = self.ts_code[order]
+        missing = ~self._valid[sort_by][order]
+        if value is not None and (values.dtype == object) != isinstance(value, str):
+            raise ValueError("分页游标与排序字段的类型不一致")
+        later_code = codes > ts_code if ascending else codes < ts_code
+        if value is None:
+            # 游标位于缺失值段，只在缺失值段内按 ts_code 继续
+            after = missing & later_code
+        else:
+            with np.errstate(invalid='ignore'):
+                later_value = values > value if ascending else values < value
+                after = missing | later_value | ((values == value) & later_code)
+        # 排列有序，after 是先 False 后 True 的单调序列
+        return int(np.argmax(after)) if after.any() else len(order)
+
+    def mask(self, min_rise=None, max_rise=None, min_price=None, max_price=None, market=None):
+        """把过滤条件合并成一个布尔掩码，没有任何条件时返回None"""
+        mask = None
+
+        def combine(condition):
+            nonlocal mask
+            mask = condition if mask is None else mask & condition
+
+        # 与 NaN 的比较结果为 False，缺失值的行会被过滤掉
+        if min_rise is not None:
+            combine(self.pct_chg >= min_rise)
+        if max_rise is not None:
+            combine(self.pct_chg <= max_rise)
+        if min_price is not None:
+            combine(self.close >= min_price)
+        if max_price is not None:
+            combine(self.close <= max_price)
+        if market:
+            combine(self.exchange == market)
+        return mask
+
+    def positions(self, sort_by='pct_chg', ascending=False, after=None, **filters):
+        """
+        返回排序并过滤后的行号数组
+        after 为游标 (排序值, ts_code) 时，只返回排在它之后的行（键集分页，数据更新后翻页也不重复、不遗漏）。
+        """
+        if sort_by not in self._orders:
+            raise ValueError(f"不支持的排序字段: {sort_by}，可选: {', '.join(self._orders)}")
+        order = self._orders[sort_by][0 if ascending else 1]
+        if after is not None:
+            order = order[self._seek(sort_by, order, ascending, *after):]
+        mask = self.mask(**filters)
+        if mask is not None:
+            order = order[mask[order]]
+        return order
+
+    def page(self, positions, offset, limit):
+        """
+        取出 positions[offset:offset+limit] 对应的行，并关联股票基本信息
+        返回 列名 -> 数组 的字典（不构建DataFrame），可直接交给 frame_to_records。
+        """
+        rows = positions[offset:offset + limit]
+        data = {col: values[rows] for col, values in self._columns.items()}
+        reference_rows = self._reference_positions[rows]
+        missing = reference_rows < 0
+        for col, values in self._reference.items():
+            column = values[reference_rows]
+            column[missing] = None
+            data[col] = column
+        return data
+
+
+    def cursor_key(self, sort_by, position):
+        """某一行的游标 (排序值, ts_code)，缺失值为None"""
+        value = self._values[sort_by][position]
+        if not self._valid[sort_by][position]:
+            value = None
+        elif isinstance(value, np.generic):
+            value = value.item()
+        return value, self.ts_code[position]
+
+
+def encode_cursor(sort_by, ascending, key):
+    """把游标编码为URL安全的字符串，包含排序字段和方向，换了排序方式的游标不能继续使用"""
+    value, ts_code = key
+    payload = orjson.dumps([sort_by, 'asc' if ascending else 'desc', value, ts_code])
+    return base64.urlsafe_b64encode(payload).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor, sort_by, ascending):
+    """解析游标，返回 (排序值, ts_code)；格式错误或与当前排序方式不一致时抛出 ValueError"""
+    try:
+        payload = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        cursor_sort_by, cursor_order, value, ts_code = orjson.loads(payload)
+    except (ValueError, TypeError, orjson.JSONDecodeError):
+        raise ValueError("无效的分页游标")
+    if cursor_sort_by != sort_by or cursor_order != ('asc' if ascending else 'desc'):
+        raise ValueError("分页游标与当前排序方式不一致")
+    if not isinstance(ts_code, str) or not (value is None or isinstance(value, (int, float, str))):
+        raise ValueError("无效的分页游标")
+    return value, ts_code
+
+
+# 查询索引与全市场快照的缓存策略一致：历史交易日永不过期，当天数据稳定前按TTL过期
+query_cache = SnapshotCache('stock_query')
+_build_lock = threading.Lock()
+
+
+def get_stock_query(pro, trade_date):
+    """获取某交易日的查询索引，优先读缓存"""
+    query = query_cache.get(trade_date)
+    if query is not None:
+        return query
+    with _build_lock:
+        query = query_cache.get(trade_date)
+        if query is not None:
+            return query
+        df = history_store.get_daily(pro, trade_date)
+        if df is None or df.empty:
+            return None
+        reference, positions = reference_data.locate(pro, df['ts_code'])
+        query = StockQuery(df, reference, positions)
+        query_cache.put(trade_date, query)
+    return query
@@ -0,0 +1,12 @@
+import os
+import sys
+import tempfile
+
+# 后端模块按扁平结构直接导入（与 uvicorn main:app 的运行方式一致）
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# 测试使用临时数据库，不改动仓库中的 market.db
+os.environ.setdefault('DATABASE_PATH', os.path.join(tempfile.mkdtemp(), 'test.db'))
+
+from models import engine, init_db
+
+init_db(engine)
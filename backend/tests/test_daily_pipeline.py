@@ -0,0 +1,70 @@
+import threading
+
+import pytest
+
+from daily_pipeline import DailyPipeline, PipelineError, Stage
+
+
+def _pipeline(log, fail=()):
+    lock = threading.Lock()
+
+    def stage(name):
+        def compute(context, inputs):
+            with lock:
+                log.append(name)
+            if name in fail:
+                raise RuntimeError(f'{name} 失败')
+            return {'name': name, 'inputs': sorted(inputs)}
+        return compute
+
+    return DailyPipeline([
+        Stage('unified', stage('unified'), deps=('stats', 'distribution')),
+        Stage('stats', stage('stats')),
+        Stage('distribution', stage('distribution')),
+        Stage('high_rise', stage('high_rise')),
+        Stage('report', stage('report'), deps=('unified',)),
+    ])
+
+
+def test_stages_run_after_their_dependencies():
+    log = []
+    pipeline = _pipeline(log)
+    results, errors = pipeline.compute({})
+    assert errors == {}
+    assert set(results) == {'unified', 'stats', 'distribution', 'high_rise', 'report'}
+    assert log.index('unified') > max(log.index('stats'), log.index('distribution'))
+    assert log.index('report') > log.index('unified')
+    assert results['unified']['inputs'] == ['distribution', 'stats']
+
+
+def test_resolve_adds_dependencies_in_order():
+    pipeline = _pipeline([])
+    assert pipeline._resolve(['report']) == ['stats', 'distribution', 'unified', 'report']
+    log = []
+    results, _ = _pipeline(log).compute({}, ['unified'])
+    assert set(results) == {'stats', 'distribution', 'unified'}
+    assert 'high_rise' not in log
+
+
+def test_resolve_rejects_cycles():
+    pipeline = DailyPipeline([Stage('a', None, deps=('b',)), Stage('b', None, deps=('a',))])
+    with pytest.raises(ValueError):
+        pipeline._resolve(['a'])
+
+
+def test_failed_stage_skips_only_its_dependents(monkeypatch):
+    log = []
+    pipeline = _pipeline(log, fail={'stats'})
+    results, errors = pipeline.compute({})
+    assert set(results) == {'distribution', 'high_rise'}
+    assert set(errors) == {'stats', 'unified', 'report'}
+    assert 'unified' not in log and 'report' not in log
+
+    # run 写入成功的阶段后再报告失败的阶段
+    written = {}
+    monkeypatch.setattr(pipeline, 'load', lambda pro, trade_date: {'trade_date': trade_date})
+    monkeypatch.setattr(pipeline, 'write', lambda trade_date, results: written.update(results))
+    with pytest.raises(PipelineError) as excinfo:
+        pipeline.run(trade_date='20240102', pro=object())
+    assert set(written) == {'distribution', 'high_rise'}
+    assert set(excinfo.value.errors) == {'stats', 'unified', 'report'}
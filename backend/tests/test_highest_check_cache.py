@@ -0,0 +1,80 @@
+from datetime import date, timedelta
+
+import pandas as pd
+
+import highest_check_cache
+import history_store
+import is_highest_today
+from models import SessionLocal
+from trade_calendar import TradeCalendar
+
+
+def _weekdays(start, end):
+    days, d = [], start
+    while d <= end:
+        if d.weekday() < 5:
+            days.append(d.strftime('%Y%m%d'))
+        d += timedelta(days=1)
+    return days
+
+
+class FakePro:
+    """A股/美股日历为全部工作日，美股日线按 published 逐日发布"""
+
+    def __init__(self, published):
+        self.published = list(published)
+        self.us_daily_calls = 0
+
+    def _calendar(self, start_date, end_date):
+        days = pd.date_range(start_date, end_date).strftime('%Y%m%d')
+        return pd.DataFrame({'cal_date': days, 'is_open': [int(pd.Timestamp(d).weekday() < 5) for d in days]})
+
+    def trade_cal(self, start_date, end_date, **kwargs):
+        return self._calendar(start_date, end_date)
+
+    def us_tradecal(self, start_date, end_date, **kwargs):
+        return self._calendar(start_date, end_date)
+
+    def stock_basic(self, **kwargs):
+        return pd.DataFrame(columns=['ts_code', 'name'])
+
+    def us_daily(self, ts_code, start_date, end_date):
+        self.us_daily_calls += 1
+        days = [d for d in self.published if start_date <= d <= end_date]
+        # 收盘价逐日上涨，最新一天总是新高
+        closes = [10.0 + self.published.index(d) for d in days]
+        return pd.DataFrame({'ts_code': ts_code, 'trade_date': days, 'close': closes, 'high': closes,
+                             'low': closes, 'pct_change': 1.0, 'vol': 100.0, 'amount': 1000.0})
+
+
+def test_us_check_follows_new_bar_without_a_share_rollover(tmp_path, monkeypatch):
+    today = date.today()
+    days = _weekdays(today - timedelta(days=400), today - timedelta(days=1))
+    pro = FakePro(days[:-1])
+    store = history_store.SymbolHistoryStore('us_daily', TradeCalendar('us_tradecal'), str(tmp_path))
+    monkeypatch.setattr(history_store, 'us_history_store', store)
+    # 覆盖区间只记到已有数据，且每次检查都允许增量补数
+    monkeypatch.setattr(history_store, 'SYMBOL_HISTORY_SETTLE_DAYS', 3650)
+    monkeypatch.setattr(history_store, 'SYMBOL_HISTORY_TOPUP_MINUTES', 0)
+    monkeypatch.setattr(is_highest_today, 'get_pro', lambda: pro)
+    # A股最新交易日一直不变，美股的结果不应以它为键
+    monkeypatch.setattr(highest_check_cache, 'get_latest_trade_date', lambda pro: days[0])
+
+    session = SessionLocal()
+    try:
+        first = highest_check_cache.check_highest(session, pro, 'AAPL.US', include_history=False)
+        assert first['trade_date'] == days[-2]
+
+        # 没有新日线时读 SQLite 中的结果，只做一次增量补数确认
+        calls = pro.us_daily_calls
+        again = highest_check_cache.check_highest(session, pro, 'AAPL.US', include_history=False)
+        assert again['trade_date'] == days[-2]
+        assert pro.us_daily_calls == calls + 1
+
+        # 美股发布新一天的日线后立即返回新的结果
+        pro.published.append(days[-1])
+        latest = highest_check_cache.check_highest(session, pro, 'AAPL.US', include_history=False)
+        assert latest['trade_date'] == days[-1]
+        assert latest['is_highest']
+    finally:
+        session.close()
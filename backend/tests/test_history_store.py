@@ -0,0 +1,72 @@
+import pandas as pd
+
+import history_store as history_store_module
+from history_store import HistoryStore
+
+DAYS = ['20240102', '20240103', '20240104', '20240105']
+
+
+class FakePro:
+    """按交易日返回全市场日线；unpublished 中的交易日返回空表，failing 中的交易日抛出异常"""
+
+    def __init__(self, unpublished=(), failing=()):
+        self.unpublished = set(unpublished)
+        self.failing = set(failing)
+        self.calls = []
+
+    def daily(self, trade_date):
+        self.calls.append(trade_date)
+        if trade_date in self.failing:
+            raise RuntimeError('接口超时')
+        if trade_date in self.unpublished:
+            return pd.DataFrame()
+        i = DAYS.index(trade_date)
+        return pd.DataFrame({'ts_code': ['000001.SZ', '600000.SH'], 'trade_date': trade_date,
+                             'close': [10.0 + i, 20.0 + i], 'pct_chg': [1.0, -1.0]})
+
+
+class FakeCalendar:
+    def trading_days_between(self, pro, start_date, end_date):
+        return [d for d in DAYS if start_date <= d <= end_date]
+
+    def mark_available(self, trade_date):
+        pass
+
+
+def test_sync_stores_published_days_and_retries_the_rest(tmp_path, monkeypatch):
+    monkeypatch.setattr(history_store_module, 'trade_calendar', FakeCalendar())
+    store = HistoryStore(root=str(tmp_path))
+    pro = FakePro(unpublished={'20240105'}, failing={'20240104'})
+
+    assert sorted(store.sync(pro, DAYS)) == ['20240102', '20240103']
+    assert [store.has_date(d) for d in DAYS] == [True, True, False, False]
+    assert store.stored_dates() == ['20240102', '20240103']
+
+    # 已落盘的交易日不再拉取，失败和未发布的交易日下次重试
+    pro.calls.clear()
+    pro.failing.clear()
+    pro.unpublished.clear()
+    assert sorted(store.sync(pro, DAYS)) == ['20240104', '20240105']
+    assert sorted(pro.calls) == ['20240104', '20240105']
+    pro.calls.clear()
+    assert store.sync(pro, DAYS) == []
+    assert pro.calls == []
+
+
+def test_read_only_history_uses_local_days(tmp_path, monkeypatch):
+    monkeypatch.setattr(history_store_module, 'trade_calendar', FakeCalendar())
+    store = HistoryStore(root=str(tmp_path))
+    pro = FakePro()
+    store.sync(pro, DAYS[:2])
+    pro.calls.clear()
+
+    df = store.get_history(pro, '000001.SZ', DAYS[0], DAYS[-1], sync=False)
+    assert pro.calls == []
+    assert df['trade_date'].tolist() == DAYS[:2]
+    assert df['close'].tolist() == [10.0, 11.0]
+    assert store.missing_dates(pro, DAYS[0], DAYS[-1]) == DAYS[2:]
+
+    df = store.get_history(pro, '000001.SZ', DAYS[0], DAYS[-1])
+    assert sorted(pro.calls) == DAYS[2:]
+    assert df['trade_date'].tolist() == DAYS
+    assert store.missing_dates(pro, DAYS[0], DAYS[-1]) == []
@@ -0,0 +1,82 @@
+from fastapi import FastAPI, HTTPException
+from fastapi.testclient import TestClient
+
+import http_cache
+from http_cache import add_http_cache
+
+
+class FakeVersions:
+    def __init__(self):
+        self.token = 'v1'
+        self.ready = True
+
+    def version(self, name, trade_date):
+        return self.token, 1704153600.0, self.ready
+
+
+def _client(monkeypatch):
+    versions = FakeVersions()
+    monkeypatch.setattr(http_cache, 'data_versions', versions)
+    monkeypatch.setattr(http_cache, 'get_latest_trade_date', lambda pro: '20240102')
+    calls = []
+    app = FastAPI()
+    add_http_cache(app, pro=None)
+
+    @app.get('/api/stocks')
+    def stocks():
+        calls.append('stocks')
+        return {'stocks': []}
+
+    @app.get('/api/filters')
+    def filters():
+        raise HTTPException(status_code=500, detail='无法获取股票数据')
+
+    @app.get('/api/job_status')
+    def job_status():
+        return {'jobs': []}
+
+    return TestClient(app), versions, calls
+
+
+def test_matching_etag_returns_304_without_calling_the_route(monkeypatch):
+    client, versions, calls = _client(monkeypatch)
+    response = client.get('/api/stocks')
+    assert response.status_code == 200
+    etag = response.headers['etag']
+    assert etag == 'W/"20240102-v1"'
+    assert response.headers['cache-control'].startswith('public, max-age=')
+    assert 'last-modified' in response.headers
+
+    response = client.get('/api/stocks', headers={'If-None-Match': etag})
+    assert response.status_code == 304
+    assert response.headers['etag'] == etag
+    assert calls == ['stocks']
+
+    # 数据版本变化后旧的 ETag 失效
+    versions.token = 'v2'
+    response = client.get('/api/stocks', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.headers['etag'] == 'W/"20240102-v2"'
+    assert calls == ['stocks', 'stocks']
+
+
+def test_if_modified_since(monkeypatch):
+    client, _, calls = _client(monkeypatch)
+    last_modified = client.get('/api/stocks').headers['last-modified']
+    assert client.get('/api/stocks', headers={'If-Modified-Since': last_modified}).status_code == 304
+    assert client.get('/api/stocks', headers={'If-Modified-Since': 'Mon, 01 Jan 2024 00:00:00 GMT'}).status_code == 200
+
+
+def test_unwritten_data_errors_and_uncached_routes(monkeypatch):
+    client, versions, _ = _client(monkeypatch)
+    versions.ready = False
+    assert client.get('/api/stocks').headers['cache-control'] == 'no-cache'
+
+    response = client.get('/api/filters')
+    assert response.status_code == 500
+    assert response.headers['cache-control'] == 'no-store'
+    assert 'etag' not in response.headers
+
+    response = client.get('/api/job_status')
+    assert 'etag' not in response.headers
+    assert 'cache-control' not in response.headers
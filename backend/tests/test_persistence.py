@@ -0,0 +1,58 @@
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from models import Base, HighRiseStock, RiseFallDistribution
+from persistence import replace_date
+
+
+@pytest.fixture
+def session(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'test.db'}")
+    Base.metadata.create_all(engine)
+    session = sessionmaker(bind=engine)()
+    yield session
+    session.close()
+    engine.dispose()
+
+
+def _stock(date, ts_code, price):
+    return dict(date=date, ts_code=ts_code, name=ts_code, current_price=price, pct_chg=8.0,
+                is_3y_high=True, is_all_time_high=False, max_3y=price, max_all=price)
+
+
+def _stocks(session, date):
+    rows = session.query(HighRiseStock).filter_by(date=date).order_by(HighRiseStock.ts_code).all()
+    return [(row.ts_code, row.current_price) for row in rows]
+
+
+def test_replace_date_upserts_and_deletes_stale_rows(session):
+    replace_date(session, HighRiseStock, '20240102', [_stock('20240102', 'A', 1.0), _stock('20240102', 'B', 2.0)])
+    replace_date(session, HighRiseStock, '20240103', [_stock('20240103', 'A', 1.5)])
+    session.commit()
+    ids = {row.ts_code: row.id for row in session.query(HighRiseStock).filter_by(date='20240102')}
+
+    replace_date(session, HighRiseStock, '20240102', [_stock('20240102', 'B', 2.5), _stock('20240102', 'C', 3.0)])
+    session.commit()
+    assert _stocks(session, '20240102') == [('B', 2.5), ('C', 3.0)]
+    # 仍然存在的行原地更新，不删除重建
+    assert session.query(HighRiseStock).filter_by(date='20240102', ts_code='B').one().id == ids['B']
+    # 其他日期不受影响
+    assert _stocks(session, '20240103') == [('A', 1.5)]
+
+    replace_date(session, HighRiseStock, '20240102', [])
+    session.commit()
+    assert _stocks(session, '20240102') == []
+    assert _stocks(session, '20240103') == [('A', 1.5)]
+
+
+def test_replace_date_with_composite_key(session):
+    def rows(labels):
+        return [dict(date='20240102', type=type_, label=label, count=1, percentage=10.0)
+                for type_, label in labels]
+
+    replace_date(session, RiseFallDistribution, '20240102', rows([('rise', '0-2%'), ('fall', '0-2%'), ('rise', '涨停')]))
+    replace_date(session, RiseFallDistribution, '20240102', rows([('rise', '0-2%'), ('fall', '涨停')]))
+    session.commit()
+    remaining = {(row.type, row.label) for row in session.query(RiseFallDistribution)}
+    assert remaining == {('rise', '0-2%'), ('fall', '涨停')}
@@ -0,0 +1,95 @@
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import rolling_max_index
+from rolling_max_index import RollingMaxIndex, _cutoff
+
+
+def _trading_days(start, count):
+    days, d = [], start
+    while len(days) < count:
+        if d.weekday() < 5:
+            days.append(d.strftime('%Y%m%d'))
+        d += timedelta(days=1)
+    return days
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_lookup_matches_brute_force_with_suspended_symbol(tmp_path, seed):
+    rng = np.random.default_rng(seed)
+    days = _trading_days(date(2021, 1, 4), 900)
+    codes = ['000001.SZ', '000002.SZ', '600000.SH']
+    closes = pd.DataFrame(np.cumprod(1 + rng.normal(0, 0.03, (len(days), len(codes))), axis=0) * 10,
+                          index=days, columns=codes)
+    # 600000.SH 在最后200个交易日停牌：不再出现在日线中，它的队列不会在追加时淘汰
+    suspended = days[-200:]
+    closes.loc[suspended, '600000.SH'] = np.nan
+
+    index = RollingMaxIndex(path=str(tmp_path / 'index.pkl'), windows={'1y': 1, '2y': 2})
+    for trade_date in days:
+        row = closes.loc[trade_date].dropna()
+        index.append_day(trade_date, pd.DataFrame({'ts_code': row.index, 'close': row.to_numpy()}))
+
+    last_date = days[-1]
+    for ts_code in codes:
+        info = index.lookup(ts_code)
+        series = closes[ts_code].dropna()
+        for name, years in index.windows.items():
+            window = series[series.index >= _cutoff(last_date, years)]
+            expected = window.max() if len(window) else None
+            assert info[f'max_{name}'] == expected, (ts_code, name)
+        assert info['max_all'] == series.max()
+
+
+class _GappyHistory:
+    """本地历史数据：missing 中的交易日一直拉取不到"""
+
+    def __init__(self, frames, missing):
+        self.frames = frames
+        self.missing = set(missing)
+
+    def sync(self, pro, trade_dates):
+        return []
+
+    def has_date(self, trade_date):
+        return trade_date in self.frames and trade_date not in self.missing
+
+    def get_daily(self, pro, trade_date):
+        return self.frames[trade_date]
+
+
+class _Calendar:
+    def __init__(self, days):
+        self.days = days
+
+    def trading_days_between(self, pro, start_date, end_date):
+        return [d for d in self.days if start_date <= d <= end_date]
+
+
+def test_first_build_skips_missing_days_at_window_start(tmp_path, monkeypatch):
+    days = _trading_days(date(2021, 1, 4), 300)
+    frames = {d: pd.DataFrame({'ts_code': ['000001.SZ'], 'close': [10.0 + i]}) for i, d in enumerate(days)}
+    history = _GappyHistory(frames, missing=days[:3])
+    monkeypatch.setattr(rolling_max_index, 'history_store', history)
+    monkeypatch.setattr(rolling_max_index, 'trade_calendar', _Calendar(days))
+    monkeypatch.setattr(rolling_max_index, 'ALL_TIME_YEARS', 2)
+
+    index = RollingMaxIndex(path=str(tmp_path / 'index.pkl'), windows={'1y': 1})
+    index.catch_up(None, days[-1])
+    assert index.last_date == days[-1]
+    assert index.lookup('000001.SZ')['max_all_date'] == days[-1]
+
+    # 之后的增量追加遇到缺失的交易日时停下，补齐后再继续
+    more = _trading_days(date(2022, 3, 1), 2)
+    for d in more:
+        frames[d] = pd.DataFrame({'ts_code': ['000001.SZ'], 'close': [1.0]})
+    history.missing.add(more[0])
+    monkeypatch.setattr(rolling_max_index, 'trade_calendar', _Calendar(days + more))
+    index.catch_up(None, more[-1])
+    assert index.last_date == days[-1]
+    history.missing.discard(more[0])
+    index.catch_up(None, more[-1])
+    assert index.last_date == more[-1]
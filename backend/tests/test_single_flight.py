@@ -0,0 +1,19 @@
+import threading
+
+from single_flight import SingleFlight
+
+
+def test_history_stays_within_cap_while_oldest_is_running():
+    flights = SingleFlight(max_workers=1, history_size=3)
+    release = threading.Event()
+    slow, _ = flights.submit('slow', release.wait)
+    try:
+        # 最早的记录仍在执行时，之后完成的记录也要按上限淘汰
+        for i in range(10):
+            flights.run(f'fast:{i}', lambda: None)
+            assert len(flights.status()) <= 3
+    finally:
+        release.set()
+        slow.result()
+        flights.shutdown()
+    assert [record['key'] for record in flights.status()] == ['fast:9', 'fast:8', 'slow']
@@ -0,0 +1,168 @@
+import bisect
+import threading
+from datetime import datetime, timedelta
+from config import MARKET_CLOSE_REFRESH_TIME, CALENDAR_RETRY_MINUTES
+
+
+class TradeCalendar:
+    """
+    交易日历缓存
+    交易日历接口（A股为 trade_cal，港股/美股为 hk_tradecal/us_tradecal）按年缓存在内存中，并记录已确认有日线数据的交易日。
+    "最新可用交易日"的结果会一直使用到下一个收盘刷新时间点，期间的查询不产生任何tushare调用（仅A股日历使用）。
+    """
+
+    def __init__(self, api_name='trade_cal'):
+        self.api_name = api_name
+        self._lock = threading.RLock()
+        self._refresh_lock = threading.Lock()  # 同一时间只有一个线程探测最新交易日
+        self._open_days = []      # 已加载范围内的交易日（升序）
+        self._open_set = set()
+        self._loaded_start = None  # 已加载日历的起止日期
+        self._loaded_end = None
+        self._available = set()   # 已确认有日线数据的交易日
+        self._latest = None
+        self._latest_expires = None
+
+    def _load(self, pro, start_date, end_date):
+        """把 [start_date, end_date] 的交易日历并入缓存"""
+        trade_cal = getattr(pro, self.api_name)(start_date=start_date, end_date=end_date)
+        days = trade_cal[trade_cal['is_open'].astype(int) == 1]['cal_date'].tolist()
+        self._open_set.update(days)
+        self._open_days = sorted(self._open_set)
+
+    def _ensure_range(self, pro, start_date, end_date):
+        """确保缓存覆盖给定区间，默认按自然年加载（含上一年，便于跨年回看）"""
+        with self._lock:
+            if self._loaded_start is None:
+                year = datetime.today().year
+                self._loaded_start = f'{year - 1}0101'
+                self._loaded_end = f'{year}1231'
+                self._load(pro, self._loaded_start, self._loaded_end)
+            if start_date < self._loaded_start:
+                before = (datetime.strptime(self._loaded_start, '%Y%m%d') - timedelta(days=1)).strftime('%Y%m%d')
+                self._load(pro, start_date, before)
+                self._loaded_start = start_date
+            if end_date > self._loaded_end:
+                after = (datetime.strptime(self._loaded_end, '%Y%m%d') + timedelta(days=1)).strftime('%Y%m%d')
+                # 跨年后把新一年的日历整体加载进来
+                new_end = max(end_date, f'{datetime.today().year}1231')
+                self._load(pro, after, new_end)
+                self._loaded_end = new_end
+
+    def is_trading_day(self, pro, date):
+        """是否为交易日"""
+        self._ensure_range(pro, date, date)
+        return date in self._open_set
+
+    def trading_days_between(self, pro, start_date, end_date):
+        """区间内的交易日（升序）"""
+        self._ensure_range(pro, start_date, end_date)
+        with self._lock:
+            lo = bisect.bisect_left(self._open_days, start_date)
+            hi = bisect.bisect_right(self._open_days, end_date)
+            return self._open_days[lo:hi]
+
+    def previous_trading_days(self, pro, n, end_date=None):
+        """截至 end_date（含）的最近 n 个交易日，最新日期在前"""
+        end_date = end_date or datetime.today().strftime('%Y%m%d')
+        # 按每年约240个交易日估算需要覆盖的区间
+        start_date = (datetime.strptime(end_date, '%Y%m%d') - timedelta(days=n * 2 + 30)).strftime('%Y%m%d')
+        self._ensure_range(pro, start_date, end_date)
+        with self._lock:
+            hi = bisect.bisect_right(self._open_days, end_date)
+            return self._open_days[max(0, hi - n):hi][::-1]
+
+    def mark_available(self, trade_date):
+        """记录某交易日已有日线数据"""
+        with self._lock:
+            self._available.add(trade_date)
+
+    def _next_refresh_time(self, pro, now, latest):
+        """计算缓存的最新交易日下一次需要重新确认的时间"""
+        today = now.strftime('%Y%m%d')
+        hour, minute = map(int, MARKET_CLOSE_REFRESH_TIME.split(':'))
+        refresh_today = now.replace(hour=hour, minute=minute, second=0, microsecond=0)
+        if self.is_trading_day(pro, today) and latest < today:
+            # 今天的数据还没出来：收盘前等到刷新时间点，收盘后按间隔重试
+            if now < refresh_today:
+                return refresh_today
+            return now + timedelta(minutes=CALENDAR_RETRY_MINUTES)
+        # 已是最新数据，等到下一个交易日收盘
+        tomorrow = (now + timedelta(days=1)).strftime('%Y%m%d')
+        next_days = self.trading_days_between(pro, tomorrow, (now + timedelta(days=30)).strftime('%Y%m%d'))
+        next_day = datetime.strptime(next_days[0], '%Y%m%d') if next_days else now + timedelta(days=1)
+        return next_day.replace(hour=hour, minute=minute, second=0, microsecond=0)
+
+    def get_latest_trade_date(self, pro):
+        """
+        获取最新可用交易日
+        探测日线数据（网络调用）时不持有日历锁，其他日历查询不受影响；
+        同一时间只有一个线程探测，其他线程已有上次结果时直接返回上次结果，首次查询时等待探测完成。
+        """
+        from history_store import history_store
+
+        now = datetime.now()
+        with self._lock:
+            if self._latest and now < self._latest_expires:
+                return self._latest
+            stale = self._latest
+        if not self._refresh_lock.acquire(blocking=stale is None):
+            return stale
+        try:
+            with self._lock:
+                if self._latest and now < self._latest_expires:
+                    return self._latest
+                candidates = [(trade_date, trade_date in self._available)
+                              for trade_date in self.previous_trading_days(pro, 5, now.strftime('%Y%m%d'))]
+
+            latest = None
+            # 尝试最近5个交易日，拉取到的数据直接写入本地历史数据
+            for trade_date, available in candidates:
+                if available or history_store.has_date(trade_date):
+                    latest = trade_date
+                    break
+                try:
+                    df = history_store.get_daily(pro, trade_date)
+                    if df is not None and not df.empty:
+                        latest = trade_date
+                        break
+                except Exception as e:
+                    print(f"尝试获取 {trade_date} 数据时出错: {e}")
+                    continue
+
+            if latest is None:
+                return None
+            print(f"找到最新可用交易日: {latest}")
+            expires = self._next_refresh_time(pro, now, latest)
+            with self._lock:
+                self._available.add(latest)
+                self._latest = latest
+                self._latest_expires = expires
+            return latest
+        finally:
+            self._refresh_lock.release()
+
+    def latest_valid_until(self):
+        """当前缓存的最新交易日有效到何时（之后可能出现新的交易日数据），尚未确认时为None"""
+        with self._lock:
+            return self._latest_expires
+
+
+trade_calendar = TradeCalendar()
+hk_calendar = TradeCalendar('hk_tradecal')
+us_calendar = TradeCalendar('us_tradecal')
+
+
+def get_latest_trade_date(pro):
+    """获取最新可用交易日"""
+    return trade_calendar.get_latest_trade_date(pro)
+
+
+def get_previous_trading_days(pro, n, end_date=None):
+    """截至 end_date（含）的最近 n 个交易日，最新日期在前"""
+    return trade_calendar.previous_trading_days(pro, n, end_date)
+
+
+def is_trading_day(pro, date):
+    """是否为交易日"""
+    return trade_calendar.is_trading_day(pro, date)
@@ -0,0 +1,110 @@
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from config import MAX_YEARS, WATCHLIST_MAX_WORKERS
+from history_store import history_store
+from new_high_scanner import new_high_scanner
+from rolling_max_index import IndexNotReady
+from models import SessionLocal
+from highest_check_cache import check_highest
+from is_highest_today import with_history
+
+# 批量检查返回的表格列
+WATCHLIST_COLUMNS = ['ts_code', 'name', 'market', 'trade_date', 'close', 'pct_chg', 'max_close', 'is_highest']
+
+# 代码后缀 -> 市场
+MARKET_SUFFIXES = {'.SZ': 'A股', '.SH': 'A股', '.BJ': 'A股', '.HK': '港股', '.US': '美股'}
+
+# 逐只检查使用独立线程池，避免与历史数据同步的 fetch_many 线程池互相等待
+_executor = ThreadPoolExecutor(max_workers=WATCHLIST_MAX_WORKERS, thread_name_prefix='watchlist')
+
+
+def market_of(ts_code):
+    for suffix, market in MARKET_SUFFIXES.items():
+        if ts_code.endswith(suffix):
+            return market
+    return None
+
+
+def _summary_row(result):
+    return [
+        result['ts_code'], result.get('name'), result.get('market'), result.get('trade_date'),
+        result.get('today_close'), result.get('pct_chg'), result.get('max_close'), result.get('is_highest')
+    ]
+
+
+def _check_one(pro, ts_code, points, include_history):
+    """逐只检查（读穿 stock_highest_check 缓存），每个线程使用自己的数据库会话"""
+    with SessionLocal() as session:
+        return check_highest(session, pro, ts_code, points, include_history)
+
+
+def check_watchlist(pro, trade_date, codes, history_codes=(), points=None):
+    """
+    批量检查股票今天是否创近 MAX_YEARS 年新高
+    A股在最新交易日的全市场新高扫描结果（新高索引或收盘价矩阵，整表一次算出）上按代码取行；
+    当天没有行情的A股和港股/美股逐只检查，结果读穿数据库缓存。
+    只有 history_codes 中的股票附带历史走势。返回 列名 + 行 的紧凑表格。
+    """
+    history_codes = set(history_codes)
+    rows, history, errors = {}, {}, {}
+    by_market = {}
+    for ts_code in codes:
+        market = market_of(ts_code)
+        if market is None:
+            errors[ts_code] = "无法识别股票代码后缀"
+        else:
+            by_market.setdefault(market, []).append(ts_code)
+
+    pending = []
+    a_shares = by_market.pop('A股', [])
+    scan = None
+    if a_shares:
+        try:
+            scan = new_high_scanner.scan(pro, trade_date, min_pct_chg=None, ts_codes=a_shares)
+        except IndexNotReady as e:
+            # 新高索引构建期间A股没有结果；港股/美股照常检查，返回部分结果
+            if not by_market:
+                raise
+            errors.update((code, str(e)) for code in a_shares)
+    if scan is not None:
+        columns = zip(scan['ts_code'].tolist(), scan['name'].tolist(), scan['trade_date'].tolist(),
+                      scan['current_price'].tolist(), scan['pct_chg'].tolist(), scan['max_3y'].tolist(),
+                      scan['is_3y_high'].tolist())
+        for ts_code, name, date, close, pct_chg, max_close, is_highest in columns:
+            rows[ts_code] = [ts_code, name, 'A股', date, close, pct_chg, max_close, bool(is_highest)]
+        pending.extend(code for code in a_shares if code not in rows)
+        # A股历史走势直接读本地历史数据（索引已更新到该交易日，窗口内的日线都已同步）
+        start_date = (datetime.strptime(trade_date, '%Y%m%d') - timedelta(days=MAX_YEARS * 365)).strftime('%Y%m%d')
+        for ts_code in history_codes.intersection(rows):
+            df = history_store.get_history(pro, ts_code, start_date, trade_date, sync=False)
+            history[ts_code] = with_history({}, df, points)['history']
+    for market_codes in by_market.values():
+        pending.extend(market_codes)
+
+    futures = {code: _executor.submit(contextvars.copy_context().run, _check_one, pro, code, points, code in history_codes) for code in pending}
+    for ts_code, future in futures.items():
+        try:
+            result = future.result()
+        except Exception as e:
+            errors[ts_code] = str(e)
+            continue
+        if 'error' in result:
+            errors[ts_code] = result['error']
+            continue
+        rows[ts_code] = _summary_row(result)
+        if 'history' in result:
+            history[ts_code] = result['history']
+
+    return {
+        "trade_date": trade_date,
+        "columns": WATCHLIST_COLUMNS,
+        "rows": [rows[code] for code in codes if code in rows],
+        "history": history,
+        "errors": errors
+    }
+
+
+def shutdown():
+    """关闭线程池（应用退出时调用）"""
+    _executor.shutdown(wait=False)
@@ -67,10 +67,10 @@ export const getHighRiseStocks = async () => {
   }
 }
 
-// 检查股票是否为今日最高价
-export const checkIsHighestToday = async (tsCode) => {
+// 检查股票是否为今日最高价（历史走势由后端降采样到 points 个点左右，足够绘制折线图）
+export const checkIsHighestToday = async (tsCode, points = 80) => {
   try {
-    const response = await api.get(`/is-highest-today/${tsCode}`)
+    const response = await api.get(`/is-highest-today/${tsCode}`, { params: { points } })
     return response.data
   } catch (error) {
     console.error('检查股票最高价失败:', error)